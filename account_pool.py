@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from telethon import utils
+
+
+class AccountsBlocked(Exception):
+    """Minden szóba jöhető küldő fiók FloodWait alatt áll; seconds múlva lesz újra küldhető"""
+
+    def __init__(self, seconds):
+        super().__init__(f"minden küldő fiók FloodWait alatt ({seconds:.0f} mp)")
+        self.seconds = seconds
+
+
+class SenderAccount:
+    """Egy küldésre használható Telegram fiók: kliens, saját sebességkorlátozó és cél entitások
+
+    Az entitások access hash-e fiókonként eltér, ezért minden fiók maga
+    oldja fel a cél csatornákat; csak olyan célba küldhet, amelyet fel tudott oldani.
+    """
+
+    def __init__(self, name, client, rate_limiter, primary=False):
+        self.name = name
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.primary = primary
+        self.entities = {}  # cél peer id -> a fiók saját entitása
+        self.inflight_bytes = 0
+        self.stats = {'jobs': 0, 'bytes': 0}
+
+    def can_send(self, destination_keys):
+        return all(key in self.entities for key in destination_keys)
+
+    def blocked_for(self, destination_keys):
+        """Hány másodpercig tiltja még FloodWait a fiókot a megadott célok valamelyikén"""
+        return max([self.rate_limiter.blocked_for(key) for key in destination_keys] or [self.rate_limiter.blocked_for()])
+
+    async def resolve_destinations(self, destinations):
+        """Cél entitások feloldása ezzel a fiókkal; a fel nem oldhatók kimaradnak
+
+        A dialógusok feloldásonként legfeljebb egyszer töltődnek be, akárhány
+        célt nem ismer a session.
+        """
+        dialogs_loaded = False
+        for destination_key, channel_id in destinations:
+            try:
+                try:
+                    entity = await self.client.get_entity(channel_id)
+                except ValueError:
+                    if dialogs_loaded:
+                        raise
+                    # A session még nem ismeri az entitást: a dialógusok betöltése után újra
+                    dialogs_loaded = True
+                    await self.client.get_dialogs()
+                    entity = await self.client.get_entity(channel_id)
+                if utils.get_peer_id(entity) == destination_key:
+                    self.entities[destination_key] = entity
+            except Exception as e:
+                print(f"A(z) {self.name} fiók nem éri el a célt ({destination_key}): {e}")
+
+    def get_status(self):
+        return dict(
+            self.stats,
+            name=self.name,
+            primary=self.primary,
+            destinations=len(self.entities),
+            inflight_bytes=self.inflight_bytes,
+            blocked_for=round(self.rate_limiter.blocked_for(), 1)
+        )
+
+
+class AccountPool:
+    """Küldő fiókok ütemezője
+
+    Az újrafeltöltendő média és a szöveges üzenetek azt a fiókot kapják, amelyik
+    nincs FloodWait alatt, és a legkevesebb bájtot tölti éppen fel; a
+    FloodWait alatt álló fiók így automatikusan kimarad. A szöveges üzenetek
+    fiókja a küldés pillanatában dől el (pick_ready). A szerveroldali
+    továbbküldés (relay) a fogadó fióknál marad, mert a forrás média
+    hivatkozásai annak a fióknak szólnak. A célonkénti sorrendet a folyamat
+    egyetlen küldő szakasza biztosítja, a fiókválasztástól függetlenül.
+    """
+
+    def __init__(self, accounts):
+        self.accounts = list(accounts)
+        self.primary = next(a for a in self.accounts if a.primary)
+        self._by_name = {a.name: a for a in self.accounts}
+
+    def get(self, name):
+        return self._by_name.get(name, self.primary)
+
+    def candidates(self, destination_keys):
+        """A célokba küldeni képes fiókok"""
+        return [a for a in self.accounts if a.primary or a.can_send(destination_keys)]
+
+    def pick_ready(self, destination_keys, candidates=None):
+        """A jelöltek közül a legkevésbé terhelt, FloodWait alatt nem álló fiók; None, ha mind tiltott
+
+        A küldés pillanatában hívjuk, így a közben tiltás alá került fiók kimarad.
+        """
+        if candidates is None:
+            candidates = self.candidates(destination_keys)
+        ready = [a for a in candidates if not a.blocked_for(destination_keys)]
+        if not ready:
+            return None
+        account = min(ready, key=lambda a: (a.inflight_bytes, a.stats['jobs'], not a.primary))
+        account.stats['jobs'] += 1
+        return account
+
+    def blocked_for(self, destination_keys, candidates=None):
+        """Hány másodperc múlva lesz a jelöltek közül legalább egy fiók újra használható"""
+        if candidates is None:
+            candidates = self.candidates(destination_keys)
+        return min([a.blocked_for(destination_keys) for a in candidates] or [0.0])
+
+    def pick(self, destination_keys):
+        """A célokba küldeni képes fiókok közül a legkevésbé terhelt, nem tiltott fiók
+
+        Azonos terhelésnél a kevesebb feladatot kapott fiók nyer, így a
+        szöveges üzenetek is körbeforognak a fiókok között.
+        """
+        candidates = self.candidates(destination_keys)
+        # Ha minden fiók tiltva van, az kapja, amelyiknél hamarabb lejár a tiltás
+        account = min(candidates, key=lambda a: (
+            a.blocked_for(destination_keys), a.inflight_bytes, a.stats['jobs'], not a.primary
+        ))
+        account.stats['jobs'] += 1
+        return account
+
+    def reserve(self, account, size):
+        account.inflight_bytes += size
+
+    def release(self, account, size):
+        account.inflight_bytes -= size
+        account.stats['bytes'] += size
+
+    def get_status(self):
+        return [a.get_status() for a in self.accounts]
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash
 import json
 import os
-import asyncio
-import threading
-from config import load_config, save_config, get_default_config
+from datetime import datetime
+from config import load_config, save_config, has_routes, subscribe, unsubscribe
 from telethon_client import TelegramClientManager
 from message_copier import MessageCopier
+from spool import OutboundSpool
+from loop_service import LoopService
+from loop_watchdog import LoopWatchdog
+import profiler
+from status_hub import StatusHub
+import metrics
 
 app = Flask(__name__)
 app.secret_key = 'telegram_copier_secret_key_2024'
@@ -16,45 +21,107 @@ app.secret_key = 'telegram_copier_secret_key_2024'
 # Globális változók
 telegram_client_manager = None
 message_copier = None
-copier_thread = None
+copier_future = None
 is_copying = False
+# A sebességkorlátozó a másolók között megosztott, így az újraindítás után is megmarad a tanult állapot
+rate_limiter = None
+message_ledger = None
+media_cache = None
+# Kézbesítésre váró és sikertelen (dead-letter) üzenetek tartós sora
+outbound_spool = None
+# A backfillt futtató másoló (élő másolás mellett maga a message_copier)
+backfill_copier = None
 
-# Aszinkron eseményhurok kezelése a Telethon számára
-def run_async_in_thread(coro):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    return loop.run_until_complete(coro)
+# Egyetlen eseményhurok a Telethon kliens, a másoló és a backfill számára;
+# a Flask kérések ezen keresztül futtatják az aszinkron hívásokat
+loop_service = LoopService()
+# Ennyi másodpercig vár egy kérés a hurkon futó műveletre
+REQUEST_TIMEOUT = 30
+# Az eseményhurok késésének és akadásainak figyelője (a main indítja)
+loop_watchdog = None
+# A /debug/profile mintavételezésének felső korlátja másodpercben
+MAX_PROFILE_SECONDS = 60
+
+def run_async(coro, timeout=REQUEST_TIMEOUT):
+    """Korutin futtatása a közös eseményhurkon és az eredmény megvárása"""
+    return loop_service.run(coro, timeout)
+
+def is_logged_in():
+    """Utoljára ismert bejelentkezési állapot (hálózati kérés nélkül)"""
+    return bool(telegram_client_manager and telegram_client_manager.authorized)
+
+def collect_status():
+    """A másoló és a bejelentkezés aktuális állapotának összegyűjtése"""
+    return {
+        'is_copying': is_copying,
+        'is_logged_in': is_logged_in(),
+        'copier': message_copier.get_status() if message_copier else None,
+        'backfill': backfill_copier.backfill.get_status() if backfill_copier and backfill_copier.backfill else None
+    }
+
+# Memóriában tartott állapot: a /status ezt olvassa, a /status/stream ezt küldi ki változáskor
+status_hub = StatusHub(collect_status)
+
+def create_message_copier(config):
+    """MessageCopier létrehozása a konfiguráció alapján, közös korlátozóval és naplóval"""
+    global rate_limiter, message_ledger, media_cache, outbound_spool
+    
+    copier = MessageCopier.from_config(
+        config,
+        telegram_client_manager,
+        rate_limiter=rate_limiter,
+        ledger=message_ledger,
+        media_cache=media_cache,
+        spool=outbound_spool
+    )
+    # A megosztott objektumok a másoló újraindítása után is megmaradnak
+    rate_limiter, message_ledger, media_cache, outbound_spool = (
+        copier.rate_limiter, copier.ledger, copier.media_cache, copier.spool
+    )
+    return copier
+
+def refresh_channels_in_background():
+    """Lejárt dialóguslista frissítése a háttérben, az oldal kiszolgálásának megvárása nélkül"""
+    cache = telegram_client_manager.entity_cache
+    if not cache or not cache.dialogs_stale() or not cache.start_refresh():
+        return
+    
+    def on_done(future):
+        cache.finish_refresh()
+        if not future.cancelled() and future.exception():
+            print(f"Hiba a csatornák háttérfrissítése során: {future.exception()}")
+    
+    loop_service.submit(telegram_client_manager.get_channels(refresh=True)).add_done_callback(on_done)
 
 # Kliens inicializálása az alkalmazás indításakor
 
 
 @app.route('/')
-async def index():
+def index():
     """Főoldal - alkalmazás állapotának megjelenítése"""
     global is_copying, telegram_client_manager
     
     config = load_config()
     
-    is_logged_in = False
-    if telegram_client_manager:
-        is_logged_in = await telegram_client_manager.is_logged_in_async()
-    
     return render_template('index.html', 
                          config=config, 
                          is_copying=is_copying,
-                         is_logged_in=is_logged_in)
+                         is_logged_in=is_logged_in(),
+                         has_routes=has_routes(config))
 
 @app.route('/settings')
-async def settings():
+def settings():
     """Beállítások oldal"""
     global telegram_client_manager
     
     config = load_config()
     
     channels = []
-    if telegram_client_manager and await telegram_client_manager.is_logged_in_async():
+    if is_logged_in():
         try:
-            channels = await telegram_client_manager.get_channels()
+            # A lista a gyorsítótárból jön; lejárt lista esetén a háttérben frissül
+            channels = run_async(telegram_client_manager.get_channels())
+            refresh_channels_in_background()
         except Exception as e:
             flash(f'Hiba a csatornák lekérése során: {str(e)}', 'error')
     
@@ -90,7 +157,7 @@ def save_settings():
     return redirect(url_for('settings'))
 
 @app.route('/login_telegram', methods=['POST'])
-async def login_telegram():
+def login_telegram():
     """Telegram bejelentkezés indítása"""
     global telegram_client_manager
     
@@ -104,7 +171,7 @@ async def login_telegram():
         if not phone_number:
             return jsonify({'success': False, 'message': 'Telefonszám megadása kötelező!'})
         
-        result = await telegram_client_manager.start_login(phone_number)
+        result = run_async(telegram_client_manager.start_login(phone_number))
         
         if result['success']:
             return jsonify({'success': True, 'message': 'Kód elküldve! Kérjük, adja meg a kapott kódot.'})
@@ -115,7 +182,7 @@ async def login_telegram():
         return jsonify({'success': False, 'message': f'Hiba: {str(e)}'})
 
 @app.route('/verify_code', methods=['POST'])
-async def verify_code():
+def verify_code():
     """Telegram bejelentkezési kód ellenőrzése"""
     global telegram_client_manager
     
@@ -127,7 +194,7 @@ async def verify_code():
         if not telegram_client_manager:
             return jsonify({'success': False, 'message': 'Nincs aktív bejelentkezési folyamat!'})
         
-        result = await telegram_client_manager.verify_code(code)
+        result = run_async(telegram_client_manager.verify_code(code))
         
         if result['success']:
             return jsonify({'success': True, 'message': 'Sikeres bejelentkezés!'})
@@ -138,42 +205,46 @@ async def verify_code():
         return jsonify({'success': False, 'message': f'Hiba: {str(e)}'})
 
 @app.route('/start_copier', methods=['POST'])
-async def start_copier():
+def start_copier():
     """Üzenetmásoló indítása"""
-    global message_copier, copier_thread, is_copying, telegram_client_manager
+    global message_copier, copier_future, is_copying, telegram_client_manager
     
     try:
         if is_copying:
             return jsonify({'success': False, 'message': 'A másolás már fut!'})
         
+        if copier_future is not None and not copier_future.done():
+            return jsonify({'success': False, 'message': 'Az előző másolás leállítása még folyamatban van!'})
+        
         config = load_config()
         
-        if not config.get('source_channel_id') or not config.get('destination_channel_id'):
+        if not has_routes(config):
             return jsonify({'success': False, 'message': 'Forrás és cél csatorna megadása kötelező!'})
         
-        if not telegram_client_manager or not await telegram_client_manager.is_logged_in_async():
+        # A tárolt állapot elavult lehet (pl. induláskor sikertelen csatlakozás): újracsatlakozás és ellenőrzés
+        if not is_logged_in() and not run_async(telegram_client_manager.is_logged_in_async()):
             return jsonify({'success': False, 'message': 'Nincs bejelentkezve a Telegramra!'})
         
-        message_copier = MessageCopier(
-            telegram_client=telegram_client_manager.client,
-            source_channel_id=config['source_channel_id'],
-            destination_channel_id=config['destination_channel_id']
-        )
+        # Új másoló a teljes konfigurációval (az előző az eseménykezelőit leállításkor eltávolította);
+        # az entitások a közös gyorsítótárból, hálózati kérés nélkül oldódnak fel
+        message_copier = create_message_copier(config)
+        # A futó másoló a konfiguráció változásairól értesítést kap, nem olvassa újra a fájlt
+        copier = message_copier
+        subscribe(copier.apply_config)
         
-        # Másolás indítása külön szálban
-        def run_copier():
+        # Másolás indítása a közös eseményhurkon
+        def on_done(future):
             global is_copying
-            is_copying = True
-            try:
-                asyncio.run(message_copier.start_copying())
-            except Exception as e:
-                print(f"Hiba a másolás során: {e}")
-            finally:
-                is_copying = False
-        
-        copier_thread = threading.Thread(target=run_copier)
-        copier_thread.daemon = True
-        copier_thread.start()
+            unsubscribe(copier.apply_config)
+            if not future.cancelled() and future.exception():
+                print(f"Hiba a másolás során: {future.exception()}")
+            is_copying = False
+            loop_service.call_soon(status_hub.refresh)
+        
+        is_copying = True
+        copier_future = loop_service.submit(copier.start_copying())
+        copier_future.add_done_callback(on_done)
+        loop_service.call_soon(status_hub.refresh)
         
         return jsonify({'success': True, 'message': 'Üzenetmásolás elindítva!'})
         
@@ -193,24 +264,160 @@ def stop_copier():
             message_copier.stop_copying()
         
         is_copying = False
+        loop_service.call_soon(status_hub.refresh)
         return jsonify({'success': True, 'message': 'Üzenetmásolás leállítva!'})
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'Hiba: {str(e)}'})
 
+@app.route('/start_backfill', methods=['POST'])
+def start_backfill():
+    """Előzmények másolásának (backfill) indítása"""
+    global message_copier, backfill_copier, is_copying, telegram_client_manager
+    
+    try:
+        if backfill_copier and backfill_copier.backfill and backfill_copier.backfill.state == 'running':
+            return jsonify({'success': False, 'message': 'A backfill már fut!'})
+        
+        config = load_config()
+        
+        if not has_routes(config):
+            return jsonify({'success': False, 'message': 'Forrás és cél csatorna megadása kötelező!'})
+        
+        if not is_logged_in():
+            return jsonify({'success': False, 'message': 'Nincs bejelentkezve a Telegramra!'})
+        
+        data = request.json or {}
+        from_date = None
+        if data.get('from_date'):
+            from_date = datetime.fromisoformat(data['from_date'])
+        params = {
+            'min_id': int(data.get('min_id') or 0),
+            'max_id': int(data.get('max_id') or 0),
+            'from_date': from_date
+        }
+        
+        if is_copying and message_copier:
+            # Élő másolás mellett annak folyamatán fut, alacsonyabb prioritással
+            backfill_copier = message_copier
+        else:
+            backfill_copier = create_message_copier(config)
+        loop_service.submit(backfill_copier.run_backfill(**params))
+        
+        return jsonify({'success': True, 'message': 'Backfill elindítva!'})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Hiba: {str(e)}'})
+
+@app.route('/stop_backfill', methods=['POST'])
+def stop_backfill():
+    """Futó backfill leállítása (később folytatható)"""
+    global backfill_copier
+    
+    if not backfill_copier or not backfill_copier.backfill or backfill_copier.backfill.state != 'running':
+        return jsonify({'success': False, 'message': 'A backfill nem fut!'})
+    
+    backfill_copier.stop_backfill()
+    return jsonify({'success': True, 'message': 'Backfill leállítva, később folytatható.'})
+
+@app.route('/backfill_status')
+def backfill_status():
+    """Backfill haladásának lekérése"""
+    global backfill_copier
+    
+    status = None
+    if backfill_copier and backfill_copier.backfill:
+        status = backfill_copier.backfill.get_status()
+    return jsonify({'backfill': status})
+
+@app.route('/dead_letters')
+def dead_letters():
+    """Sikertelen (dead-letter) üzenetek listája"""
+    if outbound_spool is None:
+        return jsonify({'status': None, 'items': []})
+    return jsonify({'status': outbound_spool.get_status(), 'items': outbound_spool.dead_letters()})
+
+@app.route('/dead_letters/replay', methods=['POST'])
+def replay_dead_letters():
+    """Sikertelen üzenet(ek) újraküldése; azonosító nélkül az összes"""
+    if outbound_spool is None:
+        return jsonify({'success': False, 'message': 'Nincsenek sikertelen üzenetek.'})
+    
+    data = request.json or {}
+    count = outbound_spool.replay(int(data['id']) if data.get('id') else None)
+    loop_service.call_soon(status_hub.refresh)
+    if not count:
+        return jsonify({'success': False, 'message': 'Nincs újraküldhető tétel.'})
+    message = f'{count} tétel újraküldésre ütemezve.'
+    if not is_copying:
+        message += ' Az újraküldés a másolás indításakor történik meg.'
+    return jsonify({'success': True, 'message': message})
+
+@app.route('/dead_letters/discard', methods=['POST'])
+def discard_dead_letter():
+    """Sikertelen üzenet végleges elvetése"""
+    data = request.json or {}
+    if outbound_spool is None or not data.get('id') or not outbound_spool.discard(int(data['id'])):
+        return jsonify({'success': False, 'message': 'A tétel nem található.'})
+    loop_service.call_soon(status_hub.refresh)
+    return jsonify({'success': True, 'message': 'Tétel elvetve.'})
+
 @app.route('/status')
-async def status():
-    """Alkalmazás állapotának lekérése (AJAX-hoz)"""
-    global is_copying, telegram_client_manager
+def status():
+    """Alkalmazás állapotának lekérése (AJAX-hoz) a memóriában tartott pillanatképből"""
+    if not status_hub.version:
+        # Az első gyűjtés is a hurkon fut (a másoló állapota csak ott olvasható biztonságosan)
+        loop_service.call_soon(status_hub.refresh)
+        status_hub.wait(0, timeout=5.0)
+    return jsonify(status_hub.snapshot())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metrikák Prometheus szöveges formátumban"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/loop')
+def debug_loop():
+    """Az eseményhurok késése és a legutóbbi akadások a blokkoló hívás vermével"""
+    if loop_watchdog is None:
+        return jsonify({'status': None, 'stalls': []})
+    return jsonify({'status': loop_watchdog.get_status(), 'stalls': list(loop_watchdog.stalls)})
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Az eseményhurok szálának mintavételezése seconds másodpercig, összevont (folded) formátumban
+
+    Az eredmény flame graph nézőbe (speedscope, flamegraph.pl) tölthető.
+    """
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), MAX_PROFILE_SECONDS)
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Érvénytelen paraméter!'}), 400
+    if not loop_service.is_running():
+        return jsonify({'success': False, 'message': 'Az eseményhurok nem fut!'}), 409
     
-    is_logged_in = False
-    if telegram_client_manager:
-        is_logged_in = await telegram_client_manager.is_logged_in_async()
+    counts = profiler.profile_loop(loop_service.loop, seconds, max(interval, 0.001))
+    if counts is None:
+        return jsonify({'success': False, 'message': 'Már fut egy mintavételezés!'}), 409
+    return Response(profiler.collapsed(counts), mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=profile.folded'})
+
+@app.route('/status/stream')
+def status_stream():
+    """Állapotváltozások folyamatos küldése Server-Sent Events formában"""
+    def stream():
+        version = 0
+        while True:
+            version, snapshot = status_hub.wait(version)
+            if snapshot is None:
+                # Kapcsolat életben tartása változás hiányában
+                yield ': keepalive\n\n'
+                continue
+            yield f"data: {json.dumps(snapshot)}\n\n"
     
-    return jsonify({
-        'is_copying': is_copying,
-        'is_logged_in': is_logged_in
-    })
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
     os.makedirs('data', exist_ok=True)
@@ -220,15 +427,20 @@ if __name__ == '__main__':
     telegram_client_manager = TelegramClientManager(
         api_id=int(config.get('api_id', 0)),
         api_hash=config.get('api_hash', ''),
-        session_file=os.path.join('data', 'session.session')
+        session_file=os.path.join('data', 'session.session'),
+        entity_ttl=float(config.get('entity_cache_ttl', 86400)),
+        dialog_ttl=float(config.get('dialog_cache_ttl', 300)),
+        sender_sessions=config.get('sender_sessions') or []
     )
-    # Start the client in a separate thread to manage its asyncio event loop
-    def start_telethon_client_thread():
-        asyncio.run(telegram_client_manager.start_client())
-    
-    client_thread = threading.Thread(target=start_telethon_client_thread)
-    client_thread.daemon = True
-    client_thread.start()
+    # Az előző futásból maradt sikertelen üzenetek a másolás indítása előtt is láthatók
+    outbound_spool = OutboundSpool(os.path.join('data', 'spool.log'), policies=config.get('retry_policies') or {})
+    # The client lives on the shared loop thread for the whole process lifetime
+    loop_service.start()
+    telegram_client_manager.on_state_change = status_hub.refresh
+    loop_service.submit(telegram_client_manager.start_client())
+    loop_service.submit(status_hub.run_publisher())
+    loop_watchdog = LoopWatchdog(threshold=float(config.get('loop_stall_threshold_ms', 100)) / 1000)
+    loop_service.submit(loop_watchdog.run())
 
     app.run(host='0.0.0.0', port=5001, debug=True)
 
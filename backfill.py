@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from telethon.errors import FloodWaitError
+
+
+class HistoryBackfill:
+    """Forrás csatorna előzményeinek streamelt átmásolása
+
+    Az üzeneteket lapokban (iter_messages, növekvő azonosító szerint) olvassa,
+    így soha nincs a teljes history a memóriában. A másolás a MessageCopier
+    folyamatán keresztül, külön 'backfill' sávban történik, amely enged az élő
+    forgalomnak. A pozíció a naplóba (MessageLedger) mentődik, így egy
+    megszakított backfill onnan folytatható, ahol abbamaradt.
+
+    A min_id és max_id a Telethon szerint kizáró határok (0 = nincs határ).
+    """
+
+    LANE = 'backfill'
+
+    def __init__(self, copier, source_key, min_id=0, max_id=0, from_date=None, max_inflight=None, resume=True,
+                 checkpoint_every=5.0):
+        self.copier = copier
+        # A forrás peer id-ja; az üzenetek az útvonal összes céljába mennek
+        self.source_key = source_key
+        self.lane = (self.LANE, source_key)
+        self.min_id = int(min_id or 0)
+        self.max_id = int(max_id or 0)
+        self.from_date = from_date
+        # Egyszerre legfeljebb ennyi backfill elem lehet a folyamatban
+        self.max_inflight = max_inflight or copier.download_workers * 2
+        self.resume = resume
+        self.checkpoint_every = checkpoint_every
+        self.state = 'idle'
+        self.start_id = 0
+        self.end_id = 0
+        self.position = 0
+        self.done = 0
+        self.started_at = None
+        self.error = None
+        self._submitted_upto = 0
+        self._outstanding = set()
+        self._last_checkpoint = 0.0
+        self._stop_requested = False
+
+    @property
+    def checkpoint_name(self):
+        return f"backfill:{self.source_key}"
+
+    def stop(self):
+        """Backfill leállítása; a pozíció mentésre kerül, később folytatható"""
+        self._stop_requested = True
+
+    async def _resolve_range(self):
+        """Kezdő és záró azonosító meghatározása (checkpoint, dátum, legfrissebb üzenet)"""
+        client = self.copier.client
+        source = self.copier.routes[self.source_key]['source']
+        limiter = self.copier.rate_limiter
+
+        start_id = self.min_id
+        if self.from_date:
+            # Az adott dátum előtti utolsó üzenet azonosítója lesz az alsó határ
+            before = await limiter.call(None, client.get_messages, source, limit=1, offset_date=self.from_date)
+            if before:
+                start_id = max(start_id, before[0].id)
+
+        ledger = self.copier.ledger
+        if self.resume and ledger:
+            checkpoint = ledger.load_checkpoint(self.checkpoint_name)
+            if checkpoint and checkpoint.get('state') != 'completed' and checkpoint.get('max_id') == self.max_id:
+                start_id = max(start_id, checkpoint.get('position', 0))
+                print(f"Backfill folytatása a(z) {start_id}. üzenettől")
+
+        if self.max_id:
+            end_id = self.max_id - 1
+        else:
+            latest = await limiter.call(None, client.get_messages, source, limit=1)
+            end_id = latest[0].id if latest else start_id
+
+        return start_id, end_id
+
+    def _save_checkpoint(self, force=False):
+        """Pozíció mentése: a legkisebb még kézbesítetlen azonosító előtti pont"""
+        ledger = self.copier.ledger
+        if not ledger:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.checkpoint_every:
+            return
+        self._last_checkpoint = now
+        self.position = (min(self._outstanding) - 1) if self._outstanding else self._submitted_upto
+        ledger.save_checkpoint(self.checkpoint_name, {
+            'state': self.state,
+            'position': self.position,
+            'min_id': self.min_id,
+            'max_id': self.max_id,
+            'done': self.done
+        })
+
+    def _on_delivered(self, job, result):
+        """A folyamat visszahívása egy backfill elem kézbesítése után"""
+        for message in job['messages']:
+            self._outstanding.discard(message.id)
+        self.done += len(job['messages'])
+        self._save_checkpoint()
+
+    async def _wait_for_capacity(self):
+        """Várakozás, amíg nincs élő forgalom és van hely a backfill számára"""
+        pipeline = self.copier.pipeline
+        # A FloodWait miatt visszatartott (a folyamatból már kikerült) elemek is foglaltnak számítanak
+        while pipeline.lane_size(priority=0) or max(pipeline.lane_size(self.lane), len(self._outstanding)) \
+                >= self.max_inflight:
+            if self._stop_requested:
+                return
+            await asyncio.sleep(0.05)
+
+    async def _submit(self, group):
+        """Egy üzenet vagy album beküldése a backfill sávba"""
+        await self._wait_for_capacity()
+        if self._stop_requested:
+            return
+        submitted = await self.copier._submit(
+            self.source_key, group, lane=self.LANE, on_delivered=self._on_delivered
+        )
+        self._outstanding.update(m.id for m in submitted)
+        # A kihagyott (már másolt vagy üres) üzenetek is késznek számítanak
+        self.done += len(group) - len(submitted)
+        self._submitted_upto = group[-1].id
+
+    async def run(self):
+        """Backfill futtatása a beállított tartományon"""
+        copier = self.copier
+        copier.pipeline.set_priority(self.lane, 1)
+        self.state = 'running'
+        self.started_at = time.monotonic()
+
+        try:
+            self.start_id, self.end_id = await self._resolve_range()
+            self._submitted_upto = self.position = self.start_id
+            print(f"Backfill indítása: {self.start_id} -> {self.end_id}")
+
+            while not self._stop_requested:
+                try:
+                    group = []
+                    async for message in copier.client.iter_messages(
+                        copier.routes[self.source_key]['source'],
+                        min_id=self._submitted_upto,
+                        max_id=self.max_id,
+                        reverse=True,
+                        wait_time=0
+                    ):
+                        if self._stop_requested:
+                            break
+                        if group and (not message.grouped_id or message.grouped_id != group[-1].grouped_id):
+                            await self._submit(group)
+                            group = []
+                        group.append(message)
+                    if group and not self._stop_requested:
+                        await self._submit(group)
+                    break
+                except FloodWaitError as e:
+                    # Az utolsó beküldött üzenettől folytatjuk a várakozás után
+                    print(f"FloodWait a history lekérése során: {e.seconds} mp")
+                    await asyncio.sleep(e.seconds)
+
+            # Megvárjuk, amíg a backfill sáv kiürül; leállításkor (a folyamat akár már le is
+            # bomolhatott) nem várunk, a pozíciót a még kint lévő elemek előttre mentjük
+            while not self._stop_requested and copier.pipeline is not None and copier.pipeline.lane_size(self.lane):
+                await asyncio.sleep(0.1)
+
+            self.state = 'stopped' if self._stop_requested else 'completed'
+            print(f"Backfill {'leállítva' if self._stop_requested else 'befejezve'}: {self.done} üzenet")
+
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+            print(f"Hiba a backfill során: {e}")
+        finally:
+            self._save_checkpoint(force=True)
+
+    def get_status(self):
+        """Haladás: kész/összes, üzenet/másodperc és becsült hátralévő idő
+
+        Az összes darabszám az azonosító-tartományból becsült érték.
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        position = (min(self._outstanding) - 1) if self._outstanding else self._submitted_upto
+        total = max(0, self.end_id - self.start_id)
+        processed = max(0, position - self.start_id)
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        id_rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = (total - processed) / id_rate if id_rate > 0 else None
+
+        return {
+            'state': self.state,
+            'done': self.done,
+            'total': total,
+            'percent': round(100.0 * processed / total, 1) if total else (100.0 if self.state == 'completed' else 0.0),
+            'messages_per_second': round(rate, 2),
+            'eta_seconds': round(eta) if eta is not None and self.state == 'running' else None,
+            'position': position,
+            'start_id': self.start_id,
+            'end_id': self.end_id,
+            'error': self.error
+        }
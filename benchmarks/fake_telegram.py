@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import itertools
+import os
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from telethon import events, utils
+from telethon.errors import FloodWaitError
+from telethon.tl.custom.file import File
+from telethon.tl.functions.messages import GetHistoryRequest
+from telethon.tl.functions.upload import GetFileRequest, SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types.storage import FileUnknown
+from telethon.tl.types.upload import File as UploadFile
+from telethon.tl.types import (
+    Channel, ChatPhotoEmpty, Document, DocumentAttributeFilename, InputMediaUploadedDocument,
+    InputMediaUploadedPhoto, MessageMediaDocument, MessageMediaPhoto, Photo, PhotoSize
+)
+
+MB = 1024 * 1024
+
+
+class FakeMessage:
+    """A MessageCopier által használt üzenet mezők (id, szöveg, média, album, dátum)"""
+
+    def __init__(self, message_id, text='', media=None, grouped_id=None, noforwards=False):
+        self.id = message_id
+        self.text = text
+        self.message = text
+        self.media = media
+        self.grouped_id = grouped_id
+        self.noforwards = noforwards
+        self.date = datetime.now(timezone.utc)
+        self.posted_at = time.monotonic()
+        media_object = getattr(media, 'photo', None) or getattr(media, 'document', None)
+        self.file = File(media_object) if media_object else None
+
+
+class FakeTelegramClient:
+    """Folyamaton belüli Telegram kliens mérésekhez, hálózat és fiók nélkül
+
+    A TelegramClient azon részét valósítja meg, amelyet a MessageCopier és a
+    TelegramClientManager használ. Minden kérés latency másodpercig tart, a
+    fájlátvitel bandwidth (feltöltésnél upload_bandwidth) bájt/másodperc
+    sebességű, és - mint a Telegramnál - part_size méretű részenként egy-egy
+    kérés; flood_every küldésenként egy flood_seconds hosszú
+    FloodWaitError érkezik. A kézbesítések (cél, szöveg, időpont) a
+    deliveries listába kerülnek. Az egyidejű kérések (pl. GetFile részek)
+    egymástól függetlenül, saját sávszélességgel futnak, mintha külön
+    kapcsolaton mennének.
+    """
+
+    def __init__(self, latency=0.02, bandwidth=50 * MB, upload_bandwidth=None, flood_every=0, flood_seconds=1,
+                 history_page=100, part_size=512 * 1024):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.upload_bandwidth = upload_bandwidth or bandwidth
+        self.flood_every = flood_every
+        self.flood_seconds = flood_seconds
+        self.history_page = history_page
+        self.part_size = part_size
+        self.flood_sleep_threshold = 60
+        self.channels = {}   # peer id -> Channel
+        self.history = {}    # peer id -> [FakeMessage, ...] növekvő azonosító szerint
+        self.deliveries = []  # (cél peer id, szöveg, időpont)
+        self.stats = {'requests': 0, 'sends': 0, 'flood_waits': 0, 'bytes_down': 0, 'bytes_up': 0}
+        self._handlers = []
+        self._connected = True
+        self._send_count = 0
+        self._media_ids = itertools.count(1)
+        self._sent_ids = {}
+        self._document_sizes = {}
+        self._updates = None
+        self._dispatcher = None
+
+    # --- Forrás oldal: csatornák és üzenetek előállítása ---
+
+    def add_channel(self, channel_id, title=None, username=None):
+        """Csatorna létrehozása; visszatérési érték a peer id"""
+        entity = Channel(
+            id=channel_id, title=title or f"Csatorna {channel_id}", photo=ChatPhotoEmpty(), date=None,
+            broadcast=True, access_hash=channel_id * 7919, username=username
+        )
+        peer_id = utils.get_peer_id(entity)
+        self.channels[peer_id] = entity
+        self.history[peer_id] = []
+        return peer_id
+
+    def make_photo(self, size):
+        photo_id = next(self._media_ids)
+        return MessageMediaPhoto(photo=Photo(
+            id=photo_id, access_hash=photo_id * 31, file_reference=b'ref', date=None,
+            sizes=[PhotoSize('y', 1280, 960, int(size))], dc_id=2
+        ))
+
+    def make_document(self, size, mime_type='video/mp4', name=None):
+        document_id = next(self._media_ids)
+        self._document_sizes[document_id] = int(size)
+        return MessageMediaDocument(document=Document(
+            id=document_id, access_hash=document_id * 31, file_reference=b'ref', date=None, mime_type=mime_type,
+            size=int(size), dc_id=2, attributes=[DocumentAttributeFilename(name or f"file_{document_id}.mp4")]
+        ))
+
+    def add_message(self, peer_id, text='', media=None, grouped_id=None, noforwards=False):
+        """Üzenet hozzáadása a history-hoz (élő frissítés nélkül)"""
+        history = self.history[peer_id]
+        message = FakeMessage(len(history) + 1, text, media, grouped_id, noforwards)
+        history.append(message)
+        return message
+
+    async def post(self, peer_id, text='', media=None, grouped_id=None, noforwards=False):
+        """Üzenet közzététele: history-ba kerül és NewMessage frissítésként érkezik"""
+        message = self.add_message(peer_id, text, media, grouped_id, noforwards)
+        if self._updates is None:
+            self._updates = asyncio.Queue()
+            self._dispatcher = asyncio.create_task(self._dispatch_updates())
+        await self._updates.put(SimpleNamespace(chat_id=peer_id, message=message))
+        return message
+
+    async def _dispatch_updates(self):
+        """Frissítések kézbesítése a regisztrált kezelőknek, érkezési sorrendben"""
+        while True:
+            event = await self._updates.get()
+            for callback, event_type in list(self._handlers):
+                if type(event_type) is events.NewMessage:
+                    try:
+                        await callback(event)
+                    except Exception as e:
+                        print(f"Hiba a kezelőben: {e}")
+
+    async def wait_for_deliveries(self, count, timeout=300):
+        """Várakozás, amíg legalább count kézbesítés megtörténik; False időtúllépéskor"""
+        deadline = time.monotonic() + timeout
+        while len(self.deliveries) < count:
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    # --- TelegramClient felület ---
+
+    def on(self, event):
+        def decorator(callback):
+            self.add_event_handler(callback, event)
+            return callback
+        return decorator
+
+    def add_event_handler(self, callback, event=None):
+        self._handlers.append((callback, event or events.Raw()))
+
+    def remove_event_handler(self, callback, event=None):
+        before = len(self._handlers)
+        self._handlers = [
+            (c, e) for c, e in self._handlers if not (c == callback and (event is None or type(e) is event))
+        ]
+        return before - len(self._handlers)
+
+    def list_event_handlers(self):
+        return list(self._handlers)
+
+    def is_connected(self):
+        return self._connected
+
+    async def connect(self):
+        self._connected = True
+
+    async def disconnect(self):
+        self._connected = False
+        if self._dispatcher:
+            self._dispatcher.cancel()
+
+    async def is_user_authorized(self):
+        return True
+
+    async def _request(self):
+        if not self._connected:
+            raise ConnectionError("nincs kapcsolat")
+        self.stats['requests'] += 1
+        await asyncio.sleep(self.latency)
+
+    async def _transfer(self, size, bandwidth):
+        """Fájlátvitel: részenként egy kérés (a Telethon a részeket egymás után kéri le és tölti fel)"""
+        parts = (size + self.part_size - 1) // self.part_size
+        for _ in range(parts):
+            await self._request()
+        if size:
+            await asyncio.sleep(size / bandwidth)
+
+    def _resolve(self, entity):
+        if isinstance(entity, Channel):
+            return utils.get_peer_id(entity)
+        if isinstance(entity, str):
+            if entity.startswith('@'):
+                for peer_id, channel in self.channels.items():
+                    if channel.username and channel.username.lower() == entity[1:].lower():
+                        return peer_id
+                raise ValueError(f"Ismeretlen felhasználónév: {entity}")
+            entity = int(entity)
+        if entity in self.channels:
+            return entity
+        raise ValueError(f"Ismeretlen entitás: {entity}")
+
+    async def get_entity(self, entity):
+        await self._request()
+        return self.channels[self._resolve(entity)]
+
+    async def get_dialogs(self, limit=None):
+        await self._request()
+        return [SimpleNamespace(entity=channel, id=peer_id) for peer_id, channel in self.channels.items()][:limit]
+
+    async def get_messages(self, entity, limit=None, ids=None, offset_date=None, **kwargs):
+        await self._request()
+        history = self.history[self._resolve(entity)]
+        if ids is not None:
+            by_id = {m.id: m for m in history}
+            return [by_id.get(i) for i in ids]
+        if offset_date is not None:
+            history = [m for m in history if m.date < offset_date]
+        return list(reversed(history))[:limit]
+
+    async def iter_messages(self, entity, limit=None, min_id=0, max_id=0, reverse=False, wait_time=None, **kwargs):
+        history = [
+            m for m in self.history[self._resolve(entity)] if m.id > min_id and (not max_id or m.id < max_id)
+        ]
+        if not reverse:
+            history.reverse()
+        for index, message in enumerate(history[:limit]):
+            if index % self.history_page == 0:
+                await self._request()
+            yield message
+
+    async def download_media(self, message, file=None):
+        size = message.file.size
+        await self._transfer(size, self.bandwidth)
+        self.stats['bytes_down'] += size
+        # Egyedi fejléc, hogy a tartalom alapú gyorsítótár ne tekintse azonosnak a fájlokat
+        with open(file, 'wb') as f:
+            f.write(f"{message.id}:{id(message)}".encode())
+            f.truncate(size)
+        return file
+
+    async def iter_download(self, media, chunk_size=512 * 1024, file_size=None, **kwargs):
+        remaining = file_size
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            await self._transfer(size, self.bandwidth)
+            self.stats['bytes_down'] += size
+            remaining -= size
+            yield bytes(size)
+
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        if isinstance(request, GetHistoryRequest):
+            await self._request()
+            history = self.history[self._resolve(request.peer)]
+            return SimpleNamespace(messages=list(reversed(history))[:request.limit])
+        if isinstance(request, (SaveFilePartRequest, SaveBigFilePartRequest)):
+            await self._transfer(len(request.bytes), self.upload_bandwidth)
+            self.stats['bytes_up'] += len(request.bytes)
+            return True
+        if isinstance(request, GetFileRequest):
+            size = self._document_sizes[request.location.id]
+            length = max(0, min(request.limit, size - request.offset))
+            await self._transfer(length, self.bandwidth)
+            self.stats['bytes_down'] += length
+            data = bytes(length)
+            if request.offset == 0:
+                # Egyedi fejléc, mint a download_media-nál
+                header = f"{request.location.id}:".encode()[:length]
+                data = header + data[len(header):]
+            return UploadFile(type=FileUnknown(), mtime=0, bytes=data)
+        raise NotImplementedError(type(request).__name__)
+
+    async def _upload(self, file):
+        """Elküldendő fájl feldolgozása; a cél üzenet médiáját adja vissza"""
+        if file is None:
+            return None
+        if isinstance(file, str):
+            size = os.path.getsize(file)
+            await self._transfer(size, self.upload_bandwidth)
+            self.stats['bytes_up'] += size
+            return self.make_document(size) if not file.endswith('.jpg') else self.make_photo(size)
+        if isinstance(file, InputMediaUploadedPhoto):
+            return self.make_photo(0)
+        if isinstance(file, InputMediaUploadedDocument):
+            return self.make_document(0, file.mime_type)
+        # Szerveroldali továbbküldés: a média hivatkozás változatlan
+        return file
+
+    async def _send(self, entity, items):
+        await self._request()
+        self._send_count += 1
+        if self.flood_every and self._send_count % self.flood_every == 0:
+            self.stats['flood_waits'] += 1
+            raise FloodWaitError(None, capture=self.flood_seconds)
+        peer_id = self._resolve(entity)
+        sent = []
+        for text, file in items:
+            media = await self._upload(file)
+            self._sent_ids[peer_id] = self._sent_ids.get(peer_id, 0) + 1
+            message = FakeMessage(self._sent_ids[peer_id], text or '', media)
+            self.deliveries.append((peer_id, text, time.monotonic()))
+            sent.append(message)
+        self.stats['sends'] += 1
+        return sent
+
+    async def send_message(self, entity, message='', file=None, **kwargs):
+        return (await self._send(entity, [(message, file)]))[0]
+
+    async def send_file(self, entity, file, caption=None, **kwargs):
+        files = file if isinstance(file, (list, tuple)) else [file]
+        captions = caption if isinstance(caption, (list, tuple)) else [caption] + [None] * (len(files) - 1)
+        return await self._send(entity, list(zip(captions, files)))
+
+    async def edit_message(self, entity, message, text=None, file=None, **kwargs):
+        await self._request()
+        return FakeMessage(message, text or '', await self._upload(file))
+
+    async def delete_messages(self, entity, message_ids, **kwargs):
+        await self._request()
+        return []
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Teljesítménymérés a MessageCopier és a TelegramClientManager számára, élő fiók nélkül
+
+Futtatás a projekt gyökeréből:
+
+    python -m benchmarks.run                       # összes forgatókönyv
+    python -m benchmarks.run -s live_burst -s fan_out --output eredmeny.json
+    python -m benchmarks.run --compare elozo.json  # regresszió esetén 1-es kilépési kód
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_telegram import MB, FakeTelegramClient  # noqa: E402
+from entity_cache import EntityCache  # noqa: E402
+from media_cache import MediaHandleCache  # noqa: E402
+from message_copier import MessageCopier  # noqa: E402
+from message_ledger import MessageLedger  # noqa: E402
+from parallel_transfer import TransferEngine  # noqa: E402
+from rate_limiter import RateLimiter  # noqa: E402
+from spool import OutboundSpool  # noqa: E402
+from telethon_client import TelegramClientManager  # noqa: E402
+
+# Az éles alapértelmezett korlátok mellett a mérés a korlátozót mérné, nem a másolót
+BENCH_RATES = {'global_rate': 1000.0, 'global_burst': 1000, 'destination_rate': 1000.0, 'destination_burst': 1000}
+
+
+def percentile(values, fraction):
+    """Percentilis lineáris interpolációval (üres listára None)"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def current_rss():
+    """A folyamat pillanatnyi rezidens memóriája bájtban"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # /proc nélkül csak a folyamat eddigi csúcsa érhető el (Linuxon KB, macOS-en bájt)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def directory_size(path):
+    total = 0
+    try:
+        for entry in os.scandir(path):
+            if entry.is_file(follow_symlinks=False):
+                total += entry.stat().st_size
+    except OSError:
+        pass
+    return total
+
+
+class ResourceSampler:
+    """Memória és ideiglenes lemezhasználat csúcsának mintavételezése a mérés alatt"""
+
+    def __init__(self, temp_dir, interval=0.02):
+        self.temp_dir = temp_dir
+        self.interval = interval
+        self.rss_start = current_rss()
+        self.peak_rss = self.rss_start
+        self.peak_temp_disk = 0
+        self._task = None
+
+    def sample(self):
+        self.peak_rss = max(self.peak_rss, current_rss())
+        self.peak_temp_disk = max(self.peak_temp_disk, directory_size(self.temp_dir))
+
+    async def _run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.sample()
+
+
+# --- Terhelések: üzeneteket állítanak elő, és visszaadják a várt kézbesítések számát ---
+
+async def live_burst(client, copier, sources, destinations, scale):
+    """Vegyes élő forgalom: 70% szöveg, 30% fotó, olyan gyorsan, ahogy a másoló fogadja"""
+    count = int(500 * scale)
+    for i in range(count):
+        media = client.make_photo(200 * 1024) if i % 10 < 3 else None
+        await client.post(sources[0], f"live {i}", media)
+    return count * len(destinations)
+
+
+async def albums(client, copier, sources, destinations, scale):
+    """Élő albumok (5 fotó albumonként) újrafeltöltéssel"""
+    count = int(50 * scale)
+    for album in range(count):
+        for i in range(5):
+            await client.post(sources[0], f"album {album}/{i}", client.make_photo(300 * 1024), grouped_id=album + 1)
+    return count * 5 * len(destinations)
+
+
+async def large_documents(client, copier, sources, destinations, scale):
+    """Nagy videók újrafeltöltése (a streamelés és a lemezes út összevetéséhez)"""
+    count = max(1, int(6 * scale))
+    for i in range(count):
+        await client.post(sources[0], f"video {i}", client.make_document(40 * MB))
+    return count * len(destinations)
+
+
+async def fan_out(client, copier, sources, destinations, scale):
+    """Védett (nem továbbküldhető) fotók több célba: egy átvitel, a többi cél a gyorsítótárból"""
+    count = int(100 * scale)
+    for i in range(count):
+        await client.post(sources[0], f"fan-out {i}", client.make_photo(500 * 1024), noforwards=True)
+    return count * len(destinations)
+
+
+async def backfill(client, copier, sources, destinations, scale):
+    """Előzmények másolása a backfill sávban (szöveg, továbbküldhető fotó, albumok)"""
+    count = int(2000 * scale)
+    for i in range(count):
+        if i % 20 in (0, 1, 2):
+            client.add_message(sources[0], f"history {i}", client.make_photo(100 * 1024), grouped_id=i // 20 + 1)
+        elif i % 4 == 0:
+            client.add_message(sources[0], f"history {i}", client.make_photo(100 * 1024))
+        else:
+            client.add_message(sources[0], f"history {i}")
+    # Az előzmények már "régiek": a késleltetés a backfill indulásától számít
+    now = time.monotonic()
+    for message in client.history[sources[0]]:
+        message.posted_at = now
+    copier.backfill_task = asyncio.create_task(copier.run_backfill(source=sources[0]))
+    return count * len(destinations)
+
+
+async def flood_wait(client, copier, sources, destinations, scale):
+    """Szöveges sorozat, ahol minden 50. küldés FloodWaitError-t kap"""
+    count = int(300 * scale)
+    for i in range(count):
+        await client.post(sources[0], f"flood {i}")
+    return count * len(destinations)
+
+
+SCENARIOS = [
+    {
+        'name': 'live_burst',
+        'workload': live_burst,
+        'client': {'latency': 0.02},
+        'copier': {}
+    },
+    {
+        'name': 'albums',
+        'workload': albums,
+        'client': {'latency': 0.02, 'bandwidth': 20 * MB},
+        'copier': {'relay_media': False, 'album_window': 0.2}
+    },
+    {
+        'name': 'large_documents_stream',
+        'workload': large_documents,
+        'client': {'latency': 0.05, 'bandwidth': 100 * MB},
+        'copier': {'relay_media': False, 'stream_media': True}
+    },
+    {
+        'name': 'large_documents_disk',
+        'workload': large_documents,
+        'client': {'latency': 0.05, 'bandwidth': 100 * MB},
+        'copier': {'relay_media': False, 'stream_media': False}
+    },
+    {
+        'name': 'large_documents_parallel',
+        'workload': large_documents,
+        'client': {'latency': 0.05, 'bandwidth': 100 * MB},
+        'copier': {'relay_media': False, 'stream_media': True, 'transfer_engine': TransferEngine(connections=4)}
+    },
+    {
+        'name': 'large_documents_parallel_disk',
+        'workload': large_documents,
+        'client': {'latency': 0.05, 'bandwidth': 100 * MB},
+        'copier': {'relay_media': False, 'stream_media': False, 'transfer_engine': TransferEngine(connections=4)}
+    },
+    {
+        'name': 'fan_out',
+        'workload': fan_out,
+        'destinations': 5,
+        'client': {'latency': 0.02, 'bandwidth': 20 * MB},
+        'copier': {}
+    },
+    {
+        'name': 'backfill',
+        'workload': backfill,
+        'client': {'latency': 0.02},
+        'copier': {}
+    },
+    {
+        'name': 'flood_wait',
+        'workload': flood_wait,
+        'client': {'latency': 0.01, 'flood_every': 50, 'flood_seconds': 1},
+        'copier': {}
+    },
+    {'name': 'dialogs'}
+]
+
+
+async def run_copier_scenario(scenario, scale, timeout):
+    """Egy másolási forgatókönyv lefuttatása; az eredmény egy szótár"""
+    workdir = tempfile.mkdtemp(prefix='telegram_copier_bench_')
+    client = FakeTelegramClient(**scenario.get('client', {}))
+    sources = [client.add_channel(1000)]
+    destinations = [client.add_channel(2000 + i) for i in range(scenario.get('destinations', 1))]
+    ledger = MessageLedger(os.path.join(workdir, 'ledger.db'))
+    copier = MessageCopier(
+        client,
+        routes=[{'source': str(sources[0]), 'destinations': [str(d) for d in destinations]}],
+        rate_limiter=RateLimiter(**BENCH_RATES),
+        ledger=ledger,
+        spool=OutboundSpool(os.path.join(workdir, 'spool.log')),
+        media_cache=MediaHandleCache(),
+        **scenario.get('copier', {})
+    )
+    sampler = ResourceSampler(copier.temp_dir)
+    copier_task = asyncio.create_task(copier.start_copying())
+    try:
+        while copier.pipeline is None or not copier.supervisor:
+            if copier_task.done():
+                raise RuntimeError("a másoló nem indult el")
+            await asyncio.sleep(0.01)
+
+        sampler.start()
+        started = time.monotonic()
+        expected = await scenario['workload'](client, copier, sources, destinations, scale)
+        completed = await client.wait_for_deliveries(expected, timeout)
+        elapsed = time.monotonic() - started
+        await sampler.stop()
+    finally:
+        copier.stop_copying()
+        await asyncio.gather(copier_task, return_exceptions=True)
+        if getattr(copier, 'backfill_task', None):
+            await asyncio.gather(copier.backfill_task, return_exceptions=True)
+        await client.disconnect()
+        copier.cleanup()
+        ledger.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    posted = {text: message.posted_at for peer_id in sources for message in client.history[peer_id]
+              for text in [message.text]}
+    lags = [delivered_at - posted[text] for _, text, delivered_at in client.deliveries if text in posted]
+    delivered = len(client.deliveries)
+    return {
+        'completed': completed,
+        'messages': delivered // len(destinations),
+        'deliveries': delivered,
+        'expected_deliveries': expected,
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_per_second': round(delivered / len(destinations) / elapsed, 2) if elapsed else None,
+        'deliveries_per_second': round(delivered / elapsed, 2) if elapsed else None,
+        'lag_p50_seconds': round(percentile(lags, 0.5), 4) if lags else None,
+        'lag_p99_seconds': round(percentile(lags, 0.99), 4) if lags else None,
+        'peak_rss_mb': round(sampler.peak_rss / MB, 1),
+        'rss_growth_mb': round((sampler.peak_rss - sampler.rss_start) / MB, 1),
+        'peak_temp_disk_mb': round(sampler.peak_temp_disk / MB, 1),
+        'requests': client.stats['requests'],
+        'flood_waits': client.stats['flood_waits'],
+        'bytes_down_mb': round(client.stats['bytes_down'] / MB, 1),
+        'bytes_up_mb': round(client.stats['bytes_up'] / MB, 1),
+        'modes': dict(copier.mode_counts)
+    }
+
+
+async def run_dialogs_scenario(scenario, scale, timeout):
+    """TelegramClientManager: csatornalista és entitás lekérése hidegen és gyorsítótárból"""
+    workdir = tempfile.mkdtemp(prefix='telegram_copier_bench_')
+    client = FakeTelegramClient(latency=0.05)
+    peers = [client.add_channel(3000 + i, username=f"bench{i}") for i in range(int(500 * scale))]
+    manager = TelegramClientManager(0, '', os.path.join(workdir, 'session.session'))
+    manager.client = client
+    manager.entity_cache = EntityCache(client, path=os.path.join(workdir, 'entity_cache.json'))
+    sampler = ResourceSampler(workdir)
+    sampler.start()
+    try:
+        started = time.monotonic()
+        channels = await manager.get_channels()
+        cold = time.monotonic() - started
+
+        timings = []
+        for peer_id in peers:
+            call_started = time.monotonic()
+            await manager.get_entity_by_id(peer_id)
+            timings.append(time.monotonic() - call_started)
+        for _ in range(100):
+            call_started = time.monotonic()
+            await manager.get_channels()
+            timings.append(time.monotonic() - call_started)
+        elapsed = time.monotonic() - started
+        await sampler.stop()
+    finally:
+        await client.disconnect()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'completed': len(channels) == len(peers),
+        'channels': len(channels),
+        'elapsed_seconds': round(elapsed, 3),
+        'cold_get_channels_seconds': round(cold, 4),
+        'cached_call_p50_seconds': round(percentile(timings, 0.5), 6),
+        'cached_call_p99_seconds': round(percentile(timings, 0.99), 6),
+        'requests': client.stats['requests'],
+        'peak_rss_mb': round(sampler.peak_rss / MB, 1),
+        'rss_growth_mb': round((sampler.peak_rss - sampler.rss_start) / MB, 1)
+    }
+
+
+async def run_scenarios(names, scale, timeout, verbose):
+    results = {}
+    for scenario in SCENARIOS:
+        if names and scenario['name'] not in names:
+            continue
+        runner = run_dialogs_scenario if scenario['name'] == 'dialogs' else run_copier_scenario
+        # A másoló üzenetenkénti kiírásai elnyomva; a mérésben a kiírás költsége benne marad
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            result = await runner(scenario, scale, timeout)
+        results[scenario['name']] = result
+        summary = ', '.join(f"{key}={value}" for key, value in result.items() if not isinstance(value, dict))
+        print(f"{scenario['name']}: {summary}", file=sys.stderr)
+    return results
+
+
+# Regressziónak számító változás iránya metrikánként (+1: a nagyobb a jobb)
+COMPARED = {
+    'messages_per_second': 1,
+    'lag_p50_seconds': -1,
+    'lag_p99_seconds': -1,
+    'peak_rss_mb': -1,
+    'peak_temp_disk_mb': -1,
+    'cold_get_channels_seconds': -1
+}
+
+
+def compare(baseline, results, tolerance):
+    """Összevetés egy korábbi futással; visszatérési érték a regressziók listája"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for key, direction in COMPARED.items():
+            old, new = previous.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction < -tolerance:
+                regressions.append(f"{name}.{key}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--scenario', action='append', choices=[s['name'] for s in SCENARIOS],
+                        help='csak a megadott forgatókönyv(ek) futtatása')
+    parser.add_argument('--scale', type=float, default=1.0, help='üzenetszámok szorzója (alapértelmezés: 1.0)')
+    parser.add_argument('--timeout', type=float, default=300, help='forgatókönyvenkénti időkorlát másodpercben')
+    parser.add_argument('--output', help='JSON eredmény fájlba írása (alapértelmezés: standard kimenet)')
+    parser.add_argument('--compare', help='korábbi JSON eredmény a regressziók kereséséhez')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='megengedett romlás aránya (alapértelmezés: 0.2)')
+    parser.add_argument('--verbose', action='store_true', help='a másoló kiírásainak megjelenítése')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_scenarios(args.scenario, args.scale, args.timeout, args.verbose))
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'scenarios': results
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    failed = [name for name, result in results.items() if not result['completed']]
+    for name in failed:
+        print(f"Időtúllépés: {name}", file=sys.stderr)
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"Regresszió: {line}", file=sys.stderr)
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
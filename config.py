@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import copy
 import json
 import os
+import threading
 
 CONFIG_FILE = os.path.join('data', 'config.json')
 
@@ -13,48 +15,147 @@ def get_default_config():
         'api_hash': '',
         'source_channel_id': '',
         'destination_channel_id': '',
-        'phone_number': ''
+        'phone_number': '',
+        'relay_media': True,
+        'album_window': 0.5,
+        'download_workers': 3,
+        'queue_size': 100,
+        'reorder_timeout': 10,
+        'global_rate': 20,
+        'destination_rate': 1,
+        'routes': [],
+        'delete_window': 1,
+        'entity_cache_ttl': 86400,
+        'dialog_cache_ttl': 300,
+        'stream_media': True,
+        'stream_chunk_kb': 512,
+        'stream_buffer_mb': 8,
+        'media_cache_size': 500,
+        'media_cache_ttl': 3600,
+        'rules': [],
+        'sender_sessions': [],
+        'health_check_interval': 60,
+        'reconnect_max_delay': 300,
+        'retry_policies': {},
+        'loop_stall_threshold_ms': 100,
+        'image_transform': False,
+        'image_max_width': 2560,
+        'image_max_height': 2560,
+        'image_quality': 85,
+        'image_format': 'jpeg',
+        'image_strip_metadata': True,
+        'image_workers': 2,
+        'transfer_connections': 4,
+        'transfer_part_kb': 512,
+        'transfer_min_mb': 10
     }
 
-def load_config():
-    """Konfiguráció betöltése fájlból"""
+# Folyamatszintű gyorsítótár: a fájl csak akkor kerül újraolvasásra, ha a stat (mtime, méret) változott
+_cache = {'stat': None, 'config': None}
+_lock = threading.RLock()
+_subscribers = []
+
+def _file_stat():
+    """A konfigurációs fájl (mtime, méret) párja, vagy None, ha nem létezik"""
     try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # Alapértelmezett értékek hozzáadása, ha hiányoznak
-                default_config = get_default_config()
-                for key, value in default_config.items():
-                    if key not in config:
-                        config[key] = value
-                return config
-        else:
-            return get_default_config()
-    except Exception as e:
-        print(f"Hiba a konfiguráció betöltése során: {e}")
-        return get_default_config()
+        st = os.stat(CONFIG_FILE)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _with_defaults(config):
+    """Alapértelmezett értékek hozzáadása, ha hiányoznak"""
+    default_config = get_default_config()
+    for key, value in default_config.items():
+        if key not in config:
+            config[key] = value
+    return config
+
+def _notify(config):
+    """Feliratkozók értesítése a megváltozott konfigurációról"""
+    for callback in list(_subscribers):
+        try:
+            callback(copy.deepcopy(config))
+        except Exception as e:
+            print(f"Hiba a konfiguráció változásának kezelése során: {e}")
+
+def subscribe(callback):
+    """Feliratkozás a konfiguráció változásaira; a callback az új konfigurációt kapja"""
+    with _lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+
+def unsubscribe(callback):
+    """Leiratkozás a konfiguráció változásairól"""
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+def load_config():
+    """Konfiguráció betöltése (gyorsítótárból, ha a fájl nem változott)
+
+    A visszaadott szótár másolat, szabadon módosítható.
+    """
+    changed = None
+    with _lock:
+        stat = _file_stat()
+        if _cache['config'] is None or stat != _cache['stat']:
+            try:
+                if stat is not None:
+                    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                        config = _with_defaults(json.load(f))
+                else:
+                    config = get_default_config()
+            except Exception as e:
+                print(f"Hiba a konfiguráció betöltése során: {e}")
+                # Hibás fájl esetén az utolsó érvényes konfiguráció marad érvényben
+                return copy.deepcopy(_cache['config']) if _cache['config'] is not None else get_default_config()
+            # Külső módosítás (nem save_config) esetén is értesítjük a feliratkozókat
+            if _cache['config'] is not None and config != _cache['config']:
+                changed = config
+            _cache['stat'] = stat
+            _cache['config'] = config
+        result = copy.deepcopy(_cache['config'])
+    if changed is not None:
+        _notify(changed)
+    return result
 
 def save_config(config_data):
-    """Konfiguráció mentése fájlba"""
+    """Konfiguráció mentése fájlba (ideiglenes fájlba írás, majd atomikus csere)"""
     try:
         # Adatok könyvtár létrehozása, ha nem létezik
         os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
         
-        # Meglévő konfiguráció betöltése
-        existing_config = load_config()
-        
-        # Új adatok hozzáadása/frissítése
-        existing_config.update(config_data)
-        
-        # Mentés
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(existing_config, f, indent=2, ensure_ascii=False)
+        with _lock:
+            # Meglévő konfiguráció betöltése
+            existing_config = load_config()
+            
+            # Új adatok hozzáadása/frissítése
+            existing_config.update(config_data)
+            
+            # Mentés: az olvasók soha nem látnak félig megírt fájlt
+            temp_file = CONFIG_FILE + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(existing_config, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, CONFIG_FILE)
+            
+            _cache['stat'] = _file_stat()
+            _cache['config'] = existing_config
         
+        _notify(existing_config)
         return True
     except Exception as e:
         print(f"Hiba a konfiguráció mentése során: {e}")
         return False
 
+def has_routes(config):
+    """Ellenőrzi, hogy van-e legalább egy beállított útvonal"""
+    if config.get('routes'):
+        return True
+    return bool(config.get('source_channel_id') and config.get('destination_channel_id'))
+
 def get_config_value(key, default=None):
     """Egy konkrét konfigurációs érték lekérése"""
     config = load_config()
@@ -62,6 +163,4 @@ def get_config_value(key, default=None):
 
 def set_config_value(key, value):
     """Egy konkrét konfigurációs érték beállítása"""
-    config = load_config()
-    config[key] = value
-    return save_config(config)
+    return save_config({key: value})
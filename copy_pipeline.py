@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class CopyPipeline:
+    """Többszakaszos másolási folyamat
+
+    Korlátos bemeneti sor -> párhuzamos előkészítő (letöltő) workerek ->
+    egyetlen küldő szakasz, amely egy üzenetazonosító szerinti átrendező
+    pufferrel a forrás sorrendjében kézbesít. Ha a sor megtelt, a submit()
+    addig vár, amíg hely nem szabadul fel (backpressure).
+
+    Az elemek sávokba (lane) sorolhatók: a sorrend sávon belül érvényes, a
+    küldő pedig mindig a legkisebb prioritásszámú sávból kézbesít először
+    (így pl. a history backfill enged az élő forgalomnak).
+    """
+
+    def __init__(self, prepare, deliver, workers=3, queue_size=100, reorder_timeout=10.0):
+        self.prepare = prepare
+        self.deliver = deliver
+        self.workers = max(1, int(workers))
+        # Ennyi ideig várunk egy lassú elemre, mielőtt a mögötte állókat kiengednénk
+        self.reorder_timeout = reorder_timeout
+        self._queue = asyncio.Queue(maxsize=max(1, int(queue_size)))
+        self._pending = {}  # sáv -> {kulcs: foglalás időpontja}, még nem előkészített elemek
+        self._ready = {}    # sáv -> (kulcs, sorszám, előkészített elem) kupac
+        self._priorities = {}
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self._delivering = False
+        self._aborted = False
+        self._tasks = []
+        self.stats = {
+            'submitted': 0,
+            'prepared': 0,
+            'delivered': 0,
+            'failed': 0,
+            'out_of_order': 0
+        }
+
+    async def start(self):
+        """Workerek és a küldő szakasz indítása"""
+        if self._tasks:
+            return
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        self._tasks.append(asyncio.create_task(self._sender()))
+
+    async def stop(self, drain=True):
+        """Folyamat leállítása, alapértelmezetten a sorban lévő elemek kézbesítése után"""
+        if drain:
+            while self._tasks and not self._aborted and (
+                    self.lane_size() or not self._queue.empty() or self._delivering):
+                await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def abort(self):
+        """A folyamatban lévő (vagy későbbi) stop() ne várja meg a sorban lévő elemek kézbesítését"""
+        self._aborted = True
+
+    def set_priority(self, lane, priority):
+        """Sáv prioritásának beállítása (kisebb szám = előbb kézbesül)"""
+        self._priorities[lane] = priority
+
+    def lane_size(self, lane=None, priority=None):
+        """Egy sáv, egy prioritás sávjai vagy az összes sáv még nem kézbesített elemeinek száma"""
+        if lane is not None:
+            lanes = [lane]
+        else:
+            lanes = set(self._pending) | set(self._ready)
+            if priority is not None:
+                lanes = [l for l in lanes if self._priorities.get(l, 0) == priority]
+        return sum(len(self._pending.get(l, ())) + len(self._ready.get(l, ())) for l in lanes)
+
+    def reserve(self, key, lane='live'):
+        """Hely foglalása a sorrendben egy később beküldött elemnek (pl. gyűjtés alatt álló album)"""
+        self._pending.setdefault(lane, {}).setdefault(key, time.monotonic())
+
+    def cancel(self, key, lane='live'):
+        """Lefoglalt, de be nem küldött hely felszabadítása (pl. szűrő által eldobott album)"""
+        self._pending.get(lane, {}).pop(key, None)
+        self._changed.set()
+    
+    async def submit(self, key, item, lane='live'):
+        """Elem beküldése; teli sor esetén vár (backpressure)"""
+        self.reserve(key, lane)
+        self.stats['submitted'] += 1
+        await self._queue.put((lane, key, item))
+
+    def get_status(self):
+        """Sorhossz és számlálók lekérése"""
+        status = dict(self.stats)
+        status.update({
+            'queue_depth': self._queue.qsize(),
+            'in_progress': sum(len(p) for p in self._pending.values()),
+            'waiting_for_order': sum(len(r) for r in self._ready.values()),
+            'workers': self.workers
+        })
+        return status
+
+    async def _worker(self):
+        """Előkészítő szakasz: elemek kivétele a sorból és letöltése"""
+        while True:
+            lane, key, item = await self._queue.get()
+            prepared = None
+            try:
+                prepared = await self.prepare(item)
+                self.stats['prepared'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"Hiba az üzenet előkészítése során ({key}): {e}")
+            finally:
+                self._queue.task_done()
+
+            # Sikertelen előkészítés esetén is felszabadítjuk a helyet a sorrendben
+            self._pending.get(lane, {}).pop(key, None)
+            heapq.heappush(self._ready.setdefault(lane, []), (key, next(self._seq), prepared))
+            self._changed.set()
+
+    def _lane_head(self, lane):
+        """A sáv következő eleme, ha a sorrend megengedi a kézbesítését"""
+        ready = self._ready.get(lane)
+        if not ready:
+            return None
+
+        key = ready[0][0]
+        pending = self._pending.get(lane)
+        if pending:
+            oldest_key = min(pending)
+            if oldest_key < key:
+                # Egy korábbi elem még készül; csak az időkorlát lejárta után lépjük át
+                if time.monotonic() - pending[oldest_key] < self.reorder_timeout:
+                    return None
+                return 'late'
+        return 'ok'
+
+    def _next_ready(self):
+        """A következő kézbesíthető elem kivétele a legmagasabb prioritású sávból"""
+        for lane in sorted(self._ready, key=lambda l: self._priorities.get(l, 0)):
+            head = self._lane_head(lane)
+            if head is None:
+                continue
+            if head == 'late':
+                self.stats['out_of_order'] += 1
+            key, _, prepared = heapq.heappop(self._ready[lane])
+            return key, prepared
+        return None
+
+    def _wait_timeout(self):
+        """Meddig várjon a küldő, mielőtt újra ellenőrzi az átrendező puffert"""
+        reserved = [
+            min(self._pending[lane].values())
+            for lane, ready in self._ready.items()
+            if ready and self._pending.get(lane)
+        ]
+        if not reserved:
+            return None
+        return max(0.0, min(reserved) + self.reorder_timeout - time.monotonic())
+
+    async def _sender(self):
+        """Küldő szakasz: kézbesítés a forrás sorrendjében"""
+        while True:
+            entry = self._next_ready()
+            if entry is None:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), self._wait_timeout())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            key, prepared = entry
+            if prepared is None:
+                continue
+
+            self._delivering = True
+            try:
+                await self.deliver(prepared)
+                self.stats['delivered'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"Hiba az üzenet kézbesítése során ({key}): {e}")
+            finally:
+                self._delivering = False
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+import os
+import threading
+import time
+from telethon import utils
+from telethon.extensions import BinaryReader
+from telethon.tl.types import Channel, Chat
+
+CACHE_FILE = os.path.join('data', 'entity_cache.json')
+
+
+class EntityCache:
+    """Entitások és a dialóguslista közös gyorsítótára
+
+    Az entitások (csatornák, chatek, felhasználók) a bemeneti azonosító
+    (@username, peer id, nyers id) normalizált kulcsa alatt tárolódnak, így a
+    találat hálózati kérés nélkül szolgálható ki. A dialóguslistából kinyert
+    csatornák is ide kerülnek. A tartalom a data/ könyvtárba mentődik, így
+    újraindítás után sem kell mindent újra lekérni.
+    """
+
+    def __init__(self, client, path=CACHE_FILE, entity_ttl=86400, dialog_ttl=300):
+        self.client = client
+        self.path = path
+        self.entity_ttl = entity_ttl
+        self.dialog_ttl = dialog_ttl
+        self._entities = {}  # kulcs -> (entitás, lekérés időpontja)
+        self._channels = []
+        self._dialogs_fetched_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'dialog_refreshes': 0}
+        self._load()
+
+    @staticmethod
+    def normalize_key(channel_id):
+        """Bemeneti azonosító egységes kulcsra alakítása ('@name' kisbetűvel, számok egész értékként)
+
+        Csak a puszta felhasználónév és a numerikus azonosító alakul át; minden
+        más (t.me link, +36... telefonszám, meghívó) változatlanul marad, és
+        így kerül a client.get_entity-hez is.
+        """
+        if isinstance(channel_id, int):
+            return str(channel_id)
+        key = str(channel_id).strip()
+        if key.lstrip('-').isdigit():
+            return str(int(key))
+        if utils.VALID_USERNAME_RE.match(key[1:] if key.startswith('@') else key):
+            return '@' + key.lstrip('@').lower()
+        return key
+
+    def _store(self, entity, fetched_at, *keys):
+        """Entitás tárolása a peer id-ja, nyers id-ja, @username-e és a megadott kulcsok alatt"""
+        keys = set(keys)
+        keys.add(str(utils.get_peer_id(entity)))
+        keys.add(str(entity.id))
+        if getattr(entity, 'username', None):
+            keys.add('@' + entity.username.lower())
+        with self._lock:
+            for key in keys:
+                self._entities[key] = (entity, fetched_at)
+
+    async def get_entity(self, channel_id):
+        """Entitás lekérése; friss találat esetén hálózati kérés nélkül"""
+        key = self.normalize_key(channel_id)
+        entry = self._entities.get(key)
+        if entry and time.time() - entry[1] < self.entity_ttl:
+            self.stats['hits'] += 1
+            return entry[0]
+
+        self.stats['misses'] += 1
+        try:
+            entity = await self.client.get_entity(int(key) if key.lstrip('-').isdigit() else key)
+        except Exception:
+            # Lejárt bejegyzés esetén inkább a régi entitás, mint a hiba
+            if entry:
+                return entry[0]
+            raise
+        self._store(entity, time.time(), key)
+        self.save()
+        return entity
+
+    def get_channels(self):
+        """A gyorsítótárazott csatornalista (hálózati kérés nélkül)"""
+        return list(self._channels)
+
+    def has_dialogs(self):
+        """Volt-e már sikeres dialóguslista lekérés"""
+        return self._dialogs_fetched_at > 0
+
+    def dialogs_stale(self):
+        """Lejárt-e a dialóguslista"""
+        return time.time() - self._dialogs_fetched_at >= self.dialog_ttl
+
+    def start_refresh(self):
+        """Háttérfrissítés megkezdésének jelzése; False, ha már fut egy"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def finish_refresh(self):
+        """Háttérfrissítés befejezésének jelzése"""
+        with self._lock:
+            self._refreshing = False
+
+    async def refresh_dialogs(self):
+        """Dialóguslista újratöltése; a csatornák entitásai is a gyorsítótárba kerülnek"""
+        dialogs = await self.client.get_dialogs()
+        now = time.time()
+        channels = []
+        for dialog in dialogs:
+            entity = dialog.entity
+            if isinstance(entity, (Channel, Chat)):
+                channels.append({
+                    "id": entity.id,
+                    "title": entity.title,
+                    "username": getattr(entity, "username", None),
+                    "type": "channel" if isinstance(entity, Channel) else "chat"
+                })
+                self._store(entity, now)
+        self._channels = channels
+        self._dialogs_fetched_at = now
+        self.stats['dialog_refreshes'] += 1
+        self.save()
+        return channels
+
+    def get_status(self):
+        """Gyorsítótár statisztikák"""
+        return {
+            'entities': len(self._entities),
+            'channels': len(self._channels),
+            'dialogs_age': round(time.time() - self._dialogs_fetched_at) if self._dialogs_fetched_at else None,
+            'refreshing': self._refreshing,
+            **self.stats
+        }
+
+    def _load(self):
+        """Mentett pillanatkép betöltése"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            objects = {}
+            for key, (blob, fetched_at) in data.get('entities', {}).items():
+                # Az azonos entitásra mutató kulcsok ugyanazt a példányt kapják
+                if blob not in objects:
+                    objects[blob] = BinaryReader(base64.b64decode(blob)).tgread_object()
+                self._entities[key] = (objects[blob], fetched_at)
+            self._channels = data.get('channels', [])
+            self._dialogs_fetched_at = data.get('dialogs_fetched_at', 0.0)
+        except Exception as e:
+            print(f"Hiba az entitás gyorsítótár betöltése során: {e}")
+
+    def save(self):
+        """Pillanatkép mentése (atomikus cserével)"""
+        try:
+            with self._lock:
+                blobs = {}
+                entities = {}
+                for key, (entity, fetched_at) in self._entities.items():
+                    if id(entity) not in blobs:
+                        blobs[id(entity)] = base64.b64encode(bytes(entity)).decode('ascii')
+                    entities[key] = (blobs[id(entity)], fetched_at)
+                data = {
+                    'entities': entities,
+                    'channels': self._channels,
+                    'dialogs_fetched_at': self._dialogs_fetched_at
+                }
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Hiba az entitás gyorsítótár mentése során: {e}")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+
+from telethon.tl.types import DocumentAttributeSticker, MessageMediaDocument, MessageMediaPhoto
+
+import metrics
+
+# Ezeket a képformátumokat alakítjuk át; az animált (GIF) és a matrica képek változatlanok maradnak
+IMAGE_MIME_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/bmp', 'image/tiff')
+FORMATS = {'jpeg': ('JPEG', '.jpg'), 'webp': ('WEBP', '.webp')}
+
+
+def transform_image(path, max_width, max_height, quality, image_format, strip_metadata):
+    """Kép kicsinyítése és újratömörítése (a folyamatkészlet egy workerében fut)
+
+    Visszatérési érték: {'path': ..., 'original': bájt, 'size': bájt}; ha az
+    eredmény nem kisebb, vagy a kép nem alakítható át, a path az eredeti fájl.
+    """
+    from PIL import Image, ImageOps
+
+    original = os.path.getsize(path)
+    result = {'path': path, 'original': original, 'size': original}
+    pil_format, extension = FORMATS[image_format]
+    with Image.open(path) as image:
+        if getattr(image, 'n_frames', 1) > 1:
+            return result
+        if max_width or max_height:
+            # JPEG esetén a dekódolás eleve kisebb méretben (1/2, 1/4, 1/8) történik; a négyzetes
+            # határ az EXIF szerinti elforgatás után is elég nagy
+            limit = max(max_width, max_height)
+            image.draft('RGB', (limit, limit))
+        # A tájolás az EXIF alapján, mielőtt a metaadatok elvesznek
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        if pil_format == 'JPEG' and has_alpha:
+            # Az átlátszóság JPEG-ben elveszne
+            return result
+        if image.mode not in ('RGB', 'L', 'RGBA'):
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        if max_width or max_height:
+            image.thumbnail((max_width or image.width, max_height or image.height), Image.LANCZOS)
+        options = {'quality': quality, 'optimize': True} if pil_format == 'JPEG' else {'quality': quality}
+        # A színprofil nem metaadat: nélküle a színek eltolódhatnak
+        if image.info.get('icc_profile'):
+            options['icc_profile'] = image.info['icc_profile']
+        if not strip_metadata and image.info.get('exif'):
+            options['exif'] = image.info['exif']
+        output = os.path.splitext(path)[0] + '.transformed' + extension
+        image.save(output, pil_format, **options)
+
+    size = os.path.getsize(output)
+    if size >= original:
+        os.remove(output)
+        return result
+    return {'path': output, 'original': original, 'size': size}
+
+
+class ImageTransformer:
+    """Újrafeltöltendő képek kicsinyítése és újratömörítése folyamatkészletben
+
+    A CPU-igényes munka külön folyamatokban fut, így az eseményhurkot nem
+    tartja fel. A fotók JPEG-ként maradnak (a Telegram fotói JPEG-ek), a kép
+    dokumentumok image_format szerint (jpeg vagy webp) készülnek. Ha az
+    eredmény nem kisebb az eredetinél, az eredeti kerül feltöltésre.
+    """
+
+    def __init__(self, max_width=2560, max_height=2560, quality=85, image_format='jpeg', strip_metadata=True,
+                 workers=2):
+        self.max_width = int(max_width)
+        self.max_height = int(max_height)
+        self.quality = int(quality)
+        self.image_format = image_format if image_format in FORMATS else 'jpeg'
+        self.strip_metadata = strip_metadata
+        self.workers = max(1, int(workers))
+        self._pool = None
+        self.stats = {'transformed': 0, 'skipped': 0, 'failed': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    @staticmethod
+    def applies(message):
+        """Igaz, ha az üzenet médiája átalakítható kép"""
+        if isinstance(message.media, MessageMediaPhoto):
+            return True
+        if not isinstance(message.media, MessageMediaDocument) or not message.media.document:
+            return False
+        document = message.media.document
+        if document.mime_type not in IMAGE_MIME_TYPES:
+            return False
+        return not any(isinstance(attr, DocumentAttributeSticker) for attr in document.attributes)
+
+    def _executor(self):
+        if self._pool is None:
+            # A forkserver tiszta folyamatból indít, nem másolja le a hurok és a Flask szálait
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+    async def transform(self, message, path, source='', media_type='image'):
+        """A letöltött kép átalakítása; a feltöltendő fájl útvonalát adja vissza
+
+        Hiba esetén (pl. sérült kép vagy hiányzó Pillow) az eredeti fájl marad.
+        """
+        image_format = 'jpeg' if isinstance(message.media, MessageMediaPhoto) else self.image_format
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor(), transform_image, path, self.max_width, self.max_height, self.quality,
+                image_format, self.strip_metadata
+            )
+        except Exception as e:
+            if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                # Egy worker összeomlott: a következő átalakítás új készletet indít
+                self._pool = None
+            self.stats['failed'] += 1
+            print(f"Kép átalakítása sikertelen: {message.id} ({e})")
+            return path
+
+        if result['path'] == path:
+            self.stats['skipped'] += 1
+            return path
+        os.remove(path)
+        self.stats['transformed'] += 1
+        self.stats['bytes_in'] += result['original']
+        self.stats['bytes_out'] += result['size']
+        metrics.BYTES.inc(source, media_type, 'saved', amount=result['original'] - result['size'])
+        print(f"Kép átalakítva: {message.id} ({result['original']} -> {result['size']} bájt)")
+        return result['path']
+
+    def shutdown(self):
+        """A folyamatkészlet leállítása (a következő átalakítás újraindítja)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get_status(self):
+        """Átalakítási statisztikák és a megtakarított bájtok"""
+        return dict(self.stats, bytes_saved=self.stats['bytes_in'] - self.stats['bytes_out'])
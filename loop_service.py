@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+
+class LoopService:
+    """Egyetlen, hosszú életű eseményhurok saját szálon
+
+    A Telethon kliens, a másoló és a backfill mind ezen a hurkon fut. A Flask
+    kérések (tetszőleges szálból) a submit()/run() hídon keresztül adnak át
+    korutinokat, így soha nem jön létre új hurok, és a kliens sem kapcsolódik
+    újra egy másik hurokról.
+    """
+
+    def __init__(self, name='telegram-loop'):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._started = threading.Event()
+
+    def start(self):
+        """A hurok szálának indítása (többszöri hívás esetén csak egyszer)"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def is_running(self):
+        return bool(self.loop and self.loop.is_running())
+
+    def in_loop(self):
+        """Igaz, ha a hívás magán a hurok szálán történik"""
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Korutin ütemezése a hurokra; concurrent.futures.Future-t ad vissza"""
+        if not self.loop:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=30):
+        """Korutin futtatása a hurkon és az eredmény megvárása (legfeljebb timeout másodpercig)
+
+        Időtúllépéskor a korutin megszakad és concurrent.futures.TimeoutError keletkezik.
+        """
+        if self.in_loop():
+            raise RuntimeError("A LoopService.run() nem hívható a saját hurkáról")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def call_soon(self, callback, *args):
+        """Szinkron függvény futtatása a hurok szálán"""
+        if not self.loop:
+            self.start()
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self):
+        """A hurok leállítása"""
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread and not self.in_loop():
+            self._thread.join(timeout=5)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+import traceback
+
+import metrics
+
+
+class LoopWatchdog:
+    """Az eseményhurok késésének mérése és a blokkoló hívások felismerése
+
+    A hurkon futó run() interval másodpercenként ébred, és a tervezetthez
+    képesti késést a loop_lag_seconds metrikába írja. Egy külön szál figyeli
+    az ébredéseket: ha a hurok threshold másodpercnél tovább nem ébred fel,
+    rögzíti a hurok szálának éppen futó veremét, vagyis a blokkoló hívás
+    helyét (pl. szinkron fájl I/O egy korutinban). A hurkot nem lassítja:
+    a mérés egy időzített ébredés, a verem lekérése csak akadáskor történik.
+    """
+
+    def __init__(self, interval=0.25, threshold=0.1, history=20):
+        self.interval = interval
+        self.threshold = threshold
+        self.thread_id = None
+        self.last_lag = 0.0
+        self.stats = {'max_lag': 0.0, 'stalls': 0}
+        # Az utolsó history darab akadás: {'time', 'blocked', 'lag', 'stack'}; a lag a hurok teljes késése
+        self.stalls = collections.deque(maxlen=history)
+        self._beat = time.monotonic()
+        self._stall = None
+        self._stop = threading.Event()
+
+    async def run(self):
+        """Mérés a megszakításig; a figyelő szál ezzel együtt indul és áll le"""
+        self.thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        monitor = threading.Thread(target=self._monitor, name='loop-watchdog', daemon=True)
+        monitor.start()
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                self._beat = now
+                lag = max(0.0, now - expected)
+                self.last_lag = lag
+                self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+                metrics.LOOP_LAG_SECONDS.observe(value=lag)
+                stall, self._stall = self._stall, None
+                if stall is not None:
+                    stall['lag'] = round(lag, 3)
+        finally:
+            self._stop.set()
+
+    def _monitor(self):
+        """Figyelő szál: a késő ébredésnél a hurok szálának veremét rögzíti (akadásonként egyszer)"""
+        while not self._stop.wait(self.threshold / 2):
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked < self.threshold or self._stall is not None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = [line.rstrip() for line in traceback.format_stack(frame)]
+            self._stall = {'time': time.time(), 'blocked': round(blocked, 3), 'lag': None, 'stack': stack}
+            self.stalls.append(self._stall)
+            self.stats['stalls'] += 1
+            metrics.SLOW_CALLBACKS.inc()
+            where = stack[-1].splitlines()[0].strip() if stack else '?'
+            print(f"Az eseményhurok {blocked * 1000:.0f} ms óta blokkolva: {where}")
+
+    def get_status(self):
+        """Késés (ezredmásodpercben) és az akadások száma"""
+        return {
+            'lag_ms': round(self.last_lag * 1000, 1),
+            'max_lag_ms': round(self.stats['max_lag'] * 1000, 1),
+            'threshold_ms': round(self.threshold * 1000),
+            'stalls': self.stats['stalls']
+        }
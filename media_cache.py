@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class MediaHandleCache:
+    """Forrás média -> feltöltött fájl / cél média gyorsítótár LRU kilakoltatással
+
+    A kulcs a forrás média azonosítója (pl. 'document:<id>:<access_hash>'),
+    újrafeltöltött fájloknál a tartalom hash-e ('sha256:<hex>'). Az érték egy
+    feltöltött InputMedia vagy egy már elküldött cél üzenet médiája, amely
+    bármely célba újraküldhető átvitel nélkül. A bejegyzések ttl másodperc
+    után lejárnak (a feltöltött fájlok és fájlhivatkozások nem örök életűek),
+    elavult hivatkozás esetén pedig invalidate() törli őket.
+    """
+
+    def __init__(self, max_entries=500, ttl=3600):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._entries = OrderedDict()  # kulcs -> (érték, tárolás időpontja)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def file_key(file_path, block_size=1024 * 1024):
+        """Letöltött fájl tartalom alapú kulcsa"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return f"sha256:{digest.hexdigest()}"
+
+    def get(self, key):
+        """Érvényes bejegyzés lekérése (vagy None); találatkor a legutóbb használtak közé kerül"""
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] >= self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return entry[0]
+
+    def put(self, key, value):
+        """Bejegyzés tárolása; a legrégebben használt kerül ki, ha a gyorsítótár megtelt"""
+        if key is None or value is None:
+            return
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, key):
+        """Elavult bejegyzés törlése"""
+        if self._entries.pop(key, None) is not None:
+            self.stats['invalidations'] += 1
+
+    def get_status(self):
+        """Méret és találati statisztikák"""
+        return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import random
+from telethon.errors import FloodWaitError
+from telethon.tl.functions.upload import SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import (
+    InputFile, InputFileBig, InputMediaUploadedDocument, InputMediaUploadedPhoto, MessageMediaDocument,
+    MessageMediaPhoto
+)
+
+# A Telegram 10 MB felett "nagy fájlként" (SaveBigFilePart) fogadja a feltöltést
+BIG_FILE_SIZE = 10 * 1024 * 1024
+# A fájlrész mérete: 1 KB többszöröse, 512 KB osztója
+MAX_CHUNK_SIZE = 512 * 1024
+
+
+def uploaded_media(message, handle):
+    """A feltöltött fájlból (InputFile / InputFileBig) az üzenet médiájának megfelelő InputMedia"""
+    if isinstance(message.media, MessageMediaPhoto):
+        return InputMediaUploadedPhoto(file=handle)
+    document = message.media.document
+    return InputMediaUploadedDocument(
+        file=handle,
+        mime_type=document.mime_type or 'application/octet-stream',
+        attributes=document.attributes
+    )
+
+
+class MediaStreamer:
+    """Média továbbítása letöltés és feltöltés átlapolásával, lemez használata nélkül
+
+    A letöltött darabok (iter_download) egy korlátos memóriapufferen át
+    azonnal feltöltésre kerülnek (SaveFilePart / SaveBigFilePart), így a teljes
+    idő közel a lassabbik irány ideje. A puffer az összes egyidejű átvitel
+    között közös, így a memóriahasználat felső korlátja buffer_size bájt.
+    Ha engine (TransferEngine) meg van adva, a nagy dokumentumok több
+    párhuzamos kapcsolaton mennek át; hiba esetén a streamelés veszi át.
+    """
+
+    def __init__(self, client, chunk_size=MAX_CHUNK_SIZE, buffer_size=8 * 1024 * 1024, max_retries=5, engine=None):
+        self.client = client
+        self.engine = engine
+        chunk_size = int(chunk_size)
+        if chunk_size % 1024 or MAX_CHUNK_SIZE % chunk_size:
+            chunk_size = MAX_CHUNK_SIZE
+        self.chunk_size = chunk_size
+        self.buffer_chunks = max(1, int(buffer_size) // chunk_size)
+        self.max_retries = max_retries
+        self._buffer = None
+        self._in_use = 0
+        self.stats = {'streamed': 0, 'bytes': 0, 'failed': 0}
+
+    @staticmethod
+    def media_info(message):
+        """(méret, fájlnév) a streameléshez, vagy None, ha a média nem streamelhető"""
+        if not isinstance(message.media, (MessageMediaPhoto, MessageMediaDocument)):
+            return None
+        file = getattr(message, 'file', None)
+        if not file or not file.size:
+            return None
+        return file.size, file.name or f"{message.id}{file.ext or ''}"
+
+    async def transfer(self, message, upload_client=None):
+        """A média átvitele; egy feltöltött InputMedia-t ad vissza, amely bármely célba elküldhető
+
+        Az upload_client egy másik (küldő) fiók kliense lehet: a letöltés a
+        fogadó fiókkal, a feltöltés azzal történik, és az eredmény is csak
+        azzal a fiókkal küldhető el.
+        """
+        size, name = self.media_info(message)
+        upload_client = upload_client or self.client
+        handle = None
+        if self.engine and self.engine.applies(message.media, size):
+            try:
+                handle = await self.engine.transfer(message.media, size, name, self.client, upload_client)
+            except Exception as e:
+                print(f"Párhuzamos átvitel sikertelen, streamelés egy kapcsolaton: {message.id} ({e})")
+        if handle is None:
+            handle = await self._stream(message.media, size, name, upload_client)
+        self.stats['streamed'] += 1
+        self.stats['bytes'] += size
+        return uploaded_media(message, handle)
+
+    async def _save_part(self, client, request):
+        """Egy fájlrész feltöltése; FloodWaitError esetén a kért ideig vár és újrapróbálja"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await client(request)
+            except FloodWaitError as e:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(e.seconds)
+
+    async def _stream(self, media, size, name, upload_client):
+        """Letöltés és feltöltés párhuzamosan, a közös memóriapufferen keresztül"""
+        if self._buffer is None:
+            self._buffer = asyncio.Semaphore(self.buffer_chunks)
+        buffer = self._buffer
+
+        file_id = random.getrandbits(63)
+        total_parts = (size + self.chunk_size - 1) // self.chunk_size
+        is_big = size > BIG_FILE_SIZE
+        chunks = asyncio.Queue()
+
+        async def download():
+            try:
+                async for chunk in self.client.iter_download(media, chunk_size=self.chunk_size, file_size=size):
+                    # Puffer hely foglalása darabonként: a letöltés megáll, ha a feltöltés lemarad
+                    await buffer.acquire()
+                    self._in_use += 1
+                    chunks.put_nowait(chunk)
+            finally:
+                chunks.put_nowait(None)
+
+        downloader = asyncio.create_task(download())
+        part = 0
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                try:
+                    if is_big:
+                        await self._save_part(upload_client, SaveBigFilePartRequest(file_id, part, total_parts, chunk))
+                    else:
+                        await self._save_part(upload_client, SaveFilePartRequest(file_id, part, chunk))
+                finally:
+                    self._release()
+                part += 1
+            # A letöltés hibáját itt kapjuk meg
+            await downloader
+        except BaseException:
+            self.stats['failed'] += 1
+            downloader.cancel()
+            # A pufferben maradt darabok helyének felszabadítása
+            while not chunks.empty():
+                if chunks.get_nowait() is not None:
+                    self._release()
+            raise
+
+        if is_big:
+            return InputFileBig(file_id, part, name)
+        return InputFile(file_id, part, name, md5_checksum='')
+
+    def _release(self):
+        self._in_use -= 1
+        self._buffer.release()
+
+    def get_status(self):
+        """Streamelési statisztikák és a puffer foglaltsága"""
+        return dict(self.stats, buffer_chunks=self.buffer_chunks, buffer_in_use=self._in_use)
@@ -2,193 +2,1575 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+import collections
 import os
 import tempfile
 import time
-from datetime import datetime
-from telethon import events
-from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument, MessageMediaWebPage
+from telethon import events, utils
+from telethon.errors import (
+    ChatForwardsRestrictedError, FilePartMissingError, FileReferenceExpiredError, FileReferenceInvalidError,
+    FloodWaitError, MediaEmptyError, MessageNotModifiedError
+)
+from telethon.tl.functions.messages import GetHistoryRequest
+from telethon.tl.types import Channel, MessageMediaPhoto, MessageMediaDocument, MessageMediaWebPage
+import metrics
+from config import has_routes
+from copy_pipeline import CopyPipeline
+from media_stream import MediaStreamer, uploaded_media
+from media_cache import MediaHandleCache
+from image_transform import ImageTransformer
+from parallel_transfer import TransferEngine
+from rules import RuleEngine
+from account_pool import AccountPool, AccountsBlocked, SenderAccount
+from backfill import HistoryBackfill
+from rate_limiter import RateLimiter
+from supervisor import ConnectionSupervisor
+from spool import MediaDownloadError, OutboundSpool
+from message_ledger import MessageLedger
 
 class MessageCopier:
-    """Üzenetmásoló osztály"""
+    """Üzenetmásoló osztály
+
+    Több útvonalat (forrás -> cél csatornák) szolgál ki egyetlen klienssel.
+    Az útvonalak a routes paraméterrel adhatók meg:
+    [{'source': '@forras', 'destinations': ['@cel1', '@cel2']}, ...]
+    Ha nincs megadva, a source_channel_id -> destination_channel_id útvonal él.
+    """
     
-    def __init__(self, telegram_client, source_channel_id, destination_channel_id):
+    def __init__(self, telegram_client, source_channel_id=None, destination_channel_id=None, relay_media=True,
+                 album_window=0.5, download_workers=3, queue_size=100, reorder_timeout=10.0,
+                 rate_limiter=None, ledger=None, routes=None, delete_window=1.0, entity_cache=None,
+                 stream_media=True, stream_chunk_size=512 * 1024, stream_buffer_size=8 * 1024 * 1024,
+                 media_cache=None, rules=None, senders=None, health_check_interval=60.0, reconnect_max_delay=300.0,
+                 spool=None, image_transformer=None, transfer_engine=None):
         self.client = telegram_client
         self.source_channel_id = source_channel_id
         self.destination_channel_id = destination_channel_id
+        if not routes:
+            routes = [{'source': source_channel_id, 'destinations': [destination_channel_id]}]
+        self.route_config = routes
+        self.relay_media = relay_media
+        # Nagy dokumentumok átvitele több párhuzamos kapcsolaton (TransferEngine), None esetén egy kapcsolaton
+        self.transfer_engine = transfer_engine
+        # Újrafeltöltendő média streamelése lemez nélkül (a puffer az összes átvitel között közös)
+        self.streamer = MediaStreamer(
+            telegram_client, chunk_size=stream_chunk_size, buffer_size=stream_buffer_size, engine=transfer_engine
+        ) if stream_media else None
+        # Már feltöltött/elküldött média újrahasznosítása újraküldéskor és újabb céloknál
+        self.media_cache = media_cache or MediaHandleCache()
+        # Újrafeltöltendő képek kicsinyítése/újratömörítése (ImageTransformer), None esetén az eredeti megy ki
+        self.image_transformer = image_transformer
+        # Szűrő és átalakító szabályok, a beküldés előtt, I/O nélkül kiértékelve
+        self.rules_config = rules or []
+        self.rules = RuleEngine(self.rules_config)
+        self.filtered_count = 0
+        # Albumok gyűjtési ablaka másodpercben (grouped_id szerinti pufferelés)
+        self.album_window = album_window
+        self._album_buffers = {}
+        self._album_tasks = {}
+        # Törlések gyűjtési ablaka: egy ablakon belüli törlések célonként egy hívással mennek ki
+        self.delete_window = delete_window
+        self._pending_deletes = {}
+        self._delete_task = None
+        self._delete_flushes = set()
+        # Másolási folyamat paraméterei
+        self.download_workers = download_workers
+        self.queue_size = queue_size
+        self.reorder_timeout = reorder_timeout
+        self.pipeline = None
+        self.backfill = None
+        self.loop = None
+        # Közös sebességkorlátozó minden küldéshez és letöltéshez
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # Küldő fiókok: a fogadó (elsődleges) fiók és a további, saját korlátozóval rendelkező fiókok
+        self.accounts = AccountPool(
+            [SenderAccount('primary', telegram_client, self.rate_limiter, primary=True)] + [
+                SenderAccount(name, client, RateLimiter(
+                    global_rate=self.rate_limiter.global_bucket.max_rate,
+                    global_burst=self.rate_limiter.global_bucket.capacity,
+                    destination_rate=self.rate_limiter.destination_rate,
+                    destination_burst=self.rate_limiter.destination_burst
+                ))
+                for name, client in senders or []
+            ]
+        )
+        # Másolt üzenetek naplója (MessageLedger) a duplikációk elkerüléséhez és a folytatáshoz
+        self.ledger = ledger
+        # Kézbesítésre váró üzenetek tartós sora (OutboundSpool): újrapróbálás és dead-letter terület
+        self.spool = spool
+        # Közös entitás gyorsítótár (EntityCache); nélküle minden indításkor lekérjük az entitásokat
+        self.entity_cache = entity_cache
+        # Forrás peer id -> {'source': entitás, 'destinations': [(cél peer id, entitás), ...]}
+        self.routes = {}
+        # A már feloldott csatornák (str(azonosító) -> entitás): átkonfiguráláskor nem kérjük le újra
+        self._resolved = {}
+        # Egyszerre egy átkonfigurálás fut; a későbbi kérés a korábbi után, annak eredményére épül
+        self._routes_lock = asyncio.Lock()
+        self._reconfigure_tasks = set()
+        # A start_copying által regisztrált (callback, esemény) párok, leállításkor eltávolítjuk őket
+        self._handlers = []
+        # Igaz a start_copying teljes futása alatt, a leállítás (sor kiürítése) végéig
+        self._active = False
+        # Beküldött, de még nem kézbesített (forrás, üzenet) azonosítók
+        self._inflight = set()
+        # FloodWait miatt visszatartott feladatok célonként, sorrendben, és a célonkénti újraküldő taskok
+        self._held = {}
+        self._hold_tasks = {}
+        # Forrásonként az utoljára látott üzenet azonosítója a hézagok felismeréséhez
+        self._last_seen = {}
+        # Csatorna források: csak ezeknél folytonosak az üzenet azonosítók
+        self._channel_sources = set()
+        self.gap_stats = {'gaps': 0, 'recovered': 0}
+        # Kapcsolatfelügyelet: próba lekérés gyakorisága és az újracsatlakozási várakozás felső korlátja
+        self.health_check_interval = health_check_interval
+        self.reconnect_max_delay = reconnect_max_delay
+        self.supervisor = None
+        # Üzenetenként használt másolási mód statisztikája
+        self.mode_counts = {'relay': 0, 'download': 0, 'cached': 0, 'text': 0}
+        # Utolsó hiba az állapotjelzéshez: {'message': ..., 'time': ...}
+        self.last_error = None
         self.is_running = False
         self.source_entity = None
         self.destination_entity = None
         self.temp_dir = tempfile.mkdtemp(prefix='telegram_copier_')
+    
+    @classmethod
+    def from_config(cls, config, client_manager, rate_limiter=None, ledger=None, media_cache=None, spool=None):
+        """MessageCopier létrehozása a konfiguráció (config.load_config) alapján
+
+        A client_manager egy elindított TelegramClientManager. A meg nem adott
+        közös objektumok (korlátozó, napló, média gyorsítótár, spool) a
+        data/ könyvtárbeli alapértelmezésekkel jönnek létre.
+        """
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(
+                global_rate=float(config.get('global_rate', 20)),
+                destination_rate=float(config.get('destination_rate', 1))
+            )
+        if ledger is None:
+            ledger = MessageLedger()
+        if media_cache is None:
+            media_cache = MediaHandleCache(
+                max_entries=int(config.get('media_cache_size', 500)),
+                ttl=float(config.get('media_cache_ttl', 3600))
+            )
+        if spool is None:
+            spool = OutboundSpool(policies=config.get('retry_policies') or {})
         
+        return cls(
+            telegram_client=client_manager.client,
+            source_channel_id=config['source_channel_id'],
+            destination_channel_id=config['destination_channel_id'],
+            routes=config.get('routes') or None,
+            relay_media=config.get('relay_media', True),
+            album_window=float(config.get('album_window', 0.5)),
+            download_workers=int(config.get('download_workers', 3)),
+            queue_size=int(config.get('queue_size', 100)),
+            reorder_timeout=float(config.get('reorder_timeout', 10)),
+            delete_window=float(config.get('delete_window', 1)),
+            stream_media=config.get('stream_media', True),
+            stream_chunk_size=int(config.get('stream_chunk_kb', 512)) * 1024,
+            stream_buffer_size=int(float(config.get('stream_buffer_mb', 8)) * 1024 * 1024),
+            media_cache=media_cache,
+            rules=config.get('rules') or [],
+            rate_limiter=rate_limiter,
+            ledger=ledger,
+            entity_cache=client_manager.entity_cache,
+            senders=client_manager.senders,
+            health_check_interval=float(config.get('health_check_interval', 60)),
+            reconnect_max_delay=float(config.get('reconnect_max_delay', 300)),
+            spool=spool,
+            image_transformer=ImageTransformer(
+                max_width=int(config.get('image_max_width', 2560)),
+                max_height=int(config.get('image_max_height', 2560)),
+                quality=int(config.get('image_quality', 85)),
+                image_format=config.get('image_format', 'jpeg'),
+                strip_metadata=config.get('image_strip_metadata', True),
+                workers=int(config.get('image_workers', 2))
+            ) if config.get('image_transform') else None,
+            transfer_engine=TransferEngine(
+                connections=int(config.get('transfer_connections', 4)),
+                part_size=int(config.get('transfer_part_kb', 512)) * 1024,
+                min_size=int(float(config.get('transfer_min_mb', 10)) * 1024 * 1024)
+            ) if int(config.get('transfer_connections', 4)) > 1 else None
+        )
+    
+    def _report_error(self, message):
+        """Hiba kiírása és megjegyzése az állapotjelzés számára"""
+        print(message)
+        self.last_error = {'message': message, 'time': time.time()}
+    
+    async def _resolve_entity(self, channel_id):
+        """Entitás lekérése ID vagy @username alapján (gyorsítótár esetén hálózati kérés nélkül)"""
+        if self.entity_cache:
+            return await self.entity_cache.get_entity(channel_id)
+        if isinstance(channel_id, str):
+            if channel_id.startswith('@'):
+                return await self.client.get_entity(channel_id)
+            try:
+                return await self.client.get_entity(int(channel_id))
+            except ValueError:
+                return await self.client.get_entity(channel_id)
+        return await self.client.get_entity(int(channel_id))
+    
     async def initialize(self):
-        """Inicializálás - entitások lekérése"""
+        """Inicializálás - az útvonalak entitásainak lekérése (mindegyik csak egyszer)"""
         try:
-            # Forrás csatorna entitás lekérése
-            if isinstance(self.source_channel_id, str):
-                if self.source_channel_id.startswith('@'):
-                    self.source_entity = await self.client.get_entity(self.source_channel_id)
-                else:
-                    try:
-                        self.source_entity = await self.client.get_entity(int(self.source_channel_id))
-                    except ValueError:
-                        self.source_entity = await self.client.get_entity(self.source_channel_id)
-            else:
-                self.source_entity = await self.client.get_entity(int(self.source_channel_id))
+            os.makedirs(self.temp_dir, exist_ok=True)
+            async with self._routes_lock:
+                routes = await self._build_routes(self.route_config)
+                await self._resolve_account_destinations(routes)
+                self._set_routes(routes)
+            return True
+        
+        except Exception as e:
+            self._report_error(f"Hiba az inicializálás során: {e}")
+            return False
+    
+    async def _build_routes(self, route_config):
+        """Útvonal tábla felépítése; a korábban már feloldott csatornák nem kérődnek le újra"""
+        routes = {}
+        for route in route_config:
+            for channel_id in [route['source']] + list(route['destinations']):
+                if str(channel_id) not in self._resolved:
+                    self._resolved[str(channel_id)] = await self._resolve_entity(channel_id)
             
-            # Cél csatorna entitás lekérése
-            if isinstance(self.destination_channel_id, str):
-                if self.destination_channel_id.startswith('@'):
-                    self.destination_entity = await self.client.get_entity(self.destination_channel_id)
-                else:
-                    try:
-                        self.destination_entity = await self.client.get_entity(int(self.destination_channel_id))
-                    except ValueError:
-                        self.destination_entity = await self.client.get_entity(self.destination_channel_id)
-            else:
-                self.destination_entity = await self.client.get_entity(int(self.destination_channel_id))
+            source = self._resolved[str(route['source'])]
+            source_key = utils.get_peer_id(source)
+            entry = routes.setdefault(source_key, {'source': source, 'destinations': []})
+            for channel_id in route['destinations']:
+                destination = self._resolved[str(channel_id)]
+                destination_key = utils.get_peer_id(destination)
+                if all(key != destination_key for key, _ in entry['destinations']):
+                    entry['destinations'].append((destination_key, destination))
             
-            print(f"Forrás csatorna: {self.source_entity.title}")
-            print(f"Cél csatorna: {self.destination_entity.title}")
+            print(f"Útvonal: {source.title} -> {', '.join(d.title for _, d in entry['destinations'])}")
+        return routes
+    
+    async def _resolve_account_destinations(self, routes):
+        """A küldő fiókok a saját hozzáférésükkel oldják fel a célokat (csak a még ismeretleneket)"""
+        targets = {key: entity for entry in routes.values() for key, entity in entry['destinations']}
+        for account in self.accounts.accounts:
+            if account.primary:
+                account.entities.update(targets)
+                continue
+            missing = [key for key in targets if key not in account.entities]
+            if not missing:
+                continue
+            await account.resolve_destinations([
+                (key, f"@{targets[key].username}" if getattr(targets[key], 'username', None) else key) for key in missing
+            ])
+            print(f"Küldő fiók: {account.name} ({len([k for k in targets if k in account.entities])}/{len(targets)} cél)")
+    
+    def _set_routes(self, routes):
+        """Az útvonal tábla cseréje egy lépésben (az eseménykezelő a következő frissítéstől ezt látja)"""
+        self.routes = routes
+        self._channel_sources = {key for key, entry in routes.items() if isinstance(entry['source'], Channel)}
+        # Az első útvonal entitásai (egyszerű, egy útvonalas használathoz)
+        first = next(iter(routes.values()))
+        self.source_entity = first['source']
+        self.destination_entity = first['destinations'][0][1]
+    
+    async def reconfigure(self, route_config):
+        """Útvonalak módosítása futás közben, a másolás leállítása nélkül
+
+        Csak az új csatornák entitásai kérődnek le. A már beküldött feladatok
+        (és a gyűjtés alatt álló albumok) a beküldéskori útvonal szerint
+        kézbesülnek; az új forrásokat a következő üzenetüktől figyeljük.
+        Visszatérési érték: False, ha az új útvonalak nem oldhatók fel (ekkor
+        a régiek maradnak érvényben).
+        """
+        async with self._routes_lock:
+            try:
+                routes = await self._build_routes(route_config)
+                await self._resolve_account_destinations(routes)
+            except Exception as e:
+                self._report_error(f"Hiba az útvonalak módosítása során: {e}")
+                return False
             
+            removed = set(self.routes) - set(routes)
+            added = set(routes) - set(self.routes)
+            self.route_config = route_config
+            self._set_routes(routes)
+            for source_key in removed:
+                self._last_seen.pop(source_key, None)
+            print(f"Útvonalak frissítve: {len(added)} új, {len(removed)} megszűnt forrás")
             return True
-            
-        except Exception as e:
-            print(f"Hiba az inicializálás során: {e}")
-            return False
     
     async def start_copying(self):
-        """Üzenetmásolás indítása"""
+        """Üzenetmásolás indítása; a stop_copying hívása és a sorban lévők kézbesítése után tér vissza
+
+        Visszatérési érték: False, ha az inicializálás vagy a másolás hibával ért véget.
+        """
+        if self._active:
+            print("A másolás már fut, vagy a leállítása még folyamatban van!")
+            return False
+        self._active = True
+        supervisor_task = None
+        retry_task = None
         try:
             self.is_running = True
             
             # Inicializálás
             if not await self.initialize():
                 print("Inicializálás sikertelen!")
-                return
+                return False
+            
+            await self._start_pipeline()
+            
+            # A leállás alatt kimaradt üzenetek pótlása a napló alapján
+            await self._catch_up()
+            
+            # Kapcsolatfelügyelet: megszakadt kapcsolatnál újracsatlakozás és a kimaradt rész pótlása
+            self.supervisor = ConnectionSupervisor(
+                self.client,
+                on_reconnect=self._catch_up,
+                probe=self._probe_sources,
+                on_probe=self._copy_gaps,
+                probe_interval=self.health_check_interval,
+                max_delay=self.reconnect_max_delay
+            )
+            supervisor_task = asyncio.create_task(self.supervisor.run(lambda: self.is_running))
+            if self.spool:
+                retry_task = asyncio.create_task(self._retry_spooled())
             
             print("Üzenetmásolás elindítva...")
             
-            # Eseménykezelő regisztrálása
-            @self.client.on(events.NewMessage(chats=self.source_entity))
+            # Egyetlen eseménykezelő minden forráshoz; a szétosztás szótárkereséssel történik,
+            # így a frissítésenkénti költség nem nő az útvonalak számával
+            @self._on(events.NewMessage())
             async def handle_new_message(event):
-                if self.is_running:
-                    await self.copy_message(event.message)
+                if not self.is_running or event.chat_id not in self.routes:
+                    return
+                source_key, message = event.chat_id, event.message
+                try:
+                    gap_from = self._note_seen(source_key, message.id)
+                    if gap_from is not None:
+                        # A kimaradt azonosítók pótlása az új üzenet előtt, hogy a sorrend megmaradjon;
+                        # hiba esetén a _copy_range a hézagon belülre állítja vissza a pozíciót
+                        self.gap_stats['gaps'] += 1
+                        await self._copy_range(source_key, gap_from, message.id)
+                    if message.grouped_id:
+                        self._buffer_album_message(source_key, message)
+                    else:
+                        # Teli sor esetén itt várunk (backpressure)
+                        await self._submit(source_key, [message])
+                except Exception as e:
+                    # A pozíció visszaállításával a következő hézag vagy próba lekérés pótolja az üzenetet
+                    self._last_seen[source_key] = min(self._last_seen.get(source_key, message.id), message.id - 1)
+                    metrics.FAILURES.inc(str(source_key), 'live', type(e).__name__)
+                    self._report_error(f"Hiba az új üzenet feldolgozása során: {e}")
+            
+            # Szerkesztések és törlések átvezetése a napló szerinti cél üzenetekre
+            @self._on(events.MessageEdited())
+            async def handle_edited_message(event):
+                if self.is_running and event.chat_id in self.routes:
+                    await self._propagate_edit(event.chat_id, event.message)
+            
+            @self._on(events.MessageDeleted())
+            async def handle_deleted_message(event):
+                # Nem csatorna chatekben a Telegram nem küldi a chat azonosítóját
+                if self.is_running and event.chat_id in self.routes:
+                    self._buffer_deletes(event.chat_id, event.deleted_ids)
+            
+            # A kezelő regisztrálása alatt érkezett üzenetek pótlása (a duplikációt a napló szűri)
+            await self._catch_up()
             
             # Várakozás a leállításig
             while self.is_running:
                 await asyncio.sleep(1)
-                
+                if self.ledger:
+                    self.ledger.maybe_flush()
+                if self.spool:
+                    self.spool.maybe_flush()
+            
+            # Függőben lévő albumok és törlések beküldése leállítás előtt
+            if self._album_tasks:
+                await asyncio.gather(*self._album_tasks.values(), return_exceptions=True)
+            if self._delete_flushes:
+                await asyncio.gather(*self._delete_flushes, return_exceptions=True)
+            return True
+        
         except Exception as e:
-            print(f"Hiba a másolás során: {e}")
+            self._report_error(f"Hiba a másolás során: {e}")
+            return False
         finally:
+            # Az eseménykezelők eltávolítása: az újraindítások nem halmozzák fel őket a közös kliensen
+            self._remove_handlers()
+            for task in (supervisor_task, retry_task):
+                if task:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+            if self.backfill:
+                self.backfill.stop()
+            await self._stop_pipeline()
             self.is_running = False
+            self._active = False
             print("Üzenetmásolás leállítva.")
     
-    async def copy_message(self, message):
-        """Egy üzenet másolása"""
+    def _on(self, event):
+        """Eseménykezelő regisztrálása (mint a client.on), a leállításkori eltávolításhoz megjegyezve"""
+        def decorator(callback):
+            self.client.add_event_handler(callback, event)
+            self._handlers.append(callback)
+            return callback
+        return decorator
+    
+    def _remove_handlers(self):
+        """A start_copying által regisztrált eseménykezelők eltávolítása a kliensről"""
+        while self._handlers:
+            self.client.remove_event_handler(self._handlers.pop())
+    
+    async def _start_pipeline(self):
+        """Másolási folyamat indítása: letöltő workerek és sorrendtartó küldő szakasz"""
+        self.loop = asyncio.get_running_loop()
+        
+        self.pipeline = CopyPipeline(
+            self._prepare_job,
+            self._deliver_job,
+            workers=self.download_workers,
+            queue_size=self.queue_size,
+            reorder_timeout=self.reorder_timeout
+        )
+        await self.pipeline.start()
+        metrics.QUEUE_DEPTH.set_function(self._queue_depths)
+    
+    def _queue_depths(self):
+        """A folyamat szakaszainak mélysége a queue_depth metrikához"""
+        if not self.pipeline:
+            return {}
+        status = self.pipeline.get_status()
+        return {(stage,): status[stage] for stage in ('queue_depth', 'in_progress', 'waiting_for_order')}
+    
+    async def _stop_pipeline(self):
+        """Másolási folyamat leállítása a sorban lévő elemek kézbesítése után"""
+        if self.pipeline:
+            await self.pipeline.stop()
+            self.pipeline = None
+        await self._drop_held()
+        if self.ledger:
+            self.ledger.flush()
+        if self.spool:
+            self.spool.flush()
+        # Az ideiglenes könyvtár a következő inicializáláskor újra létrejön
+        self.cleanup()
+        if self.image_transformer:
+            self.image_transformer.shutdown()
+        if self.transfer_engine:
+            await self.transfer_engine.close()
+    
+    def _is_copied(self, source_key, message, destination_key):
+        """Igaz, ha az üzenet a napló szerint már másolva lett az adott célba"""
+        return bool(self.ledger and self.ledger.is_copied(source_key, message.id, destination_key))
+    
+    def _is_known(self, source_key, message):
+        """Igaz, ha az üzenet már úton van, vagy az útvonal minden céljába másolva lett"""
+        if (source_key, message.id) in self._inflight:
+            return True
+        if not self.ledger:
+            return False
+        return all(self._is_copied(source_key, message, key) for key, _ in self.routes[source_key]['destinations'])
+    
+    async def _submit(self, source_key, messages, lane='live', on_delivered=None, spool_id=None):
+        """Üzenet vagy album beküldése a másolási folyamatba, a már másoltak kihagyásával
+
+        A sorrend forrásonként külön sávban érvényes. A spool_id egy
+        újraküldött spool tétel azonosítója; új üzenetnél új tétel készül.
+        Visszatérési érték: a ténylegesen beküldött üzenetek listája.
+        """
+        route = self.routes.get(source_key)
+        if route is None:
+            # Az útvonal közben megszűnt (átkonfigurálás); a spool tétel később újra sorra kerül
+            if spool_id and self.spool:
+                self.spool.release(spool_id, delay=300)
+            return []
+        messages = [m for m in messages if (m.text or m.media) and not self._is_known(source_key, m)]
+        job = {'source': source_key, 'route': route, 'messages': messages}
+        if not messages or not self._apply_rules(job):
+            # Nincs mit kézbesíteni: a spool tétel lezárul
+            if spool_id and self.spool:
+                self.spool.complete(spool_id)
+            return []
+        messages = job['messages']
+        self._inflight.update((source_key, m.id) for m in messages)
+        if on_delivered:
+            job['on_delivered'] = on_delivered
+        self._spool_job(job, spool_id)
+        await self.pipeline.submit(messages[0].id, job, lane=(lane, source_key))
+        return messages
+    
+    def _spool_job(self, job, spool_id=None):
+        """A feladat felvétele a tartós sorba; a tétel csak a visszaigazolt kézbesítés után kerül ki"""
+        if not self.spool:
+            return
+        job['spool_id'] = spool_id or self.spool.add(
+            job['source'], [m.id for m in job['messages']], [key for key, _ in job['route']['destinations']]
+        )
+    
+    async def _retry_spooled(self):
+        """Az esedékes spool tételek újraküldése friss üzenetekkel, az élő forgalom mögötti sávban"""
+        while self.is_running:
+            await asyncio.sleep(1)
+            for entry in self.spool.take_due():
+                route = self.routes.get(entry['source'])
+                if route is None:
+                    # Az útvonal megszűnt (pl. módosított beállítások); később újra megnézzük
+                    self.spool.release(entry['id'], delay=300)
+                    continue
+                try:
+                    messages = await self.rate_limiter.call(
+                        None, self.client.get_messages, route['source'], ids=entry['message_ids']
+                    )
+                except Exception as e:
+                    self.spool.fail(entry['id'], {key: e for key in entry['destinations']})
+                    continue
+                # A forrásból azóta törölt üzenetek kimaradnak
+                messages = [m for m in messages if m]
+                lane = ('retry', entry['source'])
+                self.pipeline.set_priority(lane, 1)
+                print(f"Újrapróbálás: {entry['message_ids']} (előző hiba: {entry['error']})")
+                await self._submit(entry['source'], messages, lane='retry', spool_id=entry['id'])
+    
+    @classmethod
+    def _rule_media_type(cls, message):
+        """Médiatípus a szabályokhoz; a média nélküli (vagy csak linkelőnézetes) üzenet 'text'"""
+        if not message.media or isinstance(message.media, MessageMediaWebPage):
+            return 'text'
+        return cls._media_type(message)
+    
+    def _apply_rules(self, job):
+        """Szabályok alkalmazása a feladatra letöltés és küldés előtt
+
+        Az eldobott üzenetek kikerülnek a feladatból, az átírt szövegek a
+        'texts' kulcsba kerülnek. Visszatérési érték: False, ha semmi sem maradt.
+        """
+        if not self.rules.rules:
+            return True
+        messages = job['messages']
+        result = self.rules.apply(messages, [self._rule_media_type(m) for m in messages])
+        kept, texts = result if result else ([], {})
+        if len(kept) < len(messages):
+            self.filtered_count += len(messages) - len(kept)
+            for message in messages:
+                if message not in kept:
+                    self._inflight.discard((job['source'], message.id))
+        job['messages'] = kept
+        if texts:
+            job['texts'] = texts
+        return bool(kept)
+    
+    @staticmethod
+    def _job_text(job, message):
+        """Az elküldendő szöveg: a szabályok által átírt, vagy az eredeti"""
+        texts = job.get('texts')
+        if texts and message.id in texts:
+            return texts[message.id]
+        return message.text or ""
+    
+    async def _catch_up(self):
+        """Kimaradt üzenetek lekérése és másolása, forrásonként
+
+        Az utoljára látott üzenet utáni részt kéri le (pl. újracsatlakozás
+        után); ha még nem láttunk üzenetet, a napló szerinti utolsó másolt
+        üzenettől indul.
+        """
+        if not self.ledger:
+            return
+        
+        for source_key, route in self.routes.items():
+            min_id = self._last_seen.get(source_key)
+            if not min_id:
+                # A leginkább lemaradt célhoz igazodunk; a többi célnál a napló szűr
+                last_ids = [self.ledger.last_copied_id(source_key, key) for key, _ in route['destinations']]
+                last_ids = [last_id for last_id in last_ids if last_id]
+                if not last_ids:
+                    continue
+                min_id = min(last_ids)
+            try:
+                await self._copy_range(source_key, min_id)
+            except Exception as e:
+                print(f"Hiba a kimaradt üzenetek pótlása során ({source_key}): {e}")
+    
+    async def _copy_range(self, source_key, min_id, max_id=0):
+        """A (min_id, max_id) közötti üzenetek másolása egyetlen lapozott lekéréssel, sorrendben
+
+        A határok kizáróak, a max_id=0 felső határ nélkül. Visszatérési érték:
+        a beküldött üzenetek száma (a már másoltakat a napló kiszűri). Hiba
+        esetén az utoljára látott azonosító az utolsó beküldött üzenetre áll
+        vissza, így a következő hézag vagy próba lekérés újra lekéri a
+        hiányzó részt, majd a hiba továbbadódik.
+        """
+        route = self.routes.get(source_key)
+        if route is None:
+            return 0
+        count = 0
+        done_id = min_id
+        try:
+            group = []
+            async for message in self.client.iter_messages(route['source'], min_id=min_id, max_id=max_id, reverse=True):
+                self._note_seen(source_key, message.id)
+                if group and (not message.grouped_id or message.grouped_id != group[-1].grouped_id):
+                    count += len(await self._submit(source_key, group))
+                    done_id = group[-1].id
+                    group = []
+                group.append(message)
+            if group:
+                count += len(await self._submit(source_key, group))
+        except BaseException:
+            self._last_seen[source_key] = min(self._last_seen.get(source_key, done_id), done_id)
+            raise
+        finally:
+            if count:
+                self.gap_stats['recovered'] += count
+                metrics.GAP_MESSAGES.inc(str(source_key), amount=count)
+                print(f"Kimaradt üzenetek pótolva: {count} ({source_key})")
+        return count
+    
+    def _note_seen(self, source_key, message_id):
+        """Az utoljára látott azonosító frissítése
+
+        Visszatérési érték: hézag esetén az előzőleg látott azonosító, egyébként
+        None. Hézagot csak csatornáknál jelez, ahol az azonosítók folytonosak.
+        """
+        last_id = self._last_seen.get(source_key)
+        if last_id is None or message_id > last_id:
+            self._last_seen[source_key] = message_id
+        if last_id and message_id > last_id + 1 and source_key in self._channel_sources and self.ledger:
+            return last_id
+        return None
+    
+    async def _probe_sources(self):
+        """A csatorna források legutóbbi üzenetének lekérése
+
+        A kapcsolatfelügyelet próba lekérése: egyetlen nyers, egyelemes
+        history kérés forrásonként, a korlátozó nélkül (FloodWait esetén sem
+        vár). Egyben a csendes időszakban kimaradt (pl. a kliens belső
+        újracsatlakozása alatt elveszett) frissítéseket is észreveszi:
+        visszatérési érték a [(forrás, utoljára látott azonosító), ...] hézagok
+        listája, ezeket a _copy_gaps pótolja az időkorláton kívül.
+        """
+        gaps = []
+        for source_key in self._channel_sources:
+            route = self.routes.get(source_key)
+            if route is None:
+                continue
+            history = await self.client(GetHistoryRequest(
+                peer=route['source'], offset_id=0, offset_date=None, add_offset=0, limit=1, max_id=0, min_id=0,
+                hash=0
+            ), flood_sleep_threshold=0)
+            if not history.messages:
+                continue
+            latest_id = history.messages[0].id
+            last_id = self._last_seen.get(source_key)
+            if last_id is None:
+                self._last_seen[source_key] = latest_id
+            elif latest_id > last_id and self.ledger:
+                gaps.append((source_key, last_id))
+        return gaps
+    
+    async def _copy_gaps(self, gaps):
+        """A próba lekérés által észlelt hézagok pótlása"""
+        for source_key, last_id in gaps:
+            self.gap_stats['gaps'] += 1
+            try:
+                await self._copy_range(source_key, last_id)
+            except Exception as e:
+                print(f"Hiba a kimaradt üzenetek pótlása során ({source_key}): {e}")
+    
+    def _can_relay(self, message, source_entity=None):
+        """Eldönti, hogy a média szerveroldalon újraküldhető-e (letöltés nélkül)"""
+        if not self.relay_media:
+            return False
+        if not isinstance(message.media, (MessageMediaPhoto, MessageMediaDocument)):
+            return False
+        # Védett tartalom esetén a szerver elutasítja a hivatkozás szerinti küldést
+        if getattr(message, 'noforwards', False):
+            return False
+        if getattr(source_entity, 'noforwards', False):
+            return False
+        return True
+    
+    async def _refresh_messages(self, source_entity, messages):
+        """Üzenetek újralekérése egyetlen hívással friss fájlhivatkozásokért"""
         try:
-            print(f"Új üzenet másolása: {message.id}")
+            fresh = await self.rate_limiter.call(
+                None, self.client.get_messages, source_entity, ids=[m.id for m in messages]
+            )
+            return [new or old for new, old in zip(fresh, messages)]
+        except Exception as e:
+            print(f"Hiba az üzenetek újralekérése során: {e}")
+        return messages
+    
+    async def _download_media(self, message):
+        """Média letöltése az ideiglenes könyvtárba, visszaadja a fájl útvonalát"""
+        if isinstance(message.media, MessageMediaPhoto):
+            # Fotó letöltése
+            file_path = os.path.join(self.temp_dir, f"photo_{message.id}_{int(time.time())}.jpg")
+            downloaded_file = await self.rate_limiter.call(None, self.client.download_media, message, file_path)
+            if downloaded_file:
+                print(f"Fotó letöltve: {downloaded_file}")
+            return downloaded_file
+        
+        if isinstance(message.media, MessageMediaDocument):
+            # Dokumentum/videó/audio letöltése
+            document = message.media.document
             
-            # Üzenet szövege
-            text = message.text or ""
+            # Fájlnév meghatározása
+            filename = f"document_{message.id}_{int(time.time())}"
             
-            # Média kezelése
-            file_to_send = None
+            # MIME type alapján kiterjesztés
+            if document.mime_type:
+                if document.mime_type.startswith('video/'):
+                    filename += '.mp4'
+                elif document.mime_type.startswith('audio/'):
+                    filename += '.mp3'
+                elif document.mime_type.startswith('image/'):
+                    filename += '.jpg'
+                else:
+                    # Eredeti fájlnév keresése az attribútumokban
+                    for attr in document.attributes:
+                        if hasattr(attr, 'file_name') and attr.file_name:
+                            filename = f"{message.id}_{int(time.time())}_{attr.file_name}"
+                            break
             
-            if message.media:
-                if isinstance(message.media, MessageMediaPhoto):
-                    # Fotó letöltése
-                    file_path = os.path.join(self.temp_dir, f"photo_{message.id}_{int(time.time())}.jpg")
-                    downloaded_file = await self.client.download_media(message, file_path)
-                    if downloaded_file:
-                        file_to_send = downloaded_file
-                        print(f"Fotó letöltve: {downloaded_file}")
-                
-                elif isinstance(message.media, MessageMediaDocument):
-                    # Dokumentum/videó/audio letöltése
-                    document = message.media.document
-                    
-                    # Fájlnév meghatározása
-                    filename = f"document_{message.id}_{int(time.time())}"
-                    
-                    # MIME type alapján kiterjesztés
-                    if document.mime_type:
-                        if document.mime_type.startswith('video/'):
-                            filename += '.mp4'
-                        elif document.mime_type.startswith('audio/'):
-                            filename += '.mp3'
-                        elif document.mime_type.startswith('image/'):
-                            filename += '.jpg'
-                        else:
-                            # Eredeti fájlnév keresése az attribútumokban
-                            for attr in document.attributes:
-                                if hasattr(attr, 'file_name') and attr.file_name:
-                                    filename = f"{message.id}_{int(time.time())}_{attr.file_name}"
-                                    break
-                    
-                    file_path = os.path.join(self.temp_dir, filename)
-                    downloaded_file = await self.client.download_media(message, file_path)
-                    if downloaded_file:
-                        file_to_send = downloaded_file
-                        print(f"Média letöltve: {downloaded_file}")
-                
-                elif isinstance(message.media, MessageMediaWebPage):
-                    # Weboldal előnézet - csak a szöveget másoljuk
-                    print("Weboldal előnézet - csak szöveg másolása")
-            
-            # Üzenet küldése a cél csatornára
-            if text or file_to_send:
-                await self.client.send_message(
-                    self.destination_entity,
-                    text,
-                    file=file_to_send
-                )
-                print(f"Üzenet sikeresen másolva: {message.id}")
-                
-                # Ideiglenes fájl törlése
-                if file_to_send and os.path.exists(file_to_send):
+            file_path = os.path.join(self.temp_dir, filename)
+            downloaded_file = None
+            if self.transfer_engine and self.transfer_engine.applies(message.media, document.size):
+                try:
+                    # Nagy dokumentum: a részek több kapcsolaton, párhuzamosan töltődnek le
+                    downloaded_file = await self.rate_limiter.call(
+                        None, self.transfer_engine.download, message.media, document.size, file_path, self.client
+                    )
+                except Exception as e:
+                    print(f"Párhuzamos letöltés sikertelen, letöltés egy kapcsolaton: {message.id} ({e})")
+            if not downloaded_file:
+                downloaded_file = await self.rate_limiter.call(None, self.client.download_media, message, file_path)
+            if downloaded_file:
+                print(f"Média letöltve: {downloaded_file}")
+            return downloaded_file
+        
+        if isinstance(message.media, MessageMediaWebPage):
+            # Weboldal előnézet - csak a szöveget másoljuk
+            print("Weboldal előnézet - csak szöveg másolása")
+        
+        return None
+    
+    @staticmethod
+    def _media_type(message):
+        """Média típusa a metrikák címkéjéhez"""
+        if isinstance(message.media, MessageMediaPhoto):
+            return 'photo'
+        if isinstance(message.media, MessageMediaDocument):
+            mime_type = getattr(message.media.document, 'mime_type', None) or ''
+            for prefix in ('video', 'audio', 'image'):
+                if mime_type.startswith(prefix + '/'):
+                    return prefix
+            return 'document'
+        return 'other'
+    
+    @staticmethod
+    def _media_identity(message):
+        """A forrás média azonosítója a média gyorsítótárhoz (id és access hash)"""
+        media = message.media
+        if isinstance(media, MessageMediaPhoto) and media.photo:
+            return f"photo:{media.photo.id}:{media.photo.access_hash}"
+        if isinstance(media, MessageMediaDocument) and media.document:
+            return f"document:{media.document.id}:{media.document.access_hash}"
+        return None
+    
+    async def _download_job_media(self, job):
+        """A feladat összes médiájának letöltése, a fájlok útvonala a 'files' kulcsba kerül
+
+        A gyorsítótárban lévő média nem kerül újra átvitelre; a 'cache_keys'
+        kulcsba az üzenetenként használt gyorsítótár kulcsok kerülnek.
+        """
+        job['files'] = []
+        job['cache_keys'] = []
+        job['cached'] = True
+        source = str(job['source'])
+        # A feltöltést és a küldést végző fiók; egy feladat (album) minden eleme ugyanahhoz kerül
+        account = self._job_account(job)
+        for message in job['messages']:
+            key = self._media_identity(message)
+            if key and not account.primary:
+                # A feltöltött fájl és az elküldött média csak az adott fiókkal használható újra
+                key = f"{account.name}|{key}"
+            job['cache_keys'].append(key)
+            if not message.media:
+                job['files'].append(None)
+                continue
+            cached = self.media_cache.get(key)
+            if cached is not None:
+                job['files'].append(cached)
+                continue
+            job['cached'] = False
+            started = time.monotonic()
+            media_type = self._media_type(message)
+            # Az átalakítandó képhez a teljes fájl kell, így az nem streamelhető
+            transform = bool(self.image_transformer and self.image_transformer.applies(message))
+            info = self.streamer.media_info(message) if self.streamer and not transform else None
+            if info:
+                try:
+                    # Letöltés és feltöltés átlapolva, ideiglenes fájl nélkül
+                    self.accounts.reserve(account, info[0])
                     try:
-                        os.remove(file_to_send)
-                        print(f"Ideiglenes fájl törölve: {file_to_send}")
-                    except Exception as e:
-                        print(f"Hiba a fájl törlése során: {e}")
+                        uploaded = await self.streamer.transfer(message, upload_client=account.client)
+                    finally:
+                        self.accounts.release(account, info[0])
+                    # A feltöltött fájl egy sikertelen küldés utáni újrapróbáláskor is felhasználható
+                    self.media_cache.put(key, uploaded)
+                    job['files'].append(uploaded)
+                    metrics.DOWNLOAD_SECONDS.observe(source, media_type, value=time.monotonic() - started)
+                    metrics.BYTES.inc(source, media_type, 'download', amount=info[0])
+                    metrics.BYTES.inc(source, media_type, 'upload', amount=info[0])
+                    continue
+                except Exception as e:
+                    print(f"Streamelés sikertelen, letöltés fájlba: {message.id} ({e})")
+                    started = time.monotonic()
+            file_path = await self._download_media(message)
+            metrics.DOWNLOAD_SECONDS.observe(source, media_type, value=time.monotonic() - started)
+            if not file_path and isinstance(message.media, (MessageMediaPhoto, MessageMediaDocument)):
+                # Média nélkül a szöveg sem megy ki, hogy a tétel később teljes egészében újrapróbálható legyen
+                raise MediaDownloadError(f"A média letöltése sikertelen: {message.id}")
+            if file_path:
+                metrics.BYTES.inc(source, media_type, 'download', amount=os.path.getsize(file_path))
+                # Azonos tartalom (pl. más forrásból) esetén a feltöltés elmarad; a több GB-os fájlok
+                # hash-elése szálban fut, hogy ne akassza meg az eseményhurkot
+                content_key = await asyncio.get_running_loop().run_in_executor(
+                    None, MediaHandleCache.file_key, file_path
+                )
+                if not account.primary:
+                    content_key = f"{account.name}|{content_key}"
+                cached = self.media_cache.get(content_key)
+                if cached is not None:
+                    os.remove(file_path)
+                    file_path = cached
+                elif transform:
+                    file_path = await self.image_transformer.transform(message, file_path, source, media_type)
+                elif self.transfer_engine and self.transfer_engine.applies(message.media, os.path.getsize(file_path)):
+                    file_path = await self._upload_parallel(message, file_path, account)
+                job['cache_keys'][-1] = (key, content_key)
+            job['files'].append(file_path)
+    
+    async def _upload_parallel(self, message, file_path, account):
+        """Letöltött nagy dokumentum feltöltése több kapcsolaton; a feltöltött médiát adja vissza
+
+        Hiba esetén a fájl útvonala marad, és a küldés tölti fel egy kapcsolaton.
+        """
+        try:
+            handle = await self.transfer_engine.upload(file_path, message.file.name or os.path.basename(file_path),
+                                                       account.client)
+        except Exception as e:
+            print(f"Párhuzamos feltöltés sikertelen, feltöltés küldéskor: {message.id} ({e})")
+            return file_path
+        os.remove(file_path)
+        return uploaded_media(message, handle)
+    
+    def _job_account(self, job):
+        """A feladathoz rendelt küldő fiók; első híváskor a legkevésbé terhelt, nem tiltott fiók"""
+        if job.get('account'):
+            return self.accounts.get(job['account'])
+        account = self.accounts.pick([key for key, _ in job['route']['destinations']])
+        job['account'] = account.name
+        return account
+    
+    async def _fetch_job_media(self, job):
+        """A feladat médiájának (újra)letöltése; hiba esetén a részleges letöltés törlődik
+
+        A hiba továbbmegy, a 'files' pedig None marad, így a következő cél sem
+        küldheti el az üzenetet a média nélkül.
+        """
+        try:
+            await self._download_job_media(job)
+        except BaseException:
+            self._cleanup_job_files(job)
+            raise
+    
+    def _cleanup_job_files(self, job):
+        """A feladathoz letöltött ideiglenes fájlok törlése"""
+        for file_path in job.get('files') or []:
+            if isinstance(file_path, str) and os.path.exists(file_path):
+                try:
+                    os.remove(file_path)
+                    print(f"Ideiglenes fájl törölve: {file_path}")
+                except Exception as e:
+                    print(f"Hiba a fájl törlése során: {e}")
+        job['files'] = None
+    
+    async def _send_job_files(self, job, destination_key, destination, files, account=None, wait_flood=True):
+        """Egy üzenet vagy album elküldése egy cél csatornára
+
+        Az account a küldő fiók (alapértelmezés: az elsődleges fiók).
+        wait_flood=False esetén a FloodWaitError várakozás nélkül a hívóhoz kerül.
+        Visszatérési érték: (forrás üzenet, elküldött üzenet) párok listája,
+        üres lista, ha nem volt mit elküldeni.
+        """
+        messages = job['messages']
+        client = account.client if account else self.client
+        limiter = account.rate_limiter if account else self.rate_limiter
+        if account and not account.primary:
+            destination = account.entities[destination_key]
+        
+        if len(messages) == 1:
+            text = self._job_text(job, messages[0])
+            if not text and not files[0]:
+                return []
+            sent = await limiter.call(
+                destination_key, client.send_message, destination, text, file=files[0], wait_flood=wait_flood
+            )
+            return [(messages[0], sent)]
+        
+        # Telegramon az album képaláírásai elemenként tárolódnak
+        items = [(f, m) for f, m in zip(files, messages) if f]
+        if not items:
+            return []
+        sent = await limiter.call(
+            destination_key,
+            client.send_file,
+            destination,
+            [f for f, _ in items],
+            caption=[self._job_text(job, m) for _, m in items],
+            wait_flood=wait_flood
+        )
+        return list(zip([m for _, m in items], sent or []))
+    
+    async def _prepare_job(self, job):
+        """Első szakasz: a média letöltése, ha nem küldhető újra szerveroldalon
+
+        A feladat egy szótár: {'source': forrás peer id, 'messages': [...]}
+        egyetlen üzenettel vagy egy album összes elemével. A letöltés célonként
+        nem ismétlődik: az összes cél ugyanazt az előkészített médiát kapja.
+        """
+        source_entity = job['route']['source']
+        job['relay'] = all(self._can_relay(m, source_entity) for m in job['messages'] if m.media) \
+            and any(m.media for m in job['messages'])
+        if not job['relay']:
+            try:
+                await self._download_job_media(job)
+            except Exception as e:
+                # A hiba a kézbesítő szakaszban kerül rögzítésre (napló, spool újrapróbálás)
+                self._cleanup_job_files(job)
+                job['error'] = e
+        return job
+    
+    def _send_candidates(self, job):
+        """A feladatot most küldeni képes fiókok (None: bármelyik, amelyik eléri a célt)
+
+        Továbbküldésnél a forrás média hivatkozásai a fogadó fiókéi, feltöltött
+        (vagy már elküldött) média csak a feltöltő fiókkal küldhető újra.
+        """
+        if job.get('relay'):
+            return [self.accounts.primary]
+        if any(job.get('files') or []):
+            return [self._job_account(job)]
+        return None
+    
+    async def _send_with_account(self, job, destination_key, destination, files):
+        """Küldés a most használható fiókkal, alvás nélkül
+
+        FloodWaitError esetén a tiltás a fiók korlátozójában rögzül, és a
+        következő nem tiltott fiók próbálkozik; ha nincs ilyen, AccountsBlocked.
+        """
+        candidates = self._send_candidates(job)
+        tried = []
+        while True:
+            remaining = [a for a in candidates or self.accounts.candidates([destination_key]) if a not in tried]
+            account = self.accounts.pick_ready([destination_key], remaining) if remaining else None
+            if account is None:
+                raise AccountsBlocked(max(1.0, self.accounts.blocked_for([destination_key], candidates)))
+            tried.append(account)
+            try:
+                return await self._send_job_files(job, destination_key, destination, files, account, wait_flood=False)
+            except FloodWaitError:
+                continue
+    
+    async def _deliver_to(self, job, destination_key, destination):
+        """Egy feladat kézbesítése egy célba
+
+        A küldő fiók a küldés pillanatában dől el. Ha minden szóba jöhető fiók
+        FloodWait alatt áll, AccountsBlocked jelzi, hogy a feladatot ennél a
+        célnál vissza kell tartani.
+        Visszatérési érték: {'success': bool, 'mode': ..., 'sent': [(forrás, elküldött), ...]}
+        """
+        messages = job['messages']
+        labels = (str(job['source']), str(destination_key))
+        
+        if job.get('relay'):
+            try:
+                started = time.monotonic()
+                sent_pairs = await self._send_with_account(
+                    job, destination_key, destination, [m.media for m in messages]
+                )
+                metrics.SEND_SECONDS.observe(*labels, 'relay', value=time.monotonic() - started)
+                return {'success': True, 'mode': 'relay', 'sent': sent_pairs}
+            except ChatForwardsRestrictedError:
+                print(f"Védett tartalom, letöltés szükséges: {messages[0].id}")
+            except (FileReferenceExpiredError, FileReferenceInvalidError):
+                print(f"Lejárt fájlhivatkozás, letöltés szükséges: {messages[0].id}")
+                source_entity = job['route']['source']
+                job['messages'] = messages = await self._refresh_messages(source_entity, messages)
             
-            # Kis késleltetés a rate limiting elkerülése érdekében
-            await asyncio.sleep(1)
+            await self._fetch_job_media(job)
+            job['relay'] = False
+        elif len(job.get('files') or []) != len(messages):
+            # Egy korábbi cél (újra)letöltése félbeszakadt: a média nélküli küldés helyett újra letöltjük
+            await self._fetch_job_media(job)
+        
+        files = job['files']
+        started = time.monotonic()
+        try:
+            sent_pairs = await self._send_with_account(job, destination_key, destination, files)
+        except (ChatForwardsRestrictedError, FileReferenceExpiredError, FileReferenceInvalidError,
+                FilePartMissingError, MediaEmptyError):
+            if not any(f for f in files if not isinstance(f, str)):
+                raise
+            # Elavult gyorsítótárazott hivatkozás vagy lejárt feltöltés: új átvitel, majd egy újrapróbálás
+            print(f"Elavult média hivatkozás, új átvitel: {messages[0].id}")
+            for keys in job.get('cache_keys') or []:
+                for key in keys if isinstance(keys, tuple) else (keys,):
+                    self.media_cache.invalidate(key)
+            self._cleanup_job_files(job)
+            await self._fetch_job_media(job)
+            files = job['files']
+            started = time.monotonic()
+            sent_pairs = await self._send_with_account(job, destination_key, destination, files)
+        if not sent_pairs:
+            return {'success': False, 'mode': None, 'sent': []}
+        mode = ('cached' if job.get('cached') else 'download') if any(files) else 'text'
+        metrics.SEND_SECONDS.observe(*labels, mode, value=time.monotonic() - started)
+        for file_path, message in zip(files, messages):
+            if isinstance(file_path, str):
+                metrics.BYTES.inc(labels[0], self._media_type(message), 'upload', amount=os.path.getsize(file_path))
+        
+        if any(files):
+            # A további célok és a későbbi újraküldések már az elküldött médiát kapják, átvitel nélkül
+            self._cleanup_job_files(job)
+            sent_media = {source.id: getattr(sent, 'media', None) for source, sent in sent_pairs}
+            job['files'] = [sent_media.get(m.id) for m in messages]
+            job['cached'] = True
+            for message, keys in zip(messages, job.get('cache_keys') or []):
+                for key in keys if isinstance(keys, tuple) else (keys,):
+                    self.media_cache.put(key, sent_media.get(message.id))
+        
+        return {'success': True, 'mode': mode, 'sent': sent_pairs}
+    
+    async def _deliver_job(self, job):
+        """Második szakasz: küldés az útvonal összes cél csatornájára
+
+        A FloodWait miatt most nem küldhető célnál a feladat visszatartásra
+        kerül (_hold), a küldő szakasz pedig alvás nélkül halad tovább a többi
+        céllal és útvonallal. A feladat lezárása (napló, spool, ideiglenes
+        fájlok) az utolsó cél kézbesítése után történik.
+        Visszatérési érték: {'success': bool, 'mode': 'relay' | 'download' | 'text' | None, 'held': célok száma}
+        """
+        job['result'] = {'success': True, 'mode': None}
+        # Célonként a kézbesítést meghiúsító hiba (a spool újrapróbálási szabályához)
+        job['errors'] = {}
+        job['held'] = set()
+        job['lock'] = asyncio.Lock()
+        try:
+            async with job['lock']:
+                # A beküldéskori útvonal szerint: a futás közbeni átkonfigurálás nem érinti a már úton lévő feladatot
+                for destination_key, destination in job['route']['destinations']:
+                    if destination_key in self._held:
+                        # Egy korábbi feladat erre a célra vár: a célonkénti sorrend miatt ez is mögé áll
+                        self._hold(job, destination_key)
+                        continue
+                    await self._deliver_destination(job, destination_key, destination)
+        except asyncio.CancelledError:
+            # Megszakított kézbesítés (leállítás ürítés nélkül): a tétel függőben marad, a következő indulás újraküldi
+            self._abandon_job(job)
+            raise
+        except Exception as e:
+            self._report_error(f"Hiba az üzenet másolása során: {e}")
+            job['errors'] = job['errors'] or {key: e for key, _ in job['route']['destinations']}
+            job['result']['success'] = False
+        
+        if not job['held']:
+            self._finish_job(job)
+        return dict(job['result'], held=len(job['held']))
+    
+    async def _deliver_destination(self, job, destination_key, destination):
+        """A feladat kézbesítése egy célba és az eredmény rögzítése
+
+        Visszatérési érték: False, ha a cél FloodWait miatt visszatartásra került.
+        """
+        source_key = job['source']
+        # A naplóban ennél a célnál már szereplő feladatot kihagyjuk
+        if all(self._is_copied(source_key, m, destination_key) for m in job['messages']):
+            return True
+        
+        delivery = {'success': False, 'mode': None, 'sent': []}
+        try:
+            if job.get('error'):
+                # Az előkészítés (letöltés) sikertelen volt
+                raise job['error']
+            delivery = await self._deliver_to(job, destination_key, destination)
+        except AccountsBlocked as e:
+            print(f"FloodWait ({destination_key}): {[m.id for m in job['messages']]} visszatartva, "
+                  f"újrapróbálás {e.seconds:.0f} mp múlva")
+            self._hold(job, destination_key)
+            return False
+        except Exception as e:
+            job['errors'][destination_key] = e
+            metrics.FAILURES.inc(str(source_key), str(destination_key), type(e).__name__)
+            self._report_error(f"Hiba az üzenet másolása során ({destination_key}): {e}")
+        
+        self._record_result(source_key, job['messages'], destination_key, delivery['sent'], delivery['success'])
+        job['result']['success'] = job['result']['success'] and delivery['success']
+        if delivery['success']:
+            self.mode_counts[delivery['mode']] += len(job['messages'])
+            self._observe_delivery(source_key, destination_key, delivery)
+            if job['result']['mode'] is None:
+                job['result']['mode'] = delivery['mode']
+            print(f"Üzenet sikeresen másolva: {[m.id for m in job['messages']]} -> {destination_key} "
+                  f"(mód: {delivery['mode']})")
+        return True
+    
+    def _hold(self, job, destination_key):
+        """A feladat visszatartása egy célnál; a célra váró feladatokat egy task küldi el sorrendben"""
+        job['held'].add(destination_key)
+        queue = self._held.setdefault(destination_key, collections.deque())
+        if not any(held is job for held in queue):
+            queue.append(job)
+        if destination_key not in self._hold_tasks:
+            self._hold_tasks[destination_key] = asyncio.create_task(self._release_held(destination_key))
+    
+    async def _release_held(self, destination_key):
+        """Egy célnál visszatartott feladatok kézbesítése sorrendben, amint a FloodWait lejár"""
+        queue = self._held[destination_key]
+        retry = False
+        try:
+            while queue:
+                job = queue[0]
+                wait = self.accounts.blocked_for([destination_key], self._send_candidates(job))
+                # Ismételt FloodWait után legalább egy másodperc szünet
+                await asyncio.sleep(max(wait, 1.0 if retry else 0.0))
+                destination = dict(job['route']['destinations'])[destination_key]
+                async with job['lock']:
+                    retry = not await self._deliver_destination(job, destination_key, destination)
+                if retry:
+                    continue
+                queue.popleft()
+                job['held'].discard(destination_key)
+                if not job['held']:
+                    self._finish_job(job)
+        except Exception as e:
+            self._report_error(f"Hiba a visszatartott üzenetek küldése során ({destination_key}): {e}")
+            for job in queue:
+                self._abandon_job(job)
+        finally:
+            self._held.pop(destination_key, None)
+            self._hold_tasks.pop(destination_key, None)
+    
+    async def _drop_held(self):
+        """Leállításkor: a visszatartott feladatok spool tételei függőben maradnak, a következő indulás újraküldi"""
+        jobs = {id(job): job for queue in self._held.values() for job in queue}
+        tasks = list(self._hold_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in jobs.values():
+            self._abandon_job(job)
+        if jobs:
+            print(f"{len(jobs)} visszatartott feladat a következő indításkor kerül újra sorra")
+    
+    def _finish_job(self, job):
+        """A feladat lezárása az összes cél után: ideiglenes fájlok, spool tétel, visszahívás"""
+        if job.get('finished'):
+            return
+        job['finished'] = True
+        self._cleanup_job_files(job)
+        for message in job['messages']:
+            self._inflight.discard((job['source'], message.id))
+        if job.get('spool_id'):
+            self._settle_spooled(job, job['errors'])
+        if job.get('on_delivered'):
+            job['on_delivered'](job, job['result'])
+    
+    def _abandon_job(self, job):
+        """Be nem fejezett feladat elengedése: a spool tétel függőben marad"""
+        if job.get('finished'):
+            return
+        job['finished'] = True
+        self._cleanup_job_files(job)
+        for message in job['messages']:
+            self._inflight.discard((job['source'], message.id))
+        if job.get('spool_id'):
+            self.spool.release(job['spool_id'])
+    
+    def _settle_spooled(self, job, errors):
+        """A spool tétel lezárása, vagy a hibaosztály szerinti újraütemezése / dead-letter"""
+        if not errors:
+            self.spool.complete(job['spool_id'])
+            return
+        outcome = self.spool.fail(job['spool_id'], errors)
+        if outcome == 'dead':
+            self._report_error(
+                f"Az üzenet a sikertelen üzenetek közé került: {[m.id for m in job['messages']]} "
+                f"({', '.join(type(e).__name__ for e in errors.values())})"
+            )
+    
+    def _observe_delivery(self, source_key, destination_key, delivery):
+        """Sikeres kézbesítés metrikái: darabszám és a forrás üzenet óta eltelt idő"""
+        labels = (str(source_key), str(destination_key))
+        metrics.MESSAGES.inc(*labels, delivery['mode'], amount=len(delivery['sent']))
+        now = time.time()
+        for source, _ in delivery['sent']:
+            if getattr(source, 'date', None):
+                metrics.LAG_SECONDS.observe(*labels, value=max(0.0, now - source.date.timestamp()))
+    
+    def _record_result(self, source_key, messages, destination_key, sent_pairs, success):
+        """Kézbesítés eredményének rögzítése a naplóban"""
+        if not self.ledger:
+            return
+        sent_ids = {source.id: getattr(sent, 'id', None) for source, sent in sent_pairs}
+        for message in messages:
+            status = 'copied' if success and message.id in sent_ids else 'failed'
+            self.ledger.record(
+                source_key, message.id, destination_key, sent_ids.get(message.id), status, self._media_key(message)
+            )
+    
+    @staticmethod
+    def _media_key(message):
+        """A forrás média azonosítója (fotó/dokumentum id), vagy None"""
+        media = message.media
+        if isinstance(media, MessageMediaPhoto) and media.photo:
+            return f"photo:{media.photo.id}"
+        if isinstance(media, MessageMediaDocument) and media.document:
+            return f"document:{media.document.id}"
+        return None
+    
+    async def _propagate_edit(self, source_key, message):
+        """Forrásbeli szerkesztés átvezetése a cél üzenetekre
+
+        Ha a média nem változott, csak a szöveg szerkesztődik (letöltés nélkül).
+        """
+        if not self.ledger:
+            return
+        
+        # A még kézbesítés alatt álló üzenetet megvárjuk, különben nincs mit szerkeszteni
+        deadline = time.monotonic() + 30
+        while (source_key, message.id) in self._inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        
+        route = self.routes.get(source_key)
+        if route is None:
+            return
+        media_key = self._media_key(message)
+        # A szerkesztés a fogadó fiókkal megy (a célban szerkesztési jog szükséges), így az új média is azzal töltődik fel
+        job = {
+            'source': source_key, 'route': route, 'messages': [message], 'files': None,
+            'account': self.accounts.primary.name
+        }
+        # A szerkesztett szövegre is ugyanazok a szabályok vonatkoznak
+        if not self._apply_rules(job):
+            return
+        text = self._job_text(job, message)
+        new_file = None
+        try:
+            for destination_key, destination in route['destinations']:
+                entry = self.ledger.get(source_key, message.id, destination_key)
+                if not entry or entry['status'] != 'copied' or not entry['dest_id']:
+                    continue
+                
+                try:
+                    if media_key == entry['media_key']:
+                        if not text and not media_key:
+                            continue
+                        await self.rate_limiter.call(
+                            destination_key, self.client.edit_message, destination, entry['dest_id'], text
+                        )
+                    else:
+                        # Új média: lehetőleg szerveroldali hivatkozással, egyébként egyszeri letöltéssel
+                        if new_file is None:
+                            if self._can_relay(message, route['source']):
+                                new_file = message.media
+                            else:
+                                await self._download_job_media(job)
+                                new_file = job['files'][0]
+                        await self.rate_limiter.call(
+                            destination_key, self.client.edit_message, destination, entry['dest_id'], text,
+                            file=new_file
+                        )
+                    self.ledger.record(source_key, message.id, destination_key, entry['dest_id'], 'copied', media_key)
+                    print(f"Szerkesztés átvezetve: {message.id} -> {destination_key}")
+                except MessageNotModifiedError:
+                    pass
+                except Exception as e:
+                    self._report_error(f"Hiba a szerkesztés átvezetése során ({destination_key}): {e}")
+        finally:
+            self._cleanup_job_files(job)
+    
+    def _buffer_deletes(self, source_key, message_ids):
+        """Törölt forrás üzenetek gyűjtése; az ablak végén célonként egy törlés megy ki"""
+        if not self.ledger:
+            return
+        self._pending_deletes.setdefault(source_key, set()).update(message_ids)
+        if self._delete_task is None:
+            self._delete_task = asyncio.create_task(self._flush_deletes_later())
+            # A lezárt, még futó ablakokat is számon tartjuk, hogy leállításkor bevárhatók legyenek
+            self._delete_flushes.add(self._delete_task)
+            self._delete_task.add_done_callback(self._delete_flushes.discard)
+    
+    async def _flush_deletes_later(self):
+        """A gyűjtési ablak után a törlések végrehajtása célonként egyetlen hívással"""
+        await asyncio.sleep(self.delete_window)
+        # Az ablak lezárása: az ezután érkező törlések új ablakot nyitnak
+        pending, self._pending_deletes = self._pending_deletes, {}
+        self._delete_task = None
+        
+        for source_key, message_ids in pending.items():
+            route = self.routes.get(source_key)
+            if route is None:
+                continue
+            destinations = dict(route['destinations'])
+            by_destination = {}
+            for source_id, destination_key, dest_id in self.ledger.get_copies(source_key, message_ids):
+                if destination_key in destinations:
+                    by_destination.setdefault(destination_key, []).append((source_id, dest_id))
             
+            for destination_key, items in by_destination.items():
+                try:
+                    await self.rate_limiter.call(
+                        destination_key,
+                        self.client.delete_messages,
+                        destinations[destination_key],
+                        [dest_id for _, dest_id in items]
+                    )
+                    for source_id, dest_id in items:
+                        self.ledger.record(source_key, source_id, destination_key, dest_id, 'deleted')
+                    print(f"{len(items)} törlés átvezetve -> {destination_key}")
+                except Exception as e:
+                    self._report_error(f"Hiba a törlések átvezetése során ({destination_key}): {e}")
+    
+    async def _copy_job(self, source_key, messages):
+        """Előkészítés és kézbesítés a folyamat megkerülésével (közvetlen másoláshoz)"""
+        job = {'source': source_key, 'route': self.routes[source_key], 'messages': messages}
+        if not self._apply_rules(job):
+            return {'success': True, 'mode': 'filtered'}
+        try:
+            await self._prepare_job(job)
         except Exception as e:
-            print(f"Hiba az üzenet másolása során: {e}")
+            self._report_error(f"Hiba az üzenet másolása során: {e}")
+            self._cleanup_job_files(job)
+            return {'success': False, 'mode': None}
+        return await self._deliver_job(job)
+    
+    async def copy_message(self, message, source_key=None):
+        """Egy üzenet másolása
+
+        A fotókat és dokumentumokat elsősorban a meglévő szerveroldali
+        hivatkozással küldjük újra (relay), így a fájl nem halad át a gépen.
+        Letöltésre csak védett tartalom vagy lejárt fájlhivatkozás esetén
+        kerül sor.
+
+        Visszatérési érték: {'success': bool, 'mode': 'relay' | 'download' | 'text' | None}
+        """
+        print(f"Új üzenet másolása: {message.id}")
+        return await self._copy_job(source_key or utils.get_peer_id(self.source_entity), [message])
+    
+    def _buffer_album_message(self, source_key, message):
+        """Album elemének pufferelése, a csoport az ablak lejárta után egyben megy ki"""
+        if self._is_known(source_key, message):
+            return
+        self._inflight.add((source_key, message.id))
+        group_key = (source_key, message.grouped_id)
+        # Az útvonal a gyűjtés kezdetekor rögzül, így egy közben törölt útvonal albuma is kézbesül
+        buffer = self._album_buffers.setdefault(
+            group_key, {'messages': [], 'last_seen': 0, 'route': self.routes[source_key]}
+        )
+        buffer['messages'].append(message)
+        buffer['last_seen'] = time.monotonic()
+        
+        if group_key not in self._album_tasks:
+            # Az album helyét a gyűjtés idejére lefoglaljuk a sorrendben
+            self.pipeline.reserve(message.id, ('live', source_key))
+            buffer['key'] = message.id
+            self._album_tasks[group_key] = asyncio.create_task(self._flush_album_later(group_key))
+    
+    async def _flush_album_later(self, group_key):
+        """Vár, amíg az album elemei beérkeznek, majd beküldi a csoportot"""
+        try:
+            # Az ablak minden újabb elem érkezésekor újraindul
+            while True:
+                remaining = self._album_buffers[group_key]['last_seen'] + self.album_window - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+            
+            source_key = group_key[0]
+            buffer = self._album_buffers.pop(group_key)
+            messages = sorted(buffer['messages'], key=lambda m: m.id)
+            job = {'source': source_key, 'route': buffer['route'], 'messages': messages}
+            if not self._apply_rules(job):
+                self.pipeline.cancel(buffer['key'], ('live', source_key))
+                return
+            self._spool_job(job)
+            await self.pipeline.submit(buffer['key'], job, lane=('live', source_key))
+        finally:
+            self._album_tasks.pop(group_key, None)
     
-    def stop_copying(self):
-        """Üzenetmásolás leállítása"""
+    async def copy_album(self, messages, source_key=None):
+        """Album (csoportosított média) másolása egyetlen többfájlos küldéssel
+
+        Visszatérési érték: {'success': bool, 'mode': 'relay' | 'download' | None}
+        """
+        messages = sorted(messages, key=lambda m: m.id)
+        print(f"Album másolása: {[m.id for m in messages]}")
+        return await self._copy_job(source_key or utils.get_peer_id(self.source_entity), messages)
+    
+    async def run_backfill(self, min_id=0, max_id=0, from_date=None, source=None):
+        """Előzmények másolása streamelve, checkpointtal
+
+        Futó élő másolás mellett annak folyamatát használja (alacsonyabb
+        prioritással), egyébként saját folyamatot indít a backfill idejére.
+        A source a forrás peer id-ja; alapértelmezés az első útvonal.
+        """
+        if self.backfill and self.backfill.state == 'running':
+            print("A backfill már fut!")
+            return False
+        
+        standalone = self.pipeline is None
+        if standalone:
+            if not await self.initialize():
+                print("Inicializálás sikertelen!")
+                return False
+            await self._start_pipeline()
+        
+        source_key = source if source is not None else next(iter(self.routes))
+        self.backfill = HistoryBackfill(self, source_key, min_id=min_id, max_id=max_id, from_date=from_date)
+        try:
+            await self.backfill.run()
+        finally:
+            if standalone:
+                await self._stop_pipeline()
+        return self.backfill.state == 'completed'
+    
+    def stop_backfill(self):
+        """Futó backfill leállítása (a pozíció mentésre kerül)"""
+        if self.backfill:
+            self.backfill.stop()
+    
+    def get_status(self):
+        """Másolási statisztikák, sorhossz és sebességkorlátok lekérése"""
+        return {
+            'routes': {
+                str(key): [str(destination_key) for destination_key, _ in route['destinations']]
+                for key, route in self.routes.items()
+            },
+            'modes': dict(self.mode_counts),
+            'copied': sum(self.mode_counts.values()),
+            'last_error': self.last_error,
+            'pipeline': self.pipeline.get_status() if self.pipeline else None,
+            'streaming': self.streamer.get_status() if self.streamer else None,
+            'media_cache': self.media_cache.get_status(),
+            'image_transform': self.image_transformer.get_status() if self.image_transformer else None,
+            'parallel_transfer': self.transfer_engine.get_status() if self.transfer_engine else None,
+            'rules': self.rules.get_status(),
+            'accounts': self.accounts.get_status(),
+            'filtered': self.filtered_count,
+            'spool': self.spool.get_status() if self.spool else None,
+            'connection': self.supervisor.get_status() if self.supervisor else None,
+            'gaps': dict(self.gap_stats),
+            'rate_limiter': self.rate_limiter.get_status(),
+            'backfill': self.backfill.get_status() if self.backfill else None
+        }
+    
+    def apply_config(self, config):
+        """Futás közben módosítható beállítások átvétele (a config.subscribe visszahívása)
+
+        Bármely szálból hívható; futó másolás esetén a módosítás a másoló
+        eseményhurkán történik. Az útvonalak változása futó másolásnál a
+        reconfigure-rel, leállított másolónál a következő indításkor érvényesül.
+        """
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._apply_config, config)
+        else:
+            self._apply_config(config)
+    
+    def _apply_config(self, config):
+        self.relay_media = config.get('relay_media', self.relay_media)
+        self.album_window = float(config.get('album_window', self.album_window))
+        self.delete_window = float(config.get('delete_window', self.delete_window))
+        self.reorder_timeout = float(config.get('reorder_timeout', self.reorder_timeout))
+        if self.pipeline:
+            self.pipeline.reorder_timeout = self.reorder_timeout
+        rules = config.get('rules') or []
+        if rules != self.rules_config:
+            # A szabályok újrafordítása; az azonos nevű szabályok számlálói megmaradnak
+            self.rules_config = rules
+            self.rules = RuleEngine(rules, previous=self.rules)
+            print(f"Szabályok újratöltve: {len(self.rules.rules)} szabály")
+        route_config = config.get('routes') or [
+            {'source': config.get('source_channel_id'), 'destinations': [config.get('destination_channel_id')]}
+        ]
+        if has_routes(config) and route_config != self.route_config:
+            if self.is_running:
+                # Az új csatornák feloldása hálózati kérés lehet, ezért háttérfeladatként fut
+                task = asyncio.ensure_future(self.reconfigure(route_config))
+                self._reconfigure_tasks.add(task)
+                task.add_done_callback(self._reconfigure_tasks.discard)
+            else:
+                self.route_config = route_config
+    
+    def stop_copying(self, drain=True):
+        """Üzenetmásolás leállítása
+
+        drain=False esetén a sorban lévő üzenetek kézbesítése nélkül áll le: a
+        spoolban lévők a következő indításkor, a többi a napló szerinti
+        pótlással kerül újra sorra.
+        """
         self.is_running = False
+        if not drain and self.pipeline:
+            print(f"Leállítás kézbesítés nélkül, {self.pipeline.lane_size()} üzenet marad a sorban.")
+            self.pipeline.abort()
         print("Üzenetmásolás leállítási kérelem...")
     
     async def copy_recent_messages(self, limit=10):
-        """Legutóbbi üzenetek másolása (teszteléshez)"""
+        """Legutóbbi üzenetek másolása (teszteléshez), az első útvonal forrásából"""
         try:
             if not await self.initialize():
                 print("Inicializálás sikertelen!")
                 return False
             
             print(f"Legutóbbi {limit} üzenet másolása...")
+            source_key = utils.get_peer_id(self.source_entity)
             
             # Legutóbbi üzenetek lekérése
-            messages = await self.client.get_messages(self.source_entity, limit=limit)
+            messages = await self.rate_limiter.call(None, self.client.get_messages, self.source_entity, limit=limit)
+            
+            # Időrendi sorrendben, az albumok elemei egy csoportba fogva
+            for group in self._group_messages(reversed(messages)):
+                # A naplóban már másoltként szereplő üzeneteket kihagyjuk
+                group = [m for m in group if not self._is_known(source_key, m)]
+                if len(group) > 1:
+                    await self.copy_album(group, source_key)
+                elif group and (group[0].text or group[0].media):
+                    await self.copy_message(group[0], source_key)
             
-            for message in reversed(messages):  # Időrendi sorrendben
-                if message.text or message.media:
-                    await self.copy_message(message)
-                    await asyncio.sleep(2)  # Nagyobb késleltetés a teszteléshez
+            if self.ledger:
+                self.ledger.flush()
             
             print("Legutóbbi üzenetek másolása befejezve.")
             return True
-            
+        
         except Exception as e:
             print(f"Hiba a legutóbbi üzenetek másolása során: {e}")
             return False
     
+    @staticmethod
+    def _group_messages(messages):
+        """Egymást követő, azonos grouped_id-jű üzenetek csoportosítása"""
+        group = []
+        for message in messages:
+            if group and (not message.grouped_id or message.grouped_id != group[-1].grouped_id):
+                yield group
+                group = []
+            group.append(message)
+        if group:
+            yield group
+    
     def cleanup(self):
         """Takarítás - ideiglenes fájlok törlése"""
         try:
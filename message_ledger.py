@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+LEDGER_FILE = os.path.join('data', 'ledger.db')
+
+
+class MessageLedger:
+    """Másolt üzenetek nyilvántartása SQLite adatbázisban
+
+    A (forrás chat, forrás üzenet) -> (cél chat, cél üzenet) hozzárendelést
+    tárolja állapottal és időbélyegekkel. Az írások memóriában gyűlnek, és
+    kötegelve kerülnek véglegesítésre, így nem minden üzenet jár külön fsync-kel.
+    A lekérdezések az elsődleges kulcs indexét használják.
+    """
+
+    def __init__(self, db_path=LEDGER_FILE, batch_size=100, flush_interval=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                source_chat INTEGER NOT NULL,
+                source_id INTEGER NOT NULL,
+                dest_chat INTEGER NOT NULL,
+                dest_id INTEGER,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                media_key TEXT,
+                PRIMARY KEY (source_chat, source_id, dest_chat)
+            ) WITHOUT ROWID
+        ''')
+        # Régebbi adatbázisok bővítése a média azonosító oszloppal
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(messages)')}
+        if 'media_key' not in columns:
+            self._conn.execute('ALTER TABLE messages ADD COLUMN media_key TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_dest ON messages (dest_chat, dest_id)')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def record(self, source_chat, source_id, dest_chat, dest_id, status='copied', media_key=None):
+        """Másolás eredményének rögzítése (kötegelt írással)
+
+        A media_key a forrás média azonosítója (pl. 'photo:123'), ebből derül ki
+        szerkesztéskor, hogy csak a szöveg változott-e.
+        """
+        now = time.time()
+        key = (source_chat, source_id, dest_chat)
+        with self._lock:
+            previous = self._pending.get(key)
+            created_at = previous[5] if previous else now
+            self._pending[key] = (source_chat, source_id, dest_chat, dest_id, status, created_at, now, media_key)
+            should_flush = len(self._pending) >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def get(self, source_chat, source_id, dest_chat):
+        """Egy bejegyzés lekérése: {'dest_id', 'status', 'created_at', 'updated_at', 'media_key'} vagy None"""
+        key = (source_chat, source_id, dest_chat)
+        with self._lock:
+            row = self._pending.get(key)
+            if row:
+                row = row[3:]
+            else:
+                row = self._conn.execute(
+                    'SELECT dest_id, status, created_at, updated_at, media_key FROM messages '
+                    'WHERE source_chat = ? AND source_id = ? AND dest_chat = ?',
+                    key
+                ).fetchone()
+        if not row:
+            return None
+        return {'dest_id': row[0], 'status': row[1], 'created_at': row[2], 'updated_at': row[3], 'media_key': row[4]}
+
+    def is_copied(self, source_chat, source_id, dest_chat):
+        """Ellenőrzi, hogy az üzenet már sikeresen másolva lett-e"""
+        entry = self.get(source_chat, source_id, dest_chat)
+        return bool(entry and entry['status'] == 'copied')
+
+    def get_copies(self, source_chat, source_ids):
+        """Több forrás üzenet sikeres másolatainak lekérése egyetlen lekérdezéssel
+
+        Visszatérési érték: (forrás üzenet id, cél chat, cél üzenet id) hármasok listája.
+        """
+        source_ids = list(source_ids)
+        if not source_ids:
+            return []
+        self.flush()
+        placeholders = ','.join('?' * len(source_ids))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT source_id, dest_chat, dest_id FROM messages WHERE source_chat = ? "
+                f"AND source_id IN ({placeholders}) AND status = 'copied' AND dest_id IS NOT NULL",
+                [source_chat] + source_ids
+            ).fetchall()
+
+    def last_copied_id(self, source_chat, dest_chat):
+        """A legnagyobb sikeresen másolt forrás üzenetazonosító (vagy None)"""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(source_id) FROM messages WHERE source_chat = ? AND dest_chat = ? AND status = 'copied'",
+                (source_chat, dest_chat)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_checkpoint(self, name, data):
+        """Folyamatállapot (pl. backfill pozíció) mentése a függő írásokkal együtt"""
+        self.flush()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO checkpoints (name, data, updated_at) VALUES (?, ?, ?)',
+                (name, json.dumps(data), time.time())
+            )
+            self._conn.commit()
+
+    def load_checkpoint(self, name):
+        """Mentett folyamatállapot betöltése (vagy None)"""
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM checkpoints WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def maybe_flush(self):
+        """Véglegesítés, ha a legutóbbi óta eltelt a flush_interval"""
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Függőben lévő írások véglegesítése egyetlen tranzakcióban"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            rows = list(pending.values())
+            try:
+                self._conn.executemany('''
+                    INSERT INTO messages (source_chat, source_id, dest_chat, dest_id, status, created_at, updated_at,
+                                          media_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (source_chat, source_id, dest_chat) DO UPDATE SET
+                        dest_id = excluded.dest_id,
+                        status = excluded.status,
+                        updated_at = excluded.updated_at,
+                        media_key = excluded.media_key
+                ''', rows)
+                self._conn.commit()
+            except Exception as e:
+                # A sorok a következő mentéssel próbálkoznak újra; az azóta rögzített újabb állapot az erősebb
+                for key, row in pending.items():
+                    self._pending.setdefault(key, row)
+                print(f"Hiba a napló mentése során: {e}")
+                try:
+                    self._conn.rollback()
+                except Exception:
+                    pass
+
+    def close(self):
+        """Függőben lévő írások mentése és az adatbázis lezárása"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import math
+
+# Alapértelmezett hisztogram határok másodpercben (Prometheus kliens könyvtárakkal egyező)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LAG_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 86400.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """Monoton növekvő számláló címkékkel
+
+    A rögzítés egyetlen szótárművelet lock nélkül: a mérések az eseményhurok
+    szálán történnek, a lekérdezés pedig a szótár pillanatképét olvassa.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield self.name + '_total', _format_labels(self.labelnames, labels), value
+
+
+class Gauge:
+    """Pillanatnyi érték; beállítható közvetlenül vagy lekérdezéskor hívott függvénnyel"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+    def set_function(self, function):
+        """A függvény {címke értékek tuple: érték} szótárt ad vissza"""
+        self._function = function
+
+    def samples(self):
+        values = dict(self._values)
+        if self._function:
+            try:
+                values.update(self._function())
+            except Exception as e:
+                print(f"Hiba a metrika lekérdezése során ({self.name}): {e}")
+        for labels, value in values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Eloszlás rögzítése rögzített határokkal (bucket), összeggel és darabszámmal"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}  # címkék -> [bucketenkénti darabszámok, összeg]
+
+    def observe(self, *labels, value):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * len(self.buckets), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, list(counts)):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield self.name + '_bucket', _format_labels(self.labelnames, labels, le), cumulative
+            yield self.name + '_sum', _format_labels(self.labelnames, labels), total
+            yield self.name + '_count', _format_labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    """Metrikák gyűjteménye Prometheus szöveges formátumú kiírással"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+DOWNLOAD_SECONDS = REGISTRY.register(Histogram(
+    'telegram_copier_download_seconds', 'Media download time', ('source', 'media_type')))
+SEND_SECONDS = REGISTRY.register(Histogram(
+    'telegram_copier_send_seconds', 'Send/upload time per destination', ('source', 'destination', 'mode')))
+LAG_SECONDS = REGISTRY.register(Histogram(
+    'telegram_copier_lag_seconds', 'Destination send time minus source message date',
+    ('source', 'destination'), buckets=LAG_BUCKETS))
+BYTES = REGISTRY.register(Counter(
+    'telegram_copier_bytes', 'Bytes transferred by media type', ('source', 'media_type', 'direction')))
+MESSAGES = REGISTRY.register(Counter(
+    'telegram_copier_messages', 'Copied messages', ('source', 'destination', 'mode')))
+FAILURES = REGISTRY.register(Counter(
+    'telegram_copier_failures', 'Failures by exception type', ('source', 'destination', 'exception')))
+FLOOD_WAITS = REGISTRY.register(Counter(
+    'telegram_copier_flood_waits', 'FloodWaitError count', ('destination',)))
+FLOOD_WAIT_SECONDS = REGISTRY.register(Counter(
+    'telegram_copier_flood_wait_seconds', 'Seconds requested by FloodWaitError', ('destination',)))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'telegram_copier_queue_depth', 'Copy pipeline items by stage', ('stage',)))
+RECONNECTS = REGISTRY.register(Counter(
+    'telegram_copier_reconnects', 'Successful reconnects after a lost connection'))
+GAP_MESSAGES = REGISTRY.register(Counter(
+    'telegram_copier_gap_messages', 'Missed source messages recovered from history', ('source',)))
+LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    'telegram_copier_loop_lag_seconds', 'Event loop wakeup delay measured by the watchdog'))
+SLOW_CALLBACKS = REGISTRY.register(Counter(
+    'telegram_copier_slow_callbacks', 'Event loop stalls longer than the watchdog threshold'))
+TRANSFER_BYTES_PER_SECOND = REGISTRY.register(Gauge(
+    'telegram_copier_transfer_bytes_per_second', 'Throughput of the last parallel transfer', ('direction',)))
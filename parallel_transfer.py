@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import random
+import time
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError, ServerError, TimedOutError
+from telethon.network import MTProtoSender
+from telethon.tl.alltlobjects import LAYER
+from telethon.tl.functions import InvokeWithLayerRequest
+from telethon.tl.functions.auth import ExportAuthorizationRequest, ImportAuthorizationRequest
+from telethon.tl.functions.upload import GetFileRequest, SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import InputDocumentFileLocation, InputFile, InputFileBig, MessageMediaDocument
+
+import metrics
+from media_stream import BIG_FILE_SIZE, MAX_CHUNK_SIZE
+
+MB = 1024 * 1024
+# Újrapróbálható részhibák: megszakadt kapcsolat, időtúllépés, szerveroldali hiba
+RETRYABLE_ERRORS = (OSError, asyncio.TimeoutError, ServerError, TimedOutError)
+
+
+class TransferEngine:
+    """Nagy dokumentumok átvitele részenként, több párhuzamos kapcsolaton
+
+    A Telethon a fájlrészeket egy kapcsolaton, egymás után kéri le és tölti
+    fel, így egy átvitel sebességét a kérésenkénti körülfordulási idő
+    korlátozza. Itt connections darab saját MTProtoSender kapcsolat fut
+    párhuzamosan: a letöltés közvetlenül a fájl adatközpontjához (dc_id), a
+    feltöltés a feltöltő fiók saját adatközpontjához kapcsolódik. Minden
+    kapcsolat egyszerre egy részt tart a memóriában, így egy átvitel
+    memóriaigénye legfeljebb connections * part_size bájt. A kapcsolatok
+    átvitelek között megmaradnak, a close() zárja le őket.
+
+    A kapcsolatok a Telethon belső (_get_dc, _connection, _init_request)
+    interfészeire épülnek, ugyanúgy, ahogy a Telethon a saját exportált
+    kapcsolatait létrehozza. Nem Telethon kliensnél (pl. a mérések hamis
+    kliense) a részkérések párhuzamosan, magán a kliensen mennek.
+    """
+
+    def __init__(self, connections=4, part_size=MAX_CHUNK_SIZE, min_size=BIG_FILE_SIZE, max_retries=5,
+                 part_timeout=60.0):
+        self.connections = max(1, int(connections))
+        part_size = int(part_size)
+        # Letöltésnél 4 KB többszöröse, feltöltésnél 1 KB többszöröse és 512 KB osztója kell
+        if part_size % 4096 or MAX_CHUNK_SIZE % part_size:
+            part_size = MAX_CHUNK_SIZE
+        self.part_size = part_size
+        self.min_size = int(min_size)
+        self.max_retries = max_retries
+        self.part_timeout = part_timeout
+        self._pools = {}   # (kliens, dc_id) -> [MTProtoSender, ...]
+        self._locks = {}
+        self.stats = {'transfers': 0, 'downloads': 0, 'uploads': 0, 'bytes': 0, 'seconds': 0.0, 'retries': 0,
+                      'failed': 0, 'last_mbps': 0.0}
+
+    def applies(self, media, size):
+        """Igaz, ha a média elég nagy dokumentum a párhuzamos átvitelhez"""
+        return isinstance(media, MessageMediaDocument) and bool(media.document) and size >= self.min_size
+
+    async def transfer(self, media, size, name, download_client, upload_client):
+        """A dokumentum letöltése és feltöltése részenként; a feltöltött InputFile-t adja vissza"""
+        document = media.document
+        location = self._location(document)
+        sources = await self._connections(download_client, document.dc_id)
+        targets = await self._connections(upload_client, None)
+        file_id = random.getrandbits(63)
+        total_parts = (size + self.part_size - 1) // self.part_size
+        workers = min(self.connections, total_parts)
+        parts = iter(range(total_parts))
+        # Kapcsolatonként egy letöltő és egy feltöltő worker, így a két irány átlapolódik
+        downloaded = asyncio.Queue(workers)
+        running = [workers]
+
+        async def download_parts(index):
+            for part in parts:
+                data = await self._get_part(sources[index % len(sources)], location, part)
+                await downloaded.put((part, data))
+            running[0] -= 1
+            if not running[0]:
+                for _ in range(workers):
+                    await downloaded.put(None)
+
+        async def upload_parts(index):
+            while True:
+                item = await downloaded.get()
+                if item is None:
+                    return
+                await self._save_part(targets[index % len(targets)], file_id, item[0], total_parts, size, item[1])
+
+        await self._run(
+            [download_parts(index) for index in range(workers)] + [upload_parts(index) for index in range(workers)],
+            size, 'stream'
+        )
+        self.stats['transfers'] += 1
+        return self._input_file(file_id, total_parts, size, name)
+
+    async def upload(self, file_path, name, client):
+        """Fájl feltöltése részenként; a feltöltött InputFile-t adja vissza"""
+        size = os.path.getsize(file_path)
+        targets = await self._connections(client, None)
+        file_id = random.getrandbits(63)
+        total_parts = (size + self.part_size - 1) // self.part_size
+        parts = iter(range(total_parts))
+        fd = os.open(file_path, os.O_RDONLY)
+
+        async def upload_parts(index):
+            for part in parts:
+                data = os.pread(fd, self.part_size, part * self.part_size)
+                await self._save_part(targets[index % len(targets)], file_id, part, total_parts, size, data)
+
+        try:
+            await self._run([upload_parts(index) for index in range(min(self.connections, total_parts))], size,
+                            'upload')
+        finally:
+            os.close(fd)
+        self.stats['uploads'] += 1
+        return self._input_file(file_id, total_parts, size, name)
+
+    async def download(self, media, size, file_path, client):
+        """A dokumentum letöltése fájlba, a részek a helyükre íródnak; a fájl útvonalát adja vissza"""
+        document = media.document
+        location = self._location(document)
+        sources = await self._connections(client, document.dc_id)
+        total_parts = (size + self.part_size - 1) // self.part_size
+        parts = iter(range(total_parts))
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+        async def download_parts(index):
+            for part in parts:
+                data = await self._get_part(sources[index % len(sources)], location, part)
+                os.pwrite(fd, data, part * self.part_size)
+
+        try:
+            os.ftruncate(fd, size)
+            await self._run([download_parts(index) for index in range(min(self.connections, total_parts))], size,
+                            'download')
+        except BaseException:
+            os.close(fd)
+            os.remove(file_path)
+            raise
+        os.close(fd)
+        self.stats['downloads'] += 1
+        return file_path
+
+    @staticmethod
+    def _location(document):
+        return InputDocumentFileLocation(
+            id=document.id, access_hash=document.access_hash, file_reference=document.file_reference,
+            thumb_size=''
+        )
+
+    async def _run(self, workers, size, direction):
+        """A workerek párhuzamos futtatása és a sebesség mérése; az első hiba mindet leállítja
+
+        A workerek egy közös rész-iterátorból vesznek, így minden rész pontosan
+        egy workerhez kerül.
+        """
+        started = time.monotonic()
+        tasks = [asyncio.create_task(worker) for worker in workers]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.stats['failed'] += 1
+            raise
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stats['bytes'] += size
+        self.stats['seconds'] += elapsed
+        self.stats['last_mbps'] = round(size / elapsed / MB, 2)
+        metrics.TRANSFER_BYTES_PER_SECOND.set(direction, value=size / elapsed)
+        print(f"Párhuzamos átvitel kész: {size / MB:.1f} MB, {elapsed:.1f} mp ({self.stats['last_mbps']} MB/s)")
+
+    async def _save_part(self, connection, file_id, part, total_parts, size, data):
+        # A Telegram 10 MB felett "nagy fájlként" fogadja a feltöltést
+        if size > BIG_FILE_SIZE:
+            request = SaveBigFilePartRequest(file_id, part, total_parts, data)
+        else:
+            request = SaveFilePartRequest(file_id, part, data)
+        await self._call(connection, request)
+
+    @staticmethod
+    def _input_file(file_id, total_parts, size, name):
+        if size > BIG_FILE_SIZE:
+            return InputFileBig(file_id, total_parts, name)
+        return InputFile(file_id, total_parts, name, md5_checksum='')
+
+    async def _get_part(self, connection, location, part):
+        result = await self._call(connection, GetFileRequest(location, offset=part * self.part_size,
+                                                             limit=self.part_size))
+        return result.bytes
+
+    async def _call(self, connection, request):
+        """Egy részkérés elküldése; FloodWait és átmeneti hiba esetén vár és újrapróbálja"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if isinstance(connection, MTProtoSender):
+                    return await asyncio.wait_for(connection.send(request), self.part_timeout)
+                return await asyncio.wait_for(connection(request), self.part_timeout)
+            except FloodWaitError as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.stats['retries'] += 1
+                await asyncio.sleep(e.seconds)
+            except RETRYABLE_ERRORS:
+                if attempt >= self.max_retries:
+                    raise
+                self.stats['retries'] += 1
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+    async def _connections(self, client, dc_id):
+        """A kliens kapcsolatai az adott adatközponthoz (None: a fiók saját adatközpontja)"""
+        if not isinstance(client, TelegramClient):
+            return [client] * self.connections
+        dc_id = dc_id or client.session.dc_id
+        key = (client, dc_id)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            pool = self._pools.setdefault(key, [])
+            if not pool:
+                # Saját adatközpontban a munkamenet kulcsa használható, máshol az első kapcsolat
+                # exportált bejelentkezéssel jön létre, a többi annak kulcsát használja
+                auth_key = client.session.auth_key if dc_id == client.session.dc_id else None
+                pool.append(await self._create_sender(client, dc_id, auth_key))
+            missing = self.connections - len(pool)
+            if missing > 0:
+                results = await asyncio.gather(
+                    *(self._create_sender(client, dc_id, pool[0].auth_key) for _ in range(missing)),
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, BaseException):
+                        # Kevesebb kapcsolattal is működik; a következő átvitel újra próbálja
+                        print(f"Párhuzamos kapcsolat létrehozása sikertelen (DC {dc_id}): {result}")
+                    else:
+                        pool.append(result)
+            return list(pool)
+
+    @staticmethod
+    async def _create_sender(client, dc_id, auth_key):
+        dc = await client._get_dc(dc_id)
+        sender = MTProtoSender(auth_key, loggers=client._log)
+        try:
+            await sender.connect(client._connection(
+                dc.ip_address, dc.port, dc.id, loggers=client._log, proxy=client._proxy,
+                local_addr=client._local_addr
+            ))
+            if auth_key is None:
+                auth = await client(ExportAuthorizationRequest(dc_id))
+                client._init_request.query = ImportAuthorizationRequest(id=auth.id, bytes=auth.bytes)
+                await sender.send(InvokeWithLayerRequest(LAYER, client._init_request))
+        except BaseException:
+            await sender.disconnect()
+            raise
+        return sender
+
+    async def close(self):
+        """Az összes kapcsolat lezárása (a következő átvitel újra felépíti őket)"""
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            for sender in pool:
+                try:
+                    await sender.disconnect()
+                except Exception as e:
+                    print(f"Hiba a párhuzamos kapcsolat lezárása során: {e}")
+
+    def get_status(self):
+        """Átviteli statisztikák és az átlagos sebesség (MB/s)"""
+        mbps = self.stats['bytes'] / self.stats['seconds'] / MB if self.stats['seconds'] else 0.0
+        return dict(
+            self.stats, mbps=round(mbps, 2), connections=self.connections, part_kb=self.part_size // 1024,
+            open_connections=sum(len(pool) for pool in self._pools.values())
+        )
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import os
+import sys
+import threading
+import time
+
+# Egyszerre egy mintavételezés futhat
+_lock = threading.Lock()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+    """A mért szálon futó profilozó hook (sys.setprofile), amely interval időnként vesz mintát
+
+    Egy másik szálból vett minta a GIL miatt szinte mindig a hurok select
+    hívására esne (ott engedi el a GIL-t), ezért a minta a mért szálon
+    készül. A két esemény között eltelt idő a mintavétel pillanatában futó
+    veremé; C függvényből visszatérve (pl. select, time.sleep) a függvény
+    neve is a verembe kerül, így a blokkoló hívások és a tétlen várakozás is
+    látszik.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._last = None
+
+    def install(self):
+        self._last = time.perf_counter()
+        sys.setprofile(self._hook)
+
+    def uninstall(self):
+        sys.setprofile(None)
+
+    def _hook(self, frame, event, arg):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        if elapsed < self.interval:
+            return
+        self._last = now
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        names.reverse()
+        if event in ('c_return', 'c_exception'):
+            names.append(f"{getattr(arg, '__qualname__', arg)} (C)")
+        # A súly a két minta között eltelt idő, interval egységben
+        self.counts[';'.join(names)] += int(elapsed / self.interval)
+
+
+def profile_loop(loop, seconds=10.0, interval=0.005):
+    """Az eseményhurok szálának mintavételezése seconds másodpercig
+
+    A hívó szál (nem a hurok) vár, amíg a mintavételezés tart. Visszatérési
+    érték: {összevont verem: súly}, vagy None, ha már fut egy másik
+    mintavételezés. Mintavételezésen kívül a huroknak nincs többletköltsége.
+    """
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        sampler = _Sampler(interval)
+        loop.call_soon_threadsafe(sampler.install)
+        time.sleep(seconds)
+        done = threading.Event()
+        loop.call_soon_threadsafe(lambda: (sampler.uninstall(), done.set()))
+        # Ha a hurok éppen blokkolt, az eltávolítás a blokk végén történik meg
+        done.wait(max(seconds, 30))
+        return sampler.counts
+    finally:
+        _lock.release()
+
+
+def collapsed(counts):
+    """Összevont (folded) formátum: soronként "keret;keret;... súly"
+
+    A Brendan Gregg-féle flamegraph.pl, a speedscope és az inferno közvetlenül betölti.
+    """
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common() if count)
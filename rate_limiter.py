@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextvars
+import time
+from telethon.errors import FloodWaitError
+import metrics
+
+
+# A korlátozón át futó hívás idejére (csak a hívó taszkban) érvényes kérésenkénti flood_sleep_threshold;
+# a CopierTelegramClient ezt adja tovább a Telethonnak, a kliens közös beállítása változatlan marad
+FLOOD_SLEEP_THRESHOLD = contextvars.ContextVar('flood_sleep_threshold', default=None)
+
+
+class TokenBucket:
+    """Token bucket, amely a FloodWaitError-okból tanulva állítja a sebességét"""
+
+    def __init__(self, rate, capacity, min_rate=0.05):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+        self.waited_seconds = 0.0
+
+    def reserve(self):
+        """Egy token lefoglalása; visszaadja, hány másodpercet kell várni
+
+        A tokenszám negatívba mehet, így az egyidejű hívók lock nélkül,
+        sorban kapnak időpontot.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        wait = max(wait, self.blocked_until - now)
+        self.waited_seconds += wait
+        return wait
+
+    def on_flood_wait(self, seconds):
+        """FloodWaitError után: pontosan a kért ideig tiltás, a sebesség felezése"""
+        self.flood_waits += 1
+        self.flood_wait_seconds += seconds
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        """Sikeres hívás után a sebesség fokozatos visszaállítása"""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def get_status(self):
+        """A bucket aktuális állapota"""
+        return {
+            'rate': round(self.rate, 3),
+            'max_rate': self.max_rate,
+            'tokens': round(max(self.tokens, 0.0), 2),
+            'blocked_for': round(max(0.0, self.blocked_until - time.monotonic()), 1),
+            'flood_waits': self.flood_waits,
+            'flood_wait_seconds': self.flood_wait_seconds,
+            'waited_seconds': round(self.waited_seconds, 1)
+        }
+
+
+class RateLimiter:
+    """Közös sebességkorlátozó: egy globális és célonként egy token bucket
+
+    Minden küldés és letöltés a call() metóduson keresztül megy. FloodWaitError
+    esetén pontosan a kért ideig vár, majd újrapróbálja a hívást. A hívás
+    kérései flood_sleep_threshold=0 értékkel mennek (FLOOD_SLEEP_THRESHOLD),
+    így a kliens nem alussza ki a FloodWait-et, és a korlátozó tanul belőle.
+    """
+
+    def __init__(self, global_rate=20.0, global_burst=20, destination_rate=1.0, destination_burst=5,
+                 max_retries=5):
+        self.destination_rate = destination_rate
+        self.destination_burst = destination_burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.buckets = {}
+
+    def _bucket(self, key):
+        """Célhoz tartozó bucket lekérése (vagy létrehozása)"""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.destination_rate, self.destination_burst)
+        return bucket
+
+    async def acquire(self, key=None):
+        """Várakozás, amíg a globális és (ha van) a célhoz tartozó keret engedi a hívást"""
+        wait = self.global_bucket.reserve()
+        if key is not None:
+            wait = max(wait, self._bucket(key).reserve())
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def call(self, key, func, *args, wait_flood=True, **kwargs):
+        """Hívás végrehajtása a korlátozón keresztül, FloodWaitError esetén újrapróbálással
+
+        A key a cél csatorna azonosítója; None esetén csak a globális keret számít
+        (pl. letöltéseknél). wait_flood=False esetén a FloodWaitError a tiltás
+        rögzítése után azonnal továbbmegy a hívóhoz (várakozás nélkül).
+        """
+        bucket = self._bucket(key) if key is not None else self.global_bucket
+        attempt = 0
+        while True:
+            await self.acquire(key)
+            try:
+                token = FLOOD_SLEEP_THRESHOLD.set(0)
+                try:
+                    result = await func(*args, **kwargs)
+                finally:
+                    FLOOD_SLEEP_THRESHOLD.reset(token)
+                bucket.on_success()
+                return result
+            except FloodWaitError as e:
+                attempt += 1
+                bucket.on_flood_wait(e.seconds)
+                label = str(key) if key is not None else 'global'
+                metrics.FLOOD_WAITS.inc(label)
+                metrics.FLOOD_WAIT_SECONDS.inc(label, amount=e.seconds)
+                if not wait_flood or attempt > self.max_retries:
+                    raise
+                print(f"FloodWait: {e.seconds} mp várakozás, majd újrapróbálás ({attempt}/{self.max_retries})")
+
+    def blocked_for(self, key=None):
+        """Hány másodpercig tart még a FloodWait tiltás (globálisan, illetve az adott célnál)"""
+        blocked_until = self.global_bucket.blocked_until
+        if key is not None and key in self.buckets:
+            blocked_until = max(blocked_until, self.buckets[key].blocked_until)
+        return max(0.0, blocked_until - time.monotonic())
+    
+    def get_status(self):
+        """Aktuális sebességek és várakozási idők lekérése"""
+        return {
+            'global': self.global_bucket.get_status(),
+            'destinations': {str(key): bucket.get_status() for key, bucket in self.buckets.items()}
+        }
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+
+# Markdown link ([felirat](url)) és csupasz URL a strip_links szabályhoz
+MARKDOWN_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+BARE_LINK = re.compile(r'(?:https?://|www\.|t\.me/)\S+', re.IGNORECASE)
+# Számozott vagy nevesített visszahivatkozás; a téves találat csak annyit jelent, hogy a szabály külön fut
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class RuleEngine:
+    """Szűrő és átalakító szabályok, a másolás előtt, I/O nélkül kiértékelve
+
+    A szabályok a data/config.json 'rules' listájából jönnek, pl.:
+    [{"name": "reklám", "type": "drop", "keywords": ["reklám", "#ad"]},
+     {"type": "drop", "pattern": "kedvezmény\\\\s+\\\\d+%"},
+     {"type": "media", "allow": ["photo", "video", "text"]},
+     {"type": "strip_links"},
+     {"type": "replace", "pattern": "@forras", "replacement": "@cel"},
+     {"type": "footer", "text": "Forrás: @csatorna"}]
+
+    Az összes drop szabály egyetlen lefordított mintába olvad össze (nevesített
+    csoportokkal), így egy üzenet eldobása egyetlen regex keresés. A
+    visszahivatkozást vagy nevesített csoportot tartalmazó minták (ezek az
+    összevont mintában elcsúsznának vagy ütköznének) külön, saját mintával
+    futnak. A szabályonkénti találatok száma a get_status()-ban látható.
+    """
+
+    def __init__(self, rules=None, previous=None):
+        self.rules = []
+        self.hits = {}
+        self._drop_pattern = None
+        self._drop_groups = {}
+        self._drop_rules = []  # (név, minta): az összevont mintán kívül kiértékelt szabályok
+        self._allowed_media = None
+        self._media_rule = None
+        self._transforms = []
+        self._compile(rules or [])
+        # Újratöltéskor az azonos nevű szabályok számlálói megmaradnak
+        if previous:
+            for name in self.hits:
+                self.hits[name] = previous.hits.get(name, 0)
+
+    def _compile(self, rules):
+        drop_parts = []
+        for index, rule in enumerate(rules):
+            rule_type = rule.get('type')
+            name = rule.get('name') or f"{index}:{rule_type}"
+            try:
+                if rule_type == 'drop':
+                    alternatives = [re.escape(k) for k in rule.get('keywords') or []]
+                    if rule.get('pattern'):
+                        alternatives.append(rule['pattern'])
+                    if not alternatives:
+                        continue
+                    # A mintának önmagában is érvényesnek kell lennie (a hibás szabály nem rontja el a többit)
+                    body = '|'.join(f'(?:{a})' for a in alternatives)
+                    if not rule.get('case_sensitive'):
+                        body = f'(?i:{body})'
+                    pattern = re.compile(body)
+                    if pattern.groupindex or BACKREFERENCE.search(body):
+                        self._drop_rules.append((name, pattern))
+                    else:
+                        # Az összevont mintában használt, csoportba zárt alakban is ellenőrizzük
+                        part = f'(?P<r{index}>{body})'
+                        re.compile(part)
+                        drop_parts.append((f'r{index}', part, name, pattern))
+                elif rule_type == 'media':
+                    self._allowed_media = set(rule.get('allow') or [])
+                    self._media_rule = name
+                elif rule_type == 'strip_links':
+                    self._transforms.append((name, self._strip_links, False))
+                elif rule_type == 'replace':
+                    pattern = re.compile(rule['pattern'], 0 if rule.get('case_sensitive') else re.IGNORECASE)
+                    replacement = rule.get('replacement', '')
+                    self._transforms.append((name, lambda text, p=pattern, r=replacement: p.sub(r, text), False))
+                elif rule_type == 'footer':
+                    footer = rule.get('text', '')
+                    self._transforms.append((name, lambda text, f=footer: f"{text}\n\n{f}" if text else f, True))
+                else:
+                    print(f"Ismeretlen szabály típus: {rule_type}")
+                    continue
+            except (re.error, KeyError) as e:
+                print(f"Hibás szabály kihagyva ({name}): {e}")
+                continue
+            self.rules.append({'name': name, 'type': rule_type})
+            self.hits[name] = 0
+
+        if drop_parts:
+            try:
+                self._drop_pattern = re.compile('|'.join(part for _, part, _, _ in drop_parts))
+                self._drop_groups = {group: name for group, _, name, _ in drop_parts}
+            except re.error as e:
+                # Az önmagukban érvényes szabályok így is működnek, csak szabályonként egy kereséssel
+                print(f"A drop szabályok nem vonhatók össze, külön kiértékelés: {e}")
+                self._drop_rules = [(name, pattern) for _, _, name, pattern in drop_parts] + self._drop_rules
+
+    @staticmethod
+    def _strip_links(text):
+        return BARE_LINK.sub('', MARKDOWN_LINK.sub(r'\1', text)).strip()
+
+    def match_drop(self, text):
+        """Az eldobást kiváltó szabály neve, vagy None"""
+        if not text:
+            return None
+        name = None
+        if self._drop_pattern:
+            match = self._drop_pattern.search(text)
+            if match:
+                name = self._drop_groups[match.lastgroup]
+        if name is None:
+            name = next((rule_name for rule_name, pattern in self._drop_rules if pattern.search(text)), None)
+        if name is None:
+            return None
+        self.hits[name] += 1
+        return name
+
+    def media_allowed(self, media_type):
+        """Engedélyezett-e a médiatípus ('text' a média nélküli üzenet)"""
+        if self._allowed_media is None or media_type in self._allowed_media:
+            return True
+        self.hits[self._media_rule] += 1
+        return False
+
+    def transform(self, text, footer=True):
+        """Átalakító szabályok alkalmazása a szövegre, sorrendben (footer=False: lábléc nélkül)"""
+        for name, function, is_footer in self._transforms:
+            if is_footer and not footer:
+                continue
+            new_text = function(text or '')
+            if new_text != (text or ''):
+                self.hits[name] += 1
+            text = new_text
+        return text
+
+    def apply(self, messages, media_types):
+        """Szabályok alkalmazása egy üzenetre vagy albumra
+
+        Visszatérési érték: (megtartott üzenetek, {üzenet id: új szöveg}) vagy
+        None, ha az egész csoport eldobandó.
+        """
+        if (self._drop_pattern or self._drop_rules) and self.match_drop('\n'.join(m.text or '' for m in messages)):
+            return None
+
+        kept = [m for m, media_type in zip(messages, media_types) if self.media_allowed(media_type)]
+        if not kept:
+            return None
+
+        texts = {}
+        if self._transforms:
+            # Albumnál a lábléc csak az első képaláírásba (vagy az első elembe) kerül
+            captioned = next((m for m in kept if m.text), kept[0])
+            for message in kept:
+                if message.text or message is captioned:
+                    texts[message.id] = self.transform(message.text or '', footer=message is captioned)
+        return kept, texts
+
+    def get_status(self):
+        """Szabályok és találataik száma"""
+        return [dict(rule, hits=self.hits.get(rule['name'], 0)) for rule in self.rules]
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from telethon.errors import (
+    ChannelPrivateError, ChatAdminRequiredError, ChatWriteForbiddenError, FilePartMissingError,
+    FileReferenceExpiredError, FileReferenceInvalidError, FloodWaitError, MediaEmptyError, MessageTooLongError,
+    RPCError, ServerError, SlowModeWaitError, UserBannedInChannelError
+)
+
+SPOOL_FILE = os.path.join('data', 'spool.log')
+
+
+class MediaDownloadError(Exception):
+    """A média letöltése nem adott vissza fájlt"""
+
+
+# Újrapróbálási szabályok hibaosztályonként: max_attempts kísérlet után a tétel a dead-letter területre kerül;
+# a várakozás base_delay * 2^(kísérlet-1), legfeljebb max_delay másodperc (FloodWait esetén legalább a kért idő)
+DEFAULT_POLICIES = {
+    'network': {'max_attempts': 10, 'base_delay': 5, 'max_delay': 600},
+    'flood': {'max_attempts': 20, 'base_delay': 5, 'max_delay': 3600},
+    'file_reference': {'max_attempts': 3, 'base_delay': 2, 'max_delay': 60},
+    'download': {'max_attempts': 5, 'base_delay': 10, 'max_delay': 600},
+    'permanent': {'max_attempts': 1, 'base_delay': 0, 'max_delay': 0},
+    'default': {'max_attempts': 5, 'base_delay': 10, 'max_delay': 900}
+}
+
+ERROR_CLASSES = [
+    ((FloodWaitError, SlowModeWaitError), 'flood'),
+    ((FileReferenceExpiredError, FileReferenceInvalidError, FilePartMissingError, MediaEmptyError),
+     'file_reference'),
+    ((ChatWriteForbiddenError, ChatAdminRequiredError, ChannelPrivateError, UserBannedInChannelError,
+      MessageTooLongError), 'permanent'),
+    ((MediaDownloadError,), 'download'),
+    ((ConnectionError, OSError, asyncio.TimeoutError, ServerError), 'network')
+]
+
+
+def classify_error(error):
+    """Hibaosztály az újrapróbálási szabályhoz"""
+    for types, name in ERROR_CLASSES:
+        if isinstance(error, types):
+            return name
+    if isinstance(error, RPCError) and getattr(error, 'code', None) and error.code >= 500:
+        return 'network'
+    return 'default'
+
+
+class OutboundSpool:
+    """Kézbesítésre váró üzenetek tartós sora újrapróbálással és dead-letter területtel
+
+    Minden beküldött üzenet (vagy album) bekerül, és csak a célok
+    visszaigazolt kézbesítése után kerül ki. A sikertelen tételek a
+    hibaosztályuk szabálya szerint, exponenciálisan növekvő várakozással
+    újra sorra kerülnek; a szabály kimerülése után a dead-letter területre
+    jutnak, ahonnan a webes felületről újraküldhetők vagy elvethetők.
+
+    Csak az újra lekéréshez szükséges azonosítók tárolódnak (forrás, üzenet
+    id-k, hátralévő célok), nem maga az üzenet. A napló csak hozzáfűzéssel
+    íródik, kötegelve (flush_interval másodpercenként vagy batch_size
+    rekordonként egy írás és fsync), így az élő útvonalat nem lassítja.
+    Betöltéskor a rekordok visszajátszása adja az állapotot; ha a napló
+    nagyrészt lezárt tételekből áll, tömörítve újraíródik.
+    """
+
+    def __init__(self, path=SPOOL_FILE, policies=None, batch_size=100, flush_interval=0.5, compact_after=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+        for name, policy in (policies or {}).items():
+            self.policies.setdefault(name, dict(DEFAULT_POLICIES['default'])).update(policy)
+        self._entries = {}  # spool id -> tétel
+        self._buffer = []
+        self._records = 0
+        self._next_id = 1
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {'added': 0, 'completed': 0, 'retried': 0, 'dead_lettered': 0, 'replayed': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """A napló visszajátszása; a félbemaradt (repülés közbeni) tételek azonnal esedékesek"""
+        if not os.path.exists(self.path):
+            return
+        now = time.time()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Összeomláskor félbemaradt utolsó sor
+                    continue
+                self._records += 1
+                self._apply(record)
+        for entry in self._entries.values():
+            if entry['state'] == 'pending' and entry['next_attempt'] is None:
+                entry['next_attempt'] = now
+        if self._entries:
+            self._next_id = max(self._entries) + 1
+        if self._entries:
+            print(f"Kézbesítésre váró tételek betöltve: {len(self._entries)}")
+        if self._records > self.compact_after and self._records > 4 * len(self._entries):
+            self._compact()
+
+    def _apply(self, record):
+        """Egy naplórekord alkalmazása a memóriabeli állapotra"""
+        spool_id = record['id']
+        self._next_id = max(self._next_id, spool_id + 1)
+        op = record['op']
+        if op == 'add':
+            self._entries[spool_id] = {
+                'id': spool_id,
+                'source': record['source'],
+                'message_ids': record['message_ids'],
+                'destinations': record['destinations'],
+                'state': 'pending',
+                'attempts': record.get('attempts', 0),
+                'next_attempt': record.get('next_attempt'),
+                'error': record.get('error'),
+                'error_class': record.get('error_class'),
+                'created_at': record['time'],
+                'updated_at': record['time']
+            }
+            return
+        entry = self._entries.get(spool_id)
+        if entry is None:
+            return
+        if op in ('done', 'discard'):
+            del self._entries[spool_id]
+        elif op in ('retry', 'dead', 'replay'):
+            entry.update({key: record[key] for key in ('destinations', 'attempts', 'next_attempt', 'error',
+                                                       'error_class') if key in record})
+            entry['state'] = 'dead' if op == 'dead' else 'pending'
+            entry['updated_at'] = record['time']
+
+    def _append(self, record):
+        """Rekord alkalmazása és a kötegbe helyezése (a lock alatt hívandó)"""
+        record['time'] = time.time()
+        self._apply(record)
+        self._buffer.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        return len(self._buffer) >= self.batch_size
+
+    def add(self, source, message_ids, destinations):
+        """Új tétel felvétele a kézbesítés előtt; visszatérési érték a spool id"""
+        with self._lock:
+            spool_id = self._next_id
+            self._next_id += 1
+            should_flush = self._append({
+                'op': 'add', 'id': spool_id, 'source': source, 'message_ids': list(message_ids),
+                'destinations': list(destinations)
+            })
+            self.stats['added'] += 1
+        if should_flush:
+            self.flush()
+        return spool_id
+
+    def complete(self, spool_id):
+        """A tétel minden célba kézbesítve (vagy már nincs mit küldeni)"""
+        with self._lock:
+            if spool_id not in self._entries:
+                return
+            should_flush = self._append({'op': 'done', 'id': spool_id})
+            self.stats['completed'] += 1
+        if should_flush:
+            self.flush()
+
+    def fail(self, spool_id, errors):
+        """Sikertelen kézbesítés rögzítése
+
+        Az errors {cél peer id: kivétel} szótár a még hiányzó célokkal.
+        Visszatérési érték: 'retry' vagy 'dead'.
+        """
+        with self._lock:
+            entry = self._entries.get(spool_id)
+            if entry is None:
+                return None
+            # A legszigorúbb (legkevesebb kísérletet engedő) hibaosztály dönt
+            error_classes = {destination: classify_error(error) for destination, error in errors.items()}
+            destination, error_class = min(
+                error_classes.items(), key=lambda item: self.policies[item[1]]['max_attempts']
+            )
+            error = errors[destination]
+            policy = self.policies[error_class]
+            attempts = entry['attempts'] + 1
+            record = {
+                'id': spool_id,
+                'destinations': list(errors),
+                'attempts': attempts,
+                'error': f"{type(error).__name__}: {error}",
+                'error_class': error_class
+            }
+            if attempts >= policy['max_attempts']:
+                record.update(op='dead', next_attempt=None)
+                self.stats['dead_lettered'] += 1
+            else:
+                delay = min(policy['max_delay'], policy['base_delay'] * 2 ** (attempts - 1))
+                delay *= random.uniform(0.8, 1.2)
+                flood_seconds = max([getattr(e, 'seconds', 0) or 0 for e in errors.values()])
+                record.update(op='retry', next_attempt=time.time() + max(delay, flood_seconds))
+                self.stats['retried'] += 1
+            should_flush = self._append(record)
+        if should_flush:
+            self.flush()
+        return record['op']
+
+    def take_due(self, limit=50):
+        """Esedékes tételek kivétele újraküldésre (a kézbesítés idejére nem esedékesek)"""
+        now = time.time()
+        with self._lock:
+            due = [
+                entry for entry in self._entries.values()
+                if entry['state'] == 'pending' and entry['next_attempt'] is not None and entry['next_attempt'] <= now
+            ]
+            due.sort(key=lambda entry: entry['next_attempt'])
+            due = due[:limit]
+            for entry in due:
+                entry['next_attempt'] = None
+            return [dict(entry) for entry in due]
+
+    def release(self, spool_id, delay=0):
+        """Kivett, de be nem küldött tétel visszaadása (pl. a forrás nem elérhető)"""
+        with self._lock:
+            entry = self._entries.get(spool_id)
+            if entry and entry['state'] == 'pending':
+                entry['next_attempt'] = time.time() + delay
+
+    def replay(self, spool_id=None):
+        """Dead-letter tétel(ek) visszahelyezése a sorba új kísérletszámmal; visszaadja a darabszámot"""
+        with self._lock:
+            entries = [
+                entry for entry in self._entries.values()
+                if entry['state'] == 'dead' and (spool_id is None or entry['id'] == spool_id)
+            ]
+            for entry in entries:
+                self._append({'op': 'replay', 'id': entry['id'], 'attempts': 0, 'next_attempt': time.time()})
+            self.stats['replayed'] += len(entries)
+        if entries:
+            self.flush()
+        return len(entries)
+
+    def discard(self, spool_id):
+        """Dead-letter tétel végleges elvetése"""
+        with self._lock:
+            entry = self._entries.get(spool_id)
+            if not entry or entry['state'] != 'dead':
+                return False
+            self._append({'op': 'discard', 'id': spool_id})
+        self.flush()
+        return True
+
+    def dead_letters(self, limit=100):
+        """A dead-letter terület tételei, a legutóbb sikertelenek elöl"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values() if entry['state'] == 'dead']
+        entries.sort(key=lambda entry: entry['updated_at'], reverse=True)
+        return entries[:limit]
+
+    def maybe_flush(self):
+        """Kiírás, ha a legutóbbi óta eltelt a flush_interval"""
+        if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """A köteg hozzáfűzése a naplóhoz egyetlen írással és fsync-kel"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            lines, self._buffer = self._buffer, []
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._records += len(lines)
+            except Exception as e:
+                # A rekordok a következő kiírással próbálkoznak újra
+                self._buffer = lines + self._buffer
+                print(f"Hiba a spool mentése során: {e}")
+                return
+            compact = self._records > self.compact_after and self._records > 4 * len(self._entries)
+        if compact:
+            with self._lock:
+                self._compact()
+
+    def _compact(self):
+        """A napló újraírása csak az élő tételekkel (atomikus cserével; a lock alatt hívandó)"""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self._entries.values():
+                    record = {
+                        'op': 'add', 'id': entry['id'], 'source': entry['source'],
+                        'message_ids': entry['message_ids'], 'destinations': entry['destinations'],
+                        'attempts': entry['attempts'], 'next_attempt': entry['next_attempt'],
+                        'error': entry['error'], 'error_class': entry['error_class'], 'time': entry['created_at']
+                    }
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    if entry['state'] == 'dead':
+                        f.write(json.dumps({'op': 'dead', 'id': entry['id'], 'time': entry['updated_at']}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._records = len(self._entries) + sum(1 for e in self._entries.values() if e['state'] == 'dead')
+        except Exception as e:
+            print(f"Hiba a spool tömörítése során: {e}")
+
+    def get_status(self):
+        """Várakozó és dead-letter tételek száma, számlálók"""
+        with self._lock:
+            pending = sum(1 for entry in self._entries.values() if entry['state'] == 'pending')
+            dead = len(self._entries) - pending
+        return dict(self.stats, pending=pending, dead=dead)
@@ -2,12 +2,17 @@
 
 // Globális változók
 let statusUpdateInterval;
+let statusStream;
+let lastDeadLetterCount = null;
 
 // Oldal betöltésekor
 document.addEventListener('DOMContentLoaded', function() {
     // Státusz frissítés indítása
     startStatusUpdates();
     
+    // Sikertelen üzenetek betöltése
+    loadDeadLetters();
+    
     // Bootstrap tooltipek inicializálása
     var tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
     var tooltipList = tooltipTriggerList.map(function (tooltipTriggerEl) {
@@ -15,38 +20,88 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-// Státusz frissítések indítása
+// Státusz frissítések indítása: a szerver Server-Sent Events streamen küldi a változásokat,
+// lekérdezgetésre csak akkor váltunk, ha a böngésző nem támogatja
 function startStatusUpdates() {
-    statusUpdateInterval = setInterval(updateStatus, 5000); // 5 másodpercenként
+    if (window.EventSource) {
+        statusStream = new EventSource('/status/stream');
+        statusStream.onmessage = function(event) {
+            applyStatus(JSON.parse(event.data));
+        };
+        statusStream.onerror = function() {
+            console.error('A státusz stream megszakadt, újracsatlakozás...');
+        };
+    } else {
+        statusUpdateInterval = setInterval(updateStatus, 5000); // 5 másodpercenként
+    }
 }
 
 // Státusz frissítések leállítása
 function stopStatusUpdates() {
+    if (statusStream) {
+        statusStream.close();
+    }
     if (statusUpdateInterval) {
         clearInterval(statusUpdateInterval);
     }
 }
 
-// Alkalmazás státusz frissítése
+// Alkalmazás státusz lekérése
 async function updateStatus() {
     try {
         const response = await fetch('/status');
-        const data = await response.json();
-        
-        // Bejelentkezési státusz frissítése
-        updateLoginStatus(data.is_logged_in);
-        
-        // Másolási státusz frissítése
-        updateCopyingStatus(data.is_copying);
-        
+        applyStatus(await response.json());
     } catch (error) {
         console.error('Hiba a státusz frissítése során:', error);
     }
 }
 
+// Státusz megjelenítése; egy lépés hibája nem akadályozza a többit
+function applyStatus(data) {
+    const steps = [
+        // Bejelentkezési státusz frissítése
+        () => updateLoginStatus(data.is_logged_in),
+        // Másolási státusz frissítése
+        () => updateCopyingStatus(data.is_copying),
+        // Élő számlálók frissítése
+        () => updateCopierCounters(data.copier),
+        // Backfill haladásának frissítése
+        () => updateBackfillStatus(data.backfill),
+        // Sikertelen üzenetek listája, ha a számuk változott
+        () => {
+            const spool = data.copier && data.copier.spool;
+            if (spool && spool.dead !== lastDeadLetterCount) {
+                loadDeadLetters();
+            }
+        }
+    ];
+    for (const step of steps) {
+        try {
+            step();
+        } catch (error) {
+            console.error('Hiba a státusz megjelenítése során:', error);
+        }
+    }
+}
+
+// Másolt üzenetek, sorhossz és utolsó hiba megjelenítése
+function updateCopierCounters(copier) {
+    const counters = document.getElementById('copier-counters');
+    if (!counters || !copier) {
+        return;
+    }
+    
+    const pipeline = copier.pipeline || {};
+    let text = `Másolt üzenetek: ${copier.copied} | Sorban: ${pipeline.queue_depth || 0} | Folyamatban: ${pipeline.in_progress || 0}`;
+    if (copier.last_error) {
+        text += ` | Utolsó hiba: ${copier.last_error.message}`;
+    }
+    counters.textContent = text;
+}
+
 // Bejelentkezési státusz frissítése
 function updateLoginStatus(isLoggedIn) {
-    const loginBadge = document.querySelector('.badge:contains("Bejelentkezve"), .badge:contains("Nincs bejelentkezve")');
+    const loginBadge = document.getElementById('login-badge');
     if (loginBadge) {
         if (isLoggedIn) {
             loginBadge.className = 'badge bg-success';
@@ -60,7 +115,7 @@ function updateLoginStatus(isLoggedIn) {
 
 // Másolási státusz frissítése
 function updateCopyingStatus(isCopying) {
-    const copyingBadge = document.querySelector('.badge:contains("Fut"), .badge:contains("Leállítva")');
+    const copyingBadge = document.getElementById('copying-badge');
     if (copyingBadge) {
         if (isCopying) {
             copyingBadge.className = 'badge bg-success';
@@ -223,6 +278,177 @@ async function stopCopier() {
     }
 }
 
+// Előzmények másolásának (backfill) indítása
+async function startBackfill() {
+    try {
+        const response = await fetch('/start_backfill', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                min_id: document.getElementById('backfill_min_id').value,
+                max_id: document.getElementById('backfill_max_id').value,
+                from_date: document.getElementById('backfill_from_date').value
+            })
+        });
+        
+        const data = await response.json();
+        showAlert(data.message, data.success ? 'success' : 'danger');
+        updateBackfillStatus();
+        
+    } catch (error) {
+        showAlert('Hiba történt a backfill indítása során: ' + error.message, 'danger');
+    }
+}
+
+// Backfill leállítása
+async function stopBackfill() {
+    try {
+        const response = await fetch('/stop_backfill', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        });
+        
+        const data = await response.json();
+        showAlert(data.message, data.success ? 'success' : 'danger');
+        
+    } catch (error) {
+        showAlert('Hiba történt a backfill leállítása során: ' + error.message, 'danger');
+    }
+}
+
+// Backfill haladásának frissítése (a státusz streamből vagy a /backfill_status végpontról)
+async function updateBackfillStatus(backfill) {
+    const progressBar = document.getElementById('backfill-progress');
+    const statusText = document.getElementById('backfill-status-text');
+    if (!progressBar || !statusText) {
+        return;
+    }
+    
+    try {
+        if (backfill === undefined) {
+            const response = await fetch('/backfill_status');
+            const data = await response.json();
+            backfill = data.backfill;
+        }
+        
+        if (!backfill) {
+            return;
+        }
+        
+        progressBar.style.width = backfill.percent + '%';
+        progressBar.textContent = backfill.percent + '%';
+        
+        let text = `Állapot: ${backfill.state} | ${backfill.done} / ~${backfill.total} üzenet | ${backfill.messages_per_second} üzenet/mp`;
+        if (backfill.eta_seconds !== null) {
+            text += ` | hátralévő idő: ${Math.round(backfill.eta_seconds / 60)} perc`;
+        }
+        if (backfill.error) {
+            text += ` | hiba: ${backfill.error}`;
+        }
+        statusText.textContent = text;
+        
+    } catch (error) {
+        console.error('Hiba a backfill állapot frissítése során:', error);
+    }
+}
+
+// Sikertelen (dead-letter) üzenetek betöltése
+async function loadDeadLetters() {
+    const list = document.getElementById('dead-letter-list');
+    const statusText = document.getElementById('spool-status-text');
+    if (!list || !statusText) {
+        return;
+    }
+    
+    try {
+        const response = await fetch('/dead_letters');
+        const data = await response.json();
+        lastDeadLetterCount = data.status ? data.status.dead : 0;
+        
+        if (data.status) {
+            statusText.textContent = `Sikertelen: ${data.status.dead} | Újrapróbálásra vár: ${data.status.pending}`;
+        }
+        
+        list.innerHTML = '';
+        data.items.forEach(item => {
+            const entry = document.createElement('li');
+            entry.className = 'list-group-item d-flex justify-content-between align-items-start';
+            
+            const details = document.createElement('div');
+            details.textContent = `${item.source} / ${item.message_ids.join(', ')} | ${item.attempts} kísérlet | ${item.error}`;
+            entry.appendChild(details);
+            
+            const buttons = document.createElement('div');
+            buttons.className = 'text-nowrap ms-2';
+            buttons.innerHTML = `
+                <button type="button" class="btn btn-outline-primary btn-sm" onclick="replayDeadLetter(${item.id})">
+                    <i class="fas fa-redo"></i>
+                </button>
+                <button type="button" class="btn btn-outline-danger btn-sm" onclick="discardDeadLetter(${item.id})">
+                    <i class="fas fa-trash"></i>
+                </button>
+            `;
+            entry.appendChild(buttons);
+            list.appendChild(entry);
+        });
+        
+    } catch (error) {
+        console.error('Hiba a sikertelen üzenetek betöltése során:', error);
+    }
+}
+
+// Sikertelen üzenet újraküldése (azonosító nélkül az összes)
+async function replayDeadLetter(id) {
+    try {
+        const response = await fetch('/dead_letters/replay', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                id: id || null
+            })
+        });
+        
+        const data = await response.json();
+        showAlert(data.message, data.success ? 'success' : 'danger');
+        loadDeadLetters();
+        
+    } catch (error) {
+        showAlert('Hiba történt az újraküldés során: ' + error.message, 'danger');
+    }
+}
+
+// Sikertelen üzenet végleges elvetése
+async function discardDeadLetter(id) {
+    if (!confirm('Biztosan elveti ezt az üzenetet? Később nem küldhető újra.')) {
+        return;
+    }
+    
+    try {
+        const response = await fetch('/dead_letters/discard', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                id: id
+            })
+        });
+        
+        const data = await response.json();
+        showAlert(data.message, data.success ? 'success' : 'danger');
+        loadDeadLetters();
+        
+    } catch (error) {
+        showAlert('Hiba történt az elvetés során: ' + error.message, 'danger');
+    }
+}
+
 // Alert üzenet megjelenítése
 function showAlert(message, type) {
     // Meglévő alertek eltávolítása
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import copy
+import threading
+
+
+class StatusHub:
+    """Az alkalmazás állapotának memóriában tartott, verziózott pillanatképe
+
+    A másoló és a bejelentkezés állapota ide kerül (publish), a /status ezt
+    olvassa konstans időben, a Server-Sent Events stream pedig minden
+    változásnál megkapja az új pillanatképet (wait), lekérdezgetés nélkül.
+    """
+
+    def __init__(self, collect=None, interval=1.0):
+        # Az élő számlálókat összegyűjtő függvény, amit a publisher periodikusan hív
+        self.collect = collect
+        self.interval = interval
+        self.version = 0
+        self._state = {}
+        self._condition = threading.Condition()
+
+    def snapshot(self):
+        """Az aktuális állapot másolata"""
+        with self._condition:
+            return copy.deepcopy(self._state)
+
+    def publish(self, state=None, **fields):
+        """Állapot frissítése; változás esetén a várakozó streamek felébresztése
+
+        Bármely szálból hívható. state esetén a teljes állapot cserélődik,
+        a kulcsszavas argumentumok csak az adott mezőket írják felül.
+        """
+        with self._condition:
+            new_state = dict(state) if state is not None else dict(self._state)
+            new_state.update(fields)
+            if new_state == self._state:
+                return False
+            self._state = new_state
+            self.version += 1
+            self._condition.notify_all()
+            return True
+
+    def refresh(self):
+        """Állapot újragyűjtése a collect függvénnyel és közzététele"""
+        if self.collect:
+            return self.publish(self.collect())
+        return False
+
+    def wait(self, version, timeout=15.0):
+        """Várakozás a megadott verziónál újabb állapotra
+
+        Visszatérési érték: (verzió, pillanatkép), időtúllépéskor (verzió, None).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout)
+            if self.version == version:
+                return version, None
+            return self.version, copy.deepcopy(self._state)
+
+    async def run_publisher(self):
+        """Periodikus újragyűjtés az eseményhurkon (az élő számlálókhoz)"""
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Hiba az állapot gyűjtése során: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import random
+import time
+
+import metrics
+
+
+class ConnectionSupervisor:
+    """A Telegram kapcsolat felügyelete és újraépítése
+
+    Másodpercenként ellenőrzi a kapcsolatot, probe_interval másodpercenként
+    pedig a probe függvénnyel (pl. a források legutóbbi üzenetének lekérése)
+    azt is, hogy a kapcsolat valóban válaszol-e. Hiba esetén exponenciálisan
+    növekvő, véletlenszerűen szórt várakozással (jitter) újracsatlakozik, majd
+    meghívja az on_reconnect függvényt a kimaradt frissítések pótlására.
+    A próba eredményét (pl. az észlelt hézagokat) az on_probe kapja meg, már
+    az időkorláton kívül, így a hosszabb pótlás nem számít kapcsolathibának.
+    """
+
+    # Ezek a hibák a kapcsolat hibáját jelzik; a többi (pl. FloodWait) nem vált ki újracsatlakozást
+    CONNECTION_ERRORS = (ConnectionError, OSError)
+
+    def __init__(self, client, on_reconnect=None, probe=None, probe_interval=60.0, probe_timeout=30.0,
+                 base_delay=1.0, max_delay=300.0, check_interval=1.0, on_probe=None):
+        self.client = client
+        self.on_reconnect = on_reconnect
+        self.probe = probe
+        self.on_probe = on_probe
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.check_interval = check_interval
+        self.state = 'connected'
+        self.attempt = 0
+        self.last_error = None
+        self._last_probe = time.monotonic()
+        self.stats = {'disconnects': 0, 'reconnects': 0, 'failed_attempts': 0}
+
+    def backoff_delay(self, attempt):
+        """Várakozás az attempt-edik újrapróbálás előtt: exponenciális, felülről korlátos, szórt"""
+        delay = min(self.max_delay, self.base_delay * (2 ** min(attempt, 30)))
+        return random.uniform(delay / 2, delay)
+
+    async def _healthy(self):
+        """Igaz, ha a kapcsolat él (és az esedékes próba lekérés sikerült)"""
+        if not self.client.is_connected():
+            return False
+        if not self.probe or time.monotonic() - self._last_probe < self.probe_interval:
+            return True
+        self._last_probe = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self.probe(), self.probe_timeout)
+        except asyncio.TimeoutError:
+            # A lassú válasz nem megszakadt kapcsolat (Python 3.11 óta a TimeoutError OSError is)
+            self.last_error = f"A próba lekérés nem válaszolt {self.probe_timeout} mp alatt"
+            print(self.last_error)
+            return True
+        except self.CONNECTION_ERRORS as e:
+            self.last_error = f"Sikertelen próba lekérés: {e!r}"
+            return False
+        except Exception as e:
+            print(f"Hiba a kapcsolat ellenőrzése során: {e}")
+            return True
+        if self.on_probe and result:
+            try:
+                await self.on_probe(result)
+            except Exception as e:
+                print(f"Hiba a kimaradt üzenetek pótlása során: {e}")
+        return True
+
+    async def run(self, is_running):
+        """Felügyelet, amíg is_running() igaz"""
+        while is_running():
+            await asyncio.sleep(self.check_interval)
+            if not is_running() or await self._healthy():
+                continue
+            self.stats['disconnects'] += 1
+            print("A Telegram kapcsolat megszakadt, újracsatlakozás...")
+            if await self._reconnect(is_running) and self.on_reconnect:
+                try:
+                    await self.on_reconnect()
+                except Exception as e:
+                    print(f"Hiba a kimaradt üzenetek pótlása során: {e}")
+
+    async def _reconnect(self, is_running):
+        """Újracsatlakozás szórt exponenciális várakozással; False, ha közben leállítás történt"""
+        self.state = 'reconnecting'
+        self.attempt = 0
+        while is_running():
+            await asyncio.sleep(self.backoff_delay(self.attempt))
+            if not is_running():
+                break
+            try:
+                if self.client.is_connected():
+                    # A válaszképtelen kapcsolatot eldobjuk, mielőtt újat nyitunk
+                    await self.client.disconnect()
+                await self.client.connect()
+                if not self.client.is_connected():
+                    raise ConnectionError("a kapcsolat nem jött létre")
+            except Exception as e:
+                self.attempt += 1
+                self.stats['failed_attempts'] += 1
+                self.last_error = f"Sikertelen újracsatlakozás ({self.attempt}.): {e}"
+                print(self.last_error)
+                continue
+            self.stats['reconnects'] += 1
+            metrics.RECONNECTS.inc()
+            self.state = 'connected'
+            self._last_probe = time.monotonic()
+            print("Újracsatlakozva a Telegramhoz.")
+            return True
+        return False
+
+    def get_status(self):
+        """Kapcsolat állapota és újracsatlakozási statisztikák"""
+        return dict(self.stats, state=self.state, attempt=self.attempt, last_error=self.last_error)
@@ -1,26 +1,61 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import asyncio
 import os
-from telethon import TelegramClient, events
+from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError, PhoneNumberInvalidError
-from telethon.tl.types import Channel, Chat, User
+from entity_cache import EntityCache
+from rate_limiter import FLOOD_SLEEP_THRESHOLD
+
+
+class CopierTelegramClient(TelegramClient):
+    """TelegramClient, amely a korlátozón át futó kéréseknél nem alussza ki a FloodWait-et
+
+    A RateLimiter.call a hívás idejére a FLOOD_SLEEP_THRESHOLD értékét 0-ra
+    állítja; ez kérésenkénti flood_sleep_threshold-ként jut el a Telethonhoz.
+    A korlátozón kívüli hívások (iter_messages, iter_download, get_dialogs)
+    a kliens saját flood_sleep_threshold beállításával futnak.
+    """
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        if flood_sleep_threshold is None:
+            flood_sleep_threshold = FLOOD_SLEEP_THRESHOLD.get()
+        return await super()._call(sender, request, ordered=ordered, flood_sleep_threshold=flood_sleep_threshold)
+
 
 class TelegramClientManager:
     """Telegram kliens kezelő osztály"""
     
-    def __init__(self, api_id, api_hash, session_file):
+    def __init__(self, api_id, api_hash, session_file, entity_ttl=86400, dialog_ttl=300, sender_sessions=None):
         self.api_id = api_id
         self.api_hash = api_hash
         self.session_file = session_file
         self.client = None
         self.phone_code_hash = None
+        self.entity_ttl = entity_ttl
+        self.dialog_ttl = dialog_ttl
+        # Entitás- és dialógus gyorsítótár, a kliens létrehozásakor jön létre
+        self.entity_cache = None
+        # Utoljára ismert bejelentkezési állapot; olvasása nem jár hálózati kéréssel
+        self.authorized = False
+        # Visszahívás a bejelentkezési állapot változásakor (pl. StatusHub frissítése)
+        self.on_state_change = None
+        # További küldő fiókok session nevei (data/<név>.session) és a bejelentkezett kliensek (név, kliens)
+        self.sender_sessions = list(sender_sessions or [])
+        self.senders = []
+    
+    def _set_authorized(self, authorized):
+        """Bejelentkezési állapot rögzítése, változás esetén értesítéssel"""
+        changed = authorized != self.authorized
+        self.authorized = authorized
+        if changed and self.on_state_change:
+            self.on_state_change()
         
     async def start_client(self):
         """Kliens indítása és csatlakozás"""
         if self.client is None:
-            self.client = TelegramClient(self.session_file, self.api_id, self.api_hash)
+            self.client = CopierTelegramClient(self.session_file, self.api_id, self.api_hash)
+            self.entity_cache = EntityCache(self.client, entity_ttl=self.entity_ttl, dialog_ttl=self.dialog_ttl)
         
         if not self.client.is_connected():
             try:
@@ -31,19 +66,45 @@ class TelegramClientManager:
                 return False
         
         if not await self.client.is_user_authorized():
+            self._set_authorized(False)
             print("Telethon kliens nincs bejelentkezve.")
         else:
+            self._set_authorized(True)
             print("Telethon kliens bejelentkezve.")
+            await self.start_senders()
         return True
+    
+    async def start_senders(self):
+        """A küldő fiókok klienseinek indítása; a be nem jelentkezett session-ök kimaradnak"""
+        started = {name for name, _ in self.senders}
+        session_dir = os.path.dirname(self.session_file)
+        for name in self.sender_sessions:
+            if name in started:
+                continue
+            client = CopierTelegramClient(os.path.join(session_dir, name), self.api_id, self.api_hash)
+            try:
+                await client.connect()
+                if not await client.is_user_authorized():
+                    print(f"A(z) {name} küldő fiók nincs bejelentkezve, kihagyva.")
+                    await client.disconnect()
+                    continue
+            except Exception as e:
+                print(f"Hiba a(z) {name} küldő fiók csatlakoztatása során: {e}")
+                continue
+            self.senders.append((name, client))
+            print(f"Küldő fiók csatlakoztatva: {name}")
+        return self.senders
 
     async def start_login(self, phone_number):
         """Bejelentkezési folyamat indítása"""
         try:
-            if self.client is None:
-                await self.start_client() # Biztosítsuk, hogy a kliens inicializálva és csatlakoztatva van
+            # Biztosítsuk, hogy a kliens inicializálva és csatlakoztatva van (pl. sikertelen indulás után)
+            if (self.client is None or not self.client.is_connected()) and not await self.start_client():
+                return {"success": False, "message": "Nem sikerült csatlakozni a Telegramhoz!"}
 
             # Ellenőrizzük, hogy már be van-e jelentkezve
             if await self.client.is_user_authorized():
+                self._set_authorized(True)
                 return {"success": True, "message": "Már be van jelentkezve!"}
             
             # Kód küldése
@@ -65,6 +126,8 @@ class TelegramClientManager:
             
             # Kód ellenőrzése
             await self.client.sign_in(code=code, phone_code_hash=self.phone_code_hash)
+            self._set_authorized(True)
+            await self.start_senders()
             
             return {"success": True, "message": "Sikeres bejelentkezés!"}
             
@@ -76,48 +139,44 @@ class TelegramClientManager:
             return {"success": False, "message": f"Hiba: {str(e)}"}
     
     async def is_logged_in_async(self):
-        """Ellenőrzi, hogy be van-e jelentkezve (aszinkron)"""
+        """Ellenőrzi a szerveren, hogy be van-e jelentkezve; szükség esetén (újra)csatlakozik
+
+        A gyorsítótárazott authorized értéket is frissíti, így egy sikertelen
+        indulás után is helyreáll az állapot.
+        """
         try:
-            if not self.client:
-                return False
-            if not self.client.is_connected():
-                await self.client.connect()
-            return await self.client.is_user_authorized()
+            if self.client is None or not self.client.is_connected():
+                return await self.start_client() and self.authorized
+            self._set_authorized(await self.client.is_user_authorized())
+            return self.authorized
         except Exception:
+            self._set_authorized(False)
             return False
     
-    async def get_channels(self):
-        """Elérhető csatornák listájának lekérése"""
+    async def get_channels(self, refresh=False):
+        """Elérhető csatornák listájának lekérése
+
+        A lista a gyorsítótárból jön; a dialógusok csak az első híváskor vagy
+        refresh=True esetén töltődnek le.
+        """
         try:
             if not self.client:
                 return []
             
+            if self.entity_cache.has_dialogs() and not refresh:
+                return self.entity_cache.get_channels()
+            
             if not self.client.is_connected():
                 await self.client.connect()
             
             if not await self.client.is_user_authorized():
                 return []
             
-            dialogs = await self.client.get_dialogs()
-            
-            channels = []
-            for dialog in dialogs:
-                entity = dialog.entity
-                
-                if isinstance(entity, (Channel, Chat)):
-                    channel_info = {
-                        "id": entity.id,
-                        "title": entity.title,
-                        "username": getattr(entity, "username", None),
-                        "type": "channel" if isinstance(entity, Channel) else "chat"
-                    }
-                    channels.append(channel_info)
-            
-            return channels
+            return await self.entity_cache.refresh_dialogs()
             
         except Exception as e:
             print(f"Hiba a csatornák lekérése során: {e}")
-            return []
+            return self.entity_cache.get_channels() if self.entity_cache else []
     
     async def get_entity_by_id(self, channel_id):
         """Entitás lekérése ID alapján"""
@@ -128,16 +187,7 @@ class TelegramClientManager:
             if not self.client.is_connected():
                 await self.client.connect()
             
-            if isinstance(channel_id, str):
-                if channel_id.startswith("@"):
-                    return await self.client.get_entity(channel_id)
-                else:
-                    try:
-                        return await self.client.get_entity(int(channel_id))
-                    except ValueError:
-                        return await self.client.get_entity(channel_id)
-            else:
-                return await self.client.get_entity(int(channel_id))
+            return await self.entity_cache.get_entity(channel_id)
                 
         except Exception as e:
             print(f"Hiba az entitás lekérése során: {e}")
@@ -180,6 +230,9 @@ class TelegramClientManager:
             if self.client and self.client.is_connected():
                 await self.client.disconnect()
                 print("Telethon kliens leválasztva.")
+            for _, client in self.senders:
+                await client.disconnect()
+            self.senders = []
         except Exception as e:
             print(f"Hiba a kliens leválasztása során: {e}")
     
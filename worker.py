@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Üzenetmásoló futtatása webes felület nélkül
+
+A data/config.json beállításaival és a meglévő session-nel (data/session.session)
+azonnal elindítja a másolást. A bejelentkezés és a beállítás a webes
+felületen történik; ez a folyamat csak a másoláshoz szükséges modulokat
+tölti be (Flask nélkül), így gyorsabban indul és kevesebb memóriát használ.
+
+SIGTERM vagy SIGINT hatására nem fogad új üzenetet, kézbesíti a sorban
+lévőket, majd kilép. Ha ez --drain-timeout másodpercen belül nem fejeződik
+be, vagy újabb jelzés érkezik, a sorban maradtak kézbesítése nélkül áll le
+(ezek a következő indításkor pótlódnak).
+
+SIGUSR1 hatására az eseményhurok --profile-seconds másodpercnyi
+mintavételezése a data/profile-<időpont>.folded fájlba kerül (flame graph
+nézőbe tölthető); az eseményhurok akadásai a kimeneten jelennek meg.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+
+from config import has_routes, load_config, subscribe, unsubscribe
+from loop_watchdog import LoopWatchdog
+from message_copier import MessageCopier
+import profiler
+from telethon_client import TelegramClientManager
+
+
+def write_profile(loop, seconds):
+    """Az eseményhurok mintavételezése és mentése összevont (folded) formátumban"""
+    counts = profiler.profile_loop(loop, seconds)
+    if counts is None:
+        print("Már fut egy mintavételezés!")
+        return
+    path = os.path.join('data', f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(profiler.collapsed(counts))
+    print(f"Profil mentve: {path}")
+
+
+async def run(drain_timeout, config_poll, profile_seconds=10):
+    """Másolás a leállító jelzésig; visszatérési érték a kilépési kód"""
+    config = load_config()
+    if not config.get('api_id') or not config.get('api_hash'):
+        print("Hiányzó API ID vagy API Hash; állítsa be a webes felületen.")
+        return 2
+    if not has_routes(config):
+        print("Forrás és cél csatorna megadása kötelező!")
+        return 2
+
+    client_manager = TelegramClientManager(
+        api_id=int(config['api_id']),
+        api_hash=config['api_hash'],
+        session_file=os.path.join('data', 'session.session'),
+        entity_ttl=float(config.get('entity_cache_ttl', 86400)),
+        dialog_ttl=float(config.get('dialog_cache_ttl', 300)),
+        sender_sessions=config.get('sender_sessions') or []
+    )
+    if not await client_manager.start_client():
+        return 1
+    if not client_manager.authorized:
+        print("Nincs bejelentkezve a Telegramra; jelentkezzen be a webes felületen.")
+        await client_manager.disconnect()
+        return 1
+
+    copier = MessageCopier.from_config(config, client_manager)
+    subscribe(copier.apply_config)
+    loop = asyncio.get_running_loop()
+    watchdog = asyncio.create_task(
+        LoopWatchdog(threshold=float(config.get('loop_stall_threshold_ms', 100)) / 1000).run()
+    )
+    copying = asyncio.create_task(copier.start_copying())
+
+    def on_signal(signum):
+        if copier.is_running:
+            print(f"{signal.Signals(signum).name} jelzés, leállítás a sorban lévő üzenetek kézbesítése után...")
+            copier.stop_copying()
+            loop.call_later(drain_timeout, copier.stop_copying, False)
+        else:
+            copier.stop_copying(drain=False)
+
+    def on_profile_signal():
+        # A mintavételező külön szálon fut, a hurok közben zavartalanul dolgozik
+        threading.Thread(
+            target=write_profile, args=(loop, profile_seconds), name='profiler', daemon=True
+        ).start()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, on_signal, signum)
+    loop.add_signal_handler(signal.SIGUSR1, on_profile_signal)
+
+    try:
+        # A konfigurációs fájl külső módosításai a feliratkozón (apply_config) át érvényesülnek
+        while not copying.done():
+            await asyncio.wait([copying], timeout=config_poll)
+            load_config()
+        success = copying.result()
+    finally:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+            loop.remove_signal_handler(signum)
+        watchdog.cancel()
+        unsubscribe(copier.apply_config)
+        if copier.ledger:
+            copier.ledger.close()
+        copier.cleanup()
+        await client_manager.disconnect()
+    return 0 if success else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drain-timeout', type=float, default=60,
+                        help='ennyi másodpercig várunk leállításkor a sorban lévők kézbesítésére (alapértelmezés: 60)')
+    parser.add_argument('--profile-seconds', type=float, default=10,
+                        help='a SIGUSR1-re induló mintavételezés hossza másodpercben (alapértelmezés: 10)')
+    parser.add_argument('--config-poll', type=float, default=5,
+                        help='a konfigurációs fájl ellenőrzésének gyakorisága másodpercben (alapértelmezés: 5)')
+    args = parser.parse_args()
+
+    os.makedirs('data', exist_ok=True)
+    return asyncio.run(run(args.drain_timeout, args.config_poll, args.profile_seconds))
+
+
+if __name__ == '__main__':
+    sys.exit(main())